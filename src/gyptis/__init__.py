@@ -97,7 +97,6 @@ from dolfin import MPI
 dolfin.parameters["form_compiler"]["cpp_optimize"] = True
 dolfin.parameters["form_compiler"]["cpp_optimize_flags"] = "-O2"
 # dolfin.parameters["form_compiler"]["quadrature_degree"] = 5
-dolfin.parameters["reorder_dofs_serial"] = False
 dolfin.parameters["ghost_mode"] = "shared_facet"
 
 
@@ -6,9 +6,16 @@
 # License: MIT
 # See the documentation at gyptis.gitlab.io
 
+import os
+from functools import lru_cache
+
+import numpy as np
+import ufl
 
 from . import dolfin
+from .complex import Complex, iscomplex
 from .geometry import *
+from .utils.helpers import no_annotations
 
 
 def prepare_boundary_conditions(bc_dict):
@@ -57,133 +64,215 @@ class DirichletBC:
         return bcre, bcim
 
 
-class BiPeriodic2D(dolfin.SubDomain):
-    def __init__(self, geometry, eps=dolfin.DOLFIN_EPS, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.eps = eps
-        self.vectors = geometry.vectors
-        self.vertices = geometry.vertices
-
-    def inside(self, x, on_boundary):
-        on_bottom = is_on_line(x, self.vertices[0], self.vertices[1], eps=self.eps)
-        on_left = is_on_line(x, self.vertices[3], self.vertices[0], eps=self.eps)
-
-        on_vert_1 = dolfin.near(
-            x[0], self.vertices[1][0], eps=self.eps
-        ) and dolfin.near(x[1], self.vertices[1][1], eps=self.eps)
-        on_vert_3 = dolfin.near(
-            x[0], self.vertices[3][0], eps=self.eps
-        ) and dolfin.near(x[1], self.vertices[3][1], eps=self.eps)
-        return bool(
-            (on_bottom or on_left) and not on_vert_1 and not on_vert_3 and on_boundary
-        )
-
-    def map(self, x, y):
-        on_right = is_on_line(x, self.vertices[1], self.vertices[2], eps=self.eps)
-        on_top = is_on_line(x, self.vertices[3], self.vertices[2], eps=self.eps)
-
-        if on_right and on_top:
-            y[0] = x[0] - self.vectors[0][0] - self.vectors[1][0]
-            y[1] = x[1] - self.vectors[0][1] - self.vectors[1][1]
-        elif on_right:
-            y[0] = x[0] - self.vectors[0][0]
-            y[1] = x[1] - self.vectors[0][1]
-        elif on_top:
-            y[0] = x[0] - self.vectors[1][0]
-            y[1] = x[1] - self.vectors[1][1]
+def _split_scalar_factor(expr):
+    # peel numerical factors off a product, e.g. -f -> (-1, f), so that scaled
+    # Expressions and Functions can still be interpolated directly
+    scale = 1
+    while isinstance(expr, ufl.algebra.Product):
+        a, b = expr.ufl_operands
+        if isinstance(a, ufl.constantvalue.ScalarValue):
+            scale, expr = scale * float(a), b
+        elif isinstance(b, ufl.constantvalue.ScalarValue):
+            scale, expr = scale * float(b), a
         else:
-            y[0] = -10000
-            y[1] = -10000
-
-
-class PeriodicBoundary2DX(dolfin.SubDomain):
-    def __init__(self, period, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.period = period
-
-    def inside(self, x, on_boundary):
-        return bool(dolfin.near(x[0], -self.period / 2) and on_boundary)
-
-    def map(self, x, y):
-        y[0] = x[0] - self.period
-        y[1] = x[1]
-
-
-class BiPeriodicBoundary3D(dolfin.SubDomain):
-    def __init__(self, period, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
-        self.period = period
-        self.eps = eps
-        self.map_tol = map_tol
-        super().__init__(map_tol=map_tol)
-
-    def near(self, x, y):
-        return dolfin.near(x, y, eps=self.eps)
-
-    def on_it(self, x, i, s="-"):
-        s = -1 if s == "-" else 1
-        return self.near(x[i], s * self.period[i] / 2)
-
-    def inside(self, x, on_boundary):
-        if on_boundary:
-            if self.on_it(x, 0, "-") and not self.on_it(x, 1, "+"):
-                return True
-            return bool(self.on_it(x, 1, "-") and not self.on_it(x, 0, "+"))
-
-    def map(self, x, y):
-        y[0] = x[0] - self.period[0] if self.on_it(x, 0, "+") else x[0]
-        y[1] = x[1] - self.period[1] if self.on_it(x, 1, "+") else x[1]
-        y[2] = x[2]
-
-
-class Periodic3D(dolfin.SubDomain):
-    def __init__(self, geometry, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
-        self.eps = eps
-        self.map_tol = map_tol
-        self.vectors = geometry.vectors
-        self.vertices = geometry.vertices
-        self.planes = geometry.planes
-        super().__init__(map_tol=map_tol)
-
-    def inside(self, x, on_boundary):
-        ison0 = is_on_plane(x, *self.planes[4], eps=self.eps)
-        ison1 = is_on_plane(x, *self.planes[2], eps=self.eps)
-        ison2 = is_on_plane(x, *self.planes[0], eps=self.eps)
-
-        ison_slave0 = is_on_line3D(x, self.planes[4], self.planes[2], eps=self.eps)
-        ison_slave1 = is_on_line3D(x, self.planes[4], self.planes[0], eps=self.eps)
-        ison_slave2 = is_on_line3D(x, self.planes[2], self.planes[0], eps=self.eps)
-
-        return bool(
-            (ison0 or ison1 or ison2)
-            and (not ((ison_slave0) or (ison_slave1) or (ison_slave2)))
-            and on_boundary
+            break
+    return scale, expr
+
+
+class BoundaryInterpolator:
+    """Values of functions on the degrees of freedom of some boundaries.
+
+    Expressions, Functions and Constants are interpolated at the boundary
+    degrees of freedom directly. Other UFL expressions are projected in the
+    (tangential) trace space of the boundaries: the mass matrix only involves
+    boundary facets and is assembled and factorized once, so that no linear
+    system over the whole domain is solved.
+
+    Parameters
+    ----------
+    function_space : FunctionSpace
+        The real function space.
+    geometry : Geometry
+        The geometry, with its boundary markers.
+    boundaries : list of str
+        The names of the boundaries.
+
+    """
+
+    def __init__(self, function_space, geometry, boundaries):
+        self.function_space = function_space
+        self.geometry = geometry
+        self.boundaries = boundaries
+        self._solver = None
+
+    def _boundary_conditions(self, value):
+        return [
+            _DirichletBC(
+                self.function_space,
+                value,
+                self.geometry.boundary_markers,
+                bnd,
+                self.geometry.boundaries,
+            )
+            for bnd in self.boundaries
+        ]
+
+    def _trace(self, u):
+        if u.ufl_shape == ():
+            return u
+        n = self.geometry.unit_normal_vector
+        return u - dolfin.dot(u, n) * n
+
+    def _trace_restricted(self, u):
+        if u.ufl_shape == ():
+            return u("+")
+        n = self.geometry.unit_normal_vector("+")
+        return u("+") - dolfin.dot(u("+"), n) * n
+
+    def _facet_form(self, u, v):
+        ds, dS = self.geometry.measure["ds"], self.geometry.measure["dS"]
+        return (
+            dolfin.inner(self._trace(u), self._trace(v)) * ds(self.boundaries)
+            + dolfin.inner(self._trace_restricted(u), self._trace_restricted(v))
+            * dS(self.boundaries)
         )
 
-    def map(self, x, y):
-        v = self.vectors
-
-        def set_coord(x, y):
-            for i in range(3):
-                y[i] = x[i]
-            return y
-
-        ison0 = is_on_plane(x, *self.planes[5], self.map_tol)
-        ison1 = is_on_plane(x, *self.planes[3], self.map_tol)
-        ison2 = is_on_plane(x, *self.planes[1], self.map_tol)
-        if ison0 and ison1 and ison2:
-            y = set_coord(x - v[0] - v[1] - v[2], y)
-
-        elif ison0 and ison2:
-            y = set_coord(x - v[0] - v[2], y)
-        elif ison1 and ison2:
-            y = set_coord(x - v[1] - v[2], y)
-        elif ison0 and ison1:
-            y = set_coord(x - v[0] - v[1], y)
-        elif ison0:
-            y = set_coord(x - v[0], y)
-        elif ison1:
-            y = set_coord(x - v[1], y)
-        elif ison2:
-            y = set_coord(x - v[2], y)
+    @property
+    def solver(self):
+        """LU solver for the boundary mass matrix."""
+        if self._solver is None:
+            V = self.function_space
+            u, v = dolfin.TrialFunction(V), dolfin.TestFunction(V)
+            with no_annotations():
+                A = dolfin.assemble(self._facet_form(u, v), keep_diagonal=True)
+            # rows of the dofs that are not on the boundaries are empty
+            A.ident_zeros()
+            self._solver = dolfin.PETScLUSolver("mumps")
+            self._solver.set_operator(A)
+        return self._solver
+
+    def _project(self, expr):
+        V = self.function_space
+        v = dolfin.TestFunction(V)
+        f = dolfin.Function(V)
+        with no_annotations():
+            b = dolfin.assemble(self._facet_form(expr, v))
+            self.solver.solve(f.vector(), b)
+        return f
+
+    def _interpolate(self, expr):
+        f = dolfin.Function(self.function_space)
+        for bc in self._boundary_conditions(expr):
+            bc.apply(f.vector())
+        return f
+
+    def _apply_real(self, expr):
+        scale, expr = _split_scalar_factor(expr)
+        if not self.boundaries:
+            return dolfin.Function(self.function_space)
+        if hasattr(expr, "cpp_object"):
+            f = self._interpolate(expr)
         else:
-            y = set_coord([10000, 10000, 10000], y)
+            f = self._project(expr)
+        if scale != 1:
+            vector = f.vector()
+            vector *= scale
+        return f
+
+    def __call__(self, applied_function):
+        """Boundary values of a function.
+
+        Parameters
+        ----------
+        applied_function : Complex or Expression
+            The function.
+
+        Returns
+        -------
+        Complex
+            Functions of ``function_space`` equal to ``applied_function`` on the
+            boundary degrees of freedom (their other values are not meaningful).
+
+        """
+        if not iscomplex(applied_function):
+            applied_function = Complex(applied_function, 0)
+        imag = applied_function.imag
+        if isinstance(imag, (int, float)) and imag == 0:
+            shape = self.function_space.ufl_element().value_shape()
+            imag = dolfin.Constant(np.zeros(shape))
+        return Complex(self._apply_real(applied_function.real), self._apply_real(imag))
+
+
+@lru_cache(maxsize=None)
+def _lattice_periodic_map_type():
+    here = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(here, "periodic.cpp")) as f:
+        code = f.read()
+    return dolfin.compile_cpp_code(code).LatticePeriodicMap
+
+
+def lattice_periodic_map(vectors, origin, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
+    """Periodic map of a lattice, as a compiled SubDomain.
+
+    The faces of the unit cell containing the origin are the master faces,
+    and the points on the opposite faces are mapped onto them by subtracting
+    the lattice vectors. Since ``inside`` and ``map`` are evaluated in C++,
+    building constrained function spaces is much faster than with SubDomains
+    defined in Python. The mesh should be periodic, e.g. generated with
+    ``gmsh.model.mesh.setPeriodic``, so that the mapped vertices match.
+
+    Parameters
+    ----------
+    vectors : array of shape (n, gdim)
+        The lattice vectors of the periodic directions (n <= gdim).
+    origin : array of shape (gdim,)
+        A corner of the unit cell.
+    eps : float
+        Tolerance to locate points on the faces (the default is DOLFIN_EPS). It
+        is at least a hundred machine epsilons relative to the cell size.
+    map_tol : float
+        Tolerance to match the mapped points (the default is 1e-10).
+
+    Returns
+    -------
+    SubDomain
+        The periodic map, to be used as ``constrained_domain``.
+
+    """
+    vectors = np.array(vectors, dtype=float)
+    origin = np.array(origin, dtype=float)
+    # dual basis: normals of the faces spanned by the other vectors
+    dual = np.linalg.solve(vectors @ vectors.T, vectors)
+    normals = dual / np.linalg.norm(dual, axis=1)[:, None]
+    heights = np.sum(normals * vectors, axis=1)
+    # allow for rounding errors in the projections on the normals
+    eps = max(eps, 100 * dolfin.DOLFIN_EPS * np.max(np.abs(heights)))
+    return _lattice_periodic_map_type()(vectors, normals, heights, origin, eps, map_tol)
+
+
+def BiPeriodic2D(geometry, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
+    """Periodic map of a 2D lattice geometry (see :func:`lattice_periodic_map`)."""
+    return lattice_periodic_map(
+        geometry.vectors, geometry.vertices[0], eps=eps, map_tol=map_tol
+    )
+
+
+def PeriodicBoundary2DX(period, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
+    """Periodic map along x of a 2D grating centered on x=0."""
+    return lattice_periodic_map(
+        [(period, 0)], (-period / 2, 0), eps=eps, map_tol=map_tol
+    )
+
+
+def BiPeriodicBoundary3D(period, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
+    """Periodic map along x and y of a 3D grating centered on x=y=0."""
+    vectors = [(period[0], 0, 0), (0, period[1], 0)]
+    origin = (-period[0] / 2, -period[1] / 2, 0)
+    return lattice_periodic_map(vectors, origin, eps=eps, map_tol=map_tol)
+
+
+def Periodic3D(geometry, eps=dolfin.DOLFIN_EPS, map_tol=1e-10):
+    """Periodic map of a 3D lattice geometry (see :func:`lattice_periodic_map`)."""
+    return lattice_periodic_map(
+        geometry.vectors, geometry.vertices[0], eps=eps, map_tol=map_tol
+    )
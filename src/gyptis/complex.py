@@ -12,14 +12,32 @@ This module provides a :class:`Complex` class and overrides some ``df`` function
 to easily deal with complex problems by spliting real and imaginary parts.
 """
 
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Iterable
 
 import numpy as np
 import ufl
+from ufl.corealg.traversal import unique_pre_traversal
 
+from . import ADJOINT
 from . import dolfin as df
 
 
+def _is_zero(x):
+    if isinstance(x, ufl.constantvalue.Zero):
+        return True
+    return np.isscalar(x) and x == 0
+
+
+def _is_integer(x):
+    if isinstance(x, (bool, np.bool_)):
+        return False
+    if isinstance(x, (int, np.integer)):
+        return True
+    return isinstance(x, (float, np.floating)) and float(x).is_integer()
+
+
 def _complexcheck(func):
     """Wrapper to check if arguments are complex"""
 
@@ -133,10 +151,14 @@ class Complex:
     def __sub__(self, other):
         return Complex(self.real - other.real, self.imag - other.imag)
 
-    __rsub__ = __sub__
+    @_complexcheck
+    def __rsub__(self, other):
+        return Complex(other.real - self.real, other.imag - self.imag)
 
     @_complexcheck
     def __mul__(self, other):
+        if other is self:
+            return self._square()
         return Complex(
             self.real * other.real - self.imag * other.imag,
             self.imag * other.real + self.real * other.imag,
@@ -146,9 +168,28 @@ class Complex:
 
     __array_ufunc__ = None
 
+    def _square(self):
+        a, b = self.real, self.imag
+        return Complex(a * a - b * b, 2 * a * b)
+
+    def _integer_power(self, n):
+        # exponentiation by squaring
+        if n < 0:
+            return 1 / self._integer_power(-n)
+        result, base = None, self
+        while n:
+            if n & 1:
+                result = base if result is None else result * base
+            n >>= 1
+            if n:
+                base = base._square()
+        return Complex(1, 0) if result is None else result
+
     @_complexcheck
     def __truediv__(self, other):
         sr, si, tr, ti = self.real, self.imag, other.real, other.imag  # short forms
+        if _is_zero(ti):
+            return Complex(sr / tr, si / tr)
         r = tr**2 + ti**2
         return Complex((sr * tr + si * ti) / r, (si * tr - sr * ti) / r)
 
@@ -176,7 +217,11 @@ class Complex:
         return self.__angle__()
 
     def __abs__(self):
-        return df.sqrt(self.real**2 + self.imag**2)
+        return df.sqrt(self.abs2())
+
+    def abs2(self):
+        """Squared modulus of the complex number (avoids a square root)."""
+        return self.real**2 + self.imag**2
 
     def __neg__(self):  # defines -c (c is Complex)
         return Complex(-self.real, -self.imag)
@@ -196,8 +241,12 @@ class Complex:
         return f"Complex({self.real.__repr__()}, {self.imag.__repr__()})"
 
     def __pow__(self, power):
-        if iscomplex(power) and power.imag != 0:
-            raise NotImplementedError("complex exponent not implemented")
+        if iscomplex(power):
+            if power.imag != 0:
+                raise NotImplementedError("complex exponent not implemented")
+            power = power.real
+        if _is_integer(power):
+            return self._integer_power(int(power))
         A, phi = self.polar()
         return self.polar2cart(A**power, phi * power)
 
@@ -206,13 +255,14 @@ class Complex:
         try:
             return np.angle(x + 1j * y)
         except Exception:
+            r = self.__abs__()
             return df.conditional(
-                ufl.eq(self.__abs__(), 0),
+                ufl.eq(r, 0),
                 0,
                 df.conditional(
-                    ufl.eq(self.__abs__() + x, 0),
+                    ufl.eq(r + x, 0),
                     df.pi,
-                    2 * df.atan(y / (self.__abs__() + x)),
+                    2 * df.atan(y / (r + x)),
                 ),
             )
 
@@ -277,13 +327,61 @@ def iscomplex(z):
     return bool(hasattr(z, "real") and hasattr(z, "imag") and z.imag is not None)
 
 
+_DOF_ORDERING_LIBRARIES = dict(rcm="Boost", gps="SCOTCH")
+
+
+@contextmanager
+def dof_ordering(ordering=True):
+    """Context manager setting the numbering of the degrees of freedom.
+
+    The degrees of freedom of the function spaces created in this context are
+    renumbered for locality, which speeds up assembly and reduces the fill-in
+    of LU factorizations. The renumbering is compatible with periodic
+    constraints (``constrained_domain``), since it is applied to the
+    constrained dofmap. In parallel, dolfin always renumbers the dofs.
+
+    Parameters
+    ----------
+    ordering : bool or str
+        False keeps the numbering of the element dofmaps, True renumbers with
+        the default algorithm, ``"rcm"`` with the reverse Cuthill-McKee
+        algorithm and ``"gps"`` with the Gibbs-Poole-Stockmeyer algorithm
+        (the default is True).
+
+    Returns
+    -------
+    context manager
+        The context.
+
+    """
+    if not isinstance(ordering, bool) and ordering not in _DOF_ORDERING_LIBRARIES:
+        raise ValueError(f"Unknown dof ordering {ordering}")
+    parameters = df.parameters
+    reorder = parameters["reorder_dofs_serial"]
+    library = parameters["dof_ordering_library"]
+    parameters["reorder_dofs_serial"] = bool(ordering)
+    if ordering in _DOF_ORDERING_LIBRARIES:
+        parameters["dof_ordering_library"] = _DOF_ORDERING_LIBRARIES[ordering]
+    try:
+        yield
+    finally:
+        parameters["reorder_dofs_serial"] = reorder
+        parameters["dof_ordering_library"] = library
+
+
 class ComplexFunctionSpace(df.FunctionSpace):
-    """Complex function space"""
+    """Complex function space
+
+    The keyword argument ``reorder_dofs`` sets the numbering of the degrees
+    of freedom (see :func:`dof_ordering`, the default is True).
+    """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        element = super().ufl_element()
-        super().__init__(super().mesh(), element * element, **kwargs)
+    def __init__(self, *args, reorder_dofs=True, **kwargs):
+        self.reorder_dofs = reorder_dofs
+        with dof_ordering(reorder_dofs):
+            super().__init__(*args, **kwargs)
+            element = super().ufl_element()
+            super().__init__(super().mesh(), element * element, **kwargs)
 
 
 def _cplx_iter(f):
@@ -300,20 +398,61 @@ def _cplx_iter(f):
     return wrapper
 
 
-def phasor(prop_cst, direction=0, **kwargs):
-    phasor_re = df.Expression(
-        f"cos(prop_cst*x[{direction}])", prop_cst=prop_cst, **kwargs
-    )
-    phasor_im = df.Expression(
-        f"sin(prop_cst*x[{direction}])", prop_cst=prop_cst, **kwargs
-    )
-    return Complex(phasor_re, phasor_im)
+def _as_ufl(value):
+    return value if isinstance(value, ufl.core.expr.Expr) else df.Constant(value)
 
 
-def phase_shift(phase, **kargs):
-    phasor_re = df.Expression("cos(phase)", phase=phase, **kargs)
-    phasor_im = df.Expression("sin(phase)", phase=phase, **kargs)
-    return Complex(phasor_re, phasor_im)
+def phasor(prop_cst, direction=0, domain=None, **kwargs):
+    """Phasor ``exp(i k x_j)`` along a direction.
+
+    Parameters
+    ----------
+    prop_cst : float or Constant
+        The propagation constant ``k``.
+    direction : int
+        The direction ``j`` (the default is 0).
+    domain : Mesh
+        The mesh. If given, the phasor is a UFL expression of the spatial
+        coordinates, evaluated exactly at quadrature points. Otherwise it is
+        an Expression (the default is None).
+    **kwargs : dict
+        Keyword arguments passed to ``dolfin.Expression`` if no domain is given.
+
+    Returns
+    -------
+    Complex
+        The phasor.
+
+    """
+    if domain is None:
+        phasor_re = df.Expression(
+            f"cos(prop_cst*x[{direction}])", prop_cst=prop_cst, **kwargs
+        )
+        phasor_im = df.Expression(
+            f"sin(prop_cst*x[{direction}])", prop_cst=prop_cst, **kwargs
+        )
+        return Complex(phasor_re, phasor_im)
+    x = df.SpatialCoordinate(domain)
+    return phase_shift_constant(_as_ufl(prop_cst) * x[direction])
+
+
+def phase_shift(phase, **kwargs):
+    """Constant phase shift ``exp(i phase)``.
+
+    Parameters
+    ----------
+    phase : float or Constant
+        The phase.
+    **kwargs : dict
+        Ignored, kept for backward compatibility.
+
+    Returns
+    -------
+    Complex
+        The phase shift.
+
+    """
+    return phase_shift_constant(_as_ufl(phase))
 
 
 def phase_shift_constant(phase):
@@ -322,6 +461,48 @@ def phase_shift_constant(phase):
     return Complex(phasor_re, phasor_im)
 
 
+def plane_wave_phasor(wavevector, domain, origin=None, phase=0):
+    """Plane wave phasor ``exp(i (k.(x - x0) + phase))``.
+
+    The phasor is a UFL expression of the spatial coordinates, with parameters
+    stored in Constants, so that it is compiled in the form kernels and
+    evaluated exactly at quadrature points.
+
+    Parameters
+    ----------
+    wavevector : array of complex
+        The wave vector ``k``. Components along directions larger than
+        the mesh dimension are ignored.
+    domain : Mesh
+        The mesh.
+    origin : array of float
+        The origin ``x0`` (the default is None, i.e. zero).
+    phase : float
+        The phase (the default is 0).
+
+    Returns
+    -------
+    Complex
+        The phasor.
+
+    """
+    x = df.SpatialCoordinate(domain)
+    origin = np.zeros(len(wavevector)) if origin is None else origin
+    argument = df.Constant(phase) if phase != 0 else 0
+    decay = 0
+    for i, k in enumerate(wavevector[: len(x)]):
+        xi = x[i] - origin[i] if origin[i] != 0 else x[i]
+        k = complex(k)
+        if k.real != 0:
+            argument += df.Constant(k.real) * xi
+        if k.imag != 0:
+            decay += df.Constant(k.imag) * xi
+    phase_factor = phase_shift_constant(argument)
+    if decay == 0:
+        return phase_factor
+    return df.exp(-decay) * phase_factor
+
+
 def vector(vect):
     vsr = [v.real for v in vect]
     vsi = [v.imag for v in vect]
@@ -334,8 +515,114 @@ def tensor(tens):
     return Complex(df.as_tensor(tsr), df.as_tensor(tsi))
 
 
+@lru_cache(maxsize=16)
+def _real_space(mesh):
+    """Space of two global constants and the global indices of its dofs."""
+    V = df.VectorFunctionSpace(mesh, "R", 0, dim=2)
+    local_dofs = [V.sub(i).dofmap().cell_dofs(0)[0] for i in range(2)]
+    dofs = [V.dofmap().local_to_global_index(d) for d in local_dofs]
+    return V, np.array(dofs, dtype=np.intc)
+
+
+def _annotating():
+    if not ADJOINT:
+        return False
+    from pyadjoint import annotate_tape
+
+    return annotate_tape()
+
+
+def _assemble_fused(z, **kwargs):
+    """Assemble the real and imaginary parts of a scalar form in one pass.
+
+    The two functionals are tested against a space of two global constants,
+    so that a single vector assembly (one traversal of the mesh and one
+    parallel reduction) gives both parts. Returns None if the parts are not
+    scalar forms on the same mesh, or if the assembly must be annotated.
+    """
+    forms = z.real, z.imag
+    if _annotating():
+        return None
+    if not all(isinstance(f, ufl.Form) and not f.arguments() for f in forms):
+        return None
+    try:
+        domains = {f.ufl_domain() for f in forms}
+    except ufl.UFLException:
+        return None
+    if len(domains) != 1:
+        return None
+    V, dofs = _real_space(domains.pop().ufl_cargo())
+    v = df.TestFunction(V)
+    integrals = []
+    for i, form in enumerate(forms):
+        for integral in form.integrals():
+            interior = integral.integral_type().startswith("interior_facet")
+            vi = v("+")[i] if interior else v[i]
+            integrals.append(integral.reconstruct(integrand=integral.integrand() * vi))
+    return df.assemble(ufl.Form(integrals), **kwargs).gather(dofs)
+
+
+_assemble_parts = _complexify_linear(df.assemble)
+
+
+def form_size(form):
+    """Size of the expression trees of a form.
+
+    This is the number of unique UFL nodes in each integrand, summed over
+    integrals. Large trees lead to large generated kernels, with long
+    compilation times and slow assembly.
+
+    Parameters
+    ----------
+    form : Form, Expr, Complex or list
+        The form(s) or expression(s).
+
+    Returns
+    -------
+    int
+        The number of nodes.
+
+    """
+    if iscomplex(form):
+        return form_size(form.real) + form_size(form.imag)
+    if isinstance(form, (list, tuple)):
+        return sum(form_size(f) for f in form)
+    if isinstance(form, ufl.Form):
+        return sum(form_size(i.integrand()) for i in form.integrals())
+    if isinstance(form, ufl.core.expr.Expr):
+        return sum(1 for _ in unique_pre_traversal(form))
+    return 0
+
+
+def assemble(z, *args, **kwargs):
+    """Assemble a form.
+
+    Scalar complex forms are assembled in a single pass over the mesh.
+
+    Parameters
+    ----------
+    z : Form or Complex
+        The form to assemble.
+    *args : tuple
+        Positional arguments passed to ``dolfin.assemble``.
+    **kwargs : dict
+        Keyword arguments passed to ``dolfin.assemble``.
+
+    Returns
+    -------
+    float, Tensor or Complex
+        The assembled form.
+
+    """
+    fusable = set(kwargs) <= {"form_compiler_parameters"}
+    if isinstance(z, Complex) and not args and fusable:
+        values = _assemble_fused(z, **kwargs)
+        if values is not None:
+            return Complex(*map(float, values))
+    return _assemble_parts(z, *args, **kwargs)
+
+
 interpolate = _complexify_linear(df.interpolate)
-assemble = _complexify_linear(df.assemble)
 grad = _complexify_linear(df.grad)
 div = _complexify_linear(df.div)
 curl = _complexify_linear(df.curl)
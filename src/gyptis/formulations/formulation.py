@@ -10,19 +10,67 @@
 Finite element weak formulations.
 """
 
+import warnings
 from abc import ABC, abstractmethod
 
 import numpy as np
+import ufl
 from scipy.constants import epsilon_0, mu_0
+from ufl.algorithms import estimate_total_polynomial_degree, extract_arguments
 
-from .. import dolfin
+from .. import ADJOINT, dolfin
 from ..bc import *
 from ..complex import *
 from ..sources import *
-from ..utils.helpers import project_iterative
+from ..utils.helpers import no_annotations, project_iterative
+
+
+def _parameter_key(value):
+    # compare values rather than representations, which are truncated for
+    # large arrays and do not change when a Constant is assigned in place
+    if isinstance(value, dolfin.Constant):
+        return tuple(value.values())
+    if isinstance(value, Complex):
+        return _parameter_key(value.real), _parameter_key(value.imag)
+    if isinstance(value, np.ndarray):
+        return value.shape, value.dtype.str, value.tobytes()
+    if isinstance(value, (list, tuple)):
+        return tuple(_parameter_key(v) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, complex, str)):
+        return value
+    # other objects (e.g. Functions) are only compared by identity
+    return id(value)
 
 
 class Formulation(ABC):
+    """Base class for weak formulations.
+
+    The quadrature degree of each integral of the forms is set with the
+    ``quadrature_degree`` attribute. With ``"auto"`` (the default), the degree
+    estimated by the form compiler is capped to ``(rank + 1) * degree``, with
+    ``rank`` the number of arguments of the integral, since coefficients such
+    as sources, phasors or material expressions are not represented more
+    accurately than the solution. With an integer, this degree is used for
+    all integrals, and with None the form compiler estimation is kept.
+    A warning is issued when the degree used exceeds
+    ``max_quadrature_degree``, which defaults to ``3 * degree + 2``. Since
+    the degrees capped in ``"auto"`` mode are at most ``3 * degree``, this
+    only happens in this mode if ``max_quadrature_degree`` is set lower.
+    Integrals with a quadrature degree given in their measure metadata
+    are left untouched.
+
+    If the ``cache_annex`` attribute is True (the default is False), the annex
+    field of scattered field formulations is interpolated as a finite element
+    function, computed once and reused in all forms: right hand side, boundary
+    conditions and post-processing. Only annex fields given as Expressions or
+    Functions (e.g. the incident field) are cached. UFL annex fields, such as
+    the piecewise field of a layered stack, are discontinuous across subdomains
+    and would oscillate if projected onto the continuous function space, so
+    they are always used as they are.
+    """
+
     def __init__(
         self,
         geometry,
@@ -33,6 +81,8 @@ class Formulation(ABC):
         modal=False,
         degree=1,
         dim=None,
+        quadrature_degree="auto",
+        max_quadrature_degree=None,
     ):
         if boundary_conditions is None:
             boundary_conditions = {}
@@ -47,6 +97,11 @@ class Formulation(ABC):
         self.boundary_conditions = boundary_conditions
         self.modal = modal
         self.degree = degree
+        self.quadrature_degree = quadrature_degree
+        self.max_quadrature_degree = max_quadrature_degree
+        self.cache_annex = False
+        self._annex_cache = None
+        self._pec_interpolator = None
         _dim = self.trial.real.ufl_shape
         _dim = 1 if _dim == () else _dim[0]
         self.dim = dim or _dim
@@ -60,8 +115,163 @@ class Formulation(ABC):
             self.geometry.mesh, self.element
         )
 
+    def _annex_expression(self):
+        return self.source.expression
+
+    def _annex_key(self):
+        # the annex field changes with the public parameters of the source
+        params = {
+            k: _parameter_key(v)
+            for k, v in vars(self.source).items()
+            if not k.startswith("_") and k != "domain"
+        }
+        return id(self.source), sorted(params.items())
+
+    @property
+    def annex(self):
+        """The annex field of the scattered field formulation.
+
+        Returns
+        -------
+        Complex
+            The annex field, as functions of ``real_function_space`` if
+            ``cache_annex`` is True and it is given as Expressions or Functions.
+
+        """
+        field = self._annex_expression()
+        if not self.cache_annex or not all(
+            hasattr(part, "cpp_object") for part in (field.real, field.imag)
+        ):
+            return field
+        # the interpolated field is also invalidated when the mesh is deformed
+        key = self._annex_key(), self.geometry.mesh_version
+        if self._annex_cache is None or self._annex_cache[0] != key:
+            self._annex_cache = key, self._interpolate_annex(field)
+        return self._annex_cache[1]
+
+    def _interpolate_annex(self, field):
+        V = self.real_function_space
+        with no_annotations():
+            parts = [dolfin.interpolate(part, V) for part in (field.real, field.imag)]
+        return Complex(*parts)
+
+    def add_annex(self, u, function=None):
+        """Total field from the scattered field.
+
+        Parameters
+        ----------
+        u : Complex
+            The scattered field, the split of a Function of ``function_space``.
+        function : Function
+            The Function of ``function_space`` that ``u`` is the split of (the
+            default is None). It is needed to add the cached annex field to the
+            degrees of freedom, since subfunctions give no access to their
+            vector.
+
+        Returns
+        -------
+        Complex
+            The total field. If the annex field is cached, this is the split
+            of a Function of ``function_space``.
+
+        """
+        annex = self.annex
+        cached = self._annex_cache is not None and annex is self._annex_cache[1]
+        if not (self.cache_annex and cached) or ADJOINT or function is None:
+            return u + annex
+        if not hasattr(self, "_annex_assigner"):
+            V = self.real_function_space
+            self._annex_assigner = dolfin.FunctionAssigner(self.function_space, [V, V])
+        total = dolfin.Function(self.function_space)
+        self._annex_assigner.assign(total, [annex.real, annex.imag])
+        total.vector().axpy(1, function.vector())
+        return Complex(*total.split())
+
+    def pec_boundary_values(self, applied_function):
+        """Values of a function on the PEC boundaries.
+
+        Parameters
+        ----------
+        applied_function : Complex
+            The function.
+
+        Returns
+        -------
+        Complex
+            Functions of ``real_function_space``, only meaningful on the degrees
+            of freedom of the PEC boundaries.
+
+        """
+        version = self.geometry.mesh_version
+        if self._pec_interpolator is None or self._pec_interpolator[0] != version:
+            self._pec_interpolator = version, BoundaryInterpolator(
+                self.real_function_space, self.geometry, self.pec_boundaries
+            )
+        return self._pec_interpolator[1](applied_function)
+
+    def estimate_quadrature_degree(self, integral):
+        """Quadrature degree of an integral.
+
+        Parameters
+        ----------
+        integral : ufl.Integral
+            The integral.
+
+        Returns
+        -------
+        int
+            The quadrature degree.
+
+        """
+        if self.quadrature_degree not in (None, "auto"):
+            return int(self.quadrature_degree)
+        estimated = estimate_total_polynomial_degree(
+            integral.integrand(), default_degree=self.degree
+        )
+        if self.quadrature_degree is None:
+            return estimated
+        rank = len(extract_arguments(integral.integrand()))
+        return min(estimated, (rank + 1) * self.degree)
+
+    def apply_quadrature_degree(self, form):
+        """Set the quadrature degree of the integrals of a form.
+
+        Parameters
+        ----------
+        form : Form or list of Forms
+            The form(s).
+
+        Returns
+        -------
+        Form or list of Forms
+            The form(s), with the quadrature degree in the integrals metadata.
+
+        """
+        if isinstance(form, (list, tuple)):
+            return [self.apply_quadrature_degree(f) for f in form]
+        if not isinstance(form, ufl.Form):
+            return form
+        budget = self.max_quadrature_degree or 3 * self.degree + 2
+        integrals = []
+        for integral in form.integrals():
+            metadata = integral.metadata()
+            if "quadrature_degree" not in metadata:
+                degree = self.estimate_quadrature_degree(integral)
+                if degree > budget:
+                    warnings.warn(
+                        f"Quadrature degree {degree} of {integral.integral_type()} "
+                        f"integral over subdomain {integral.subdomain_id()} exceeds "
+                        f"the budget of {budget}, assembly may be slow. "
+                        "Set the quadrature_degree attribute of the formulation "
+                        "to override it."
+                    )
+                metadata = dict(metadata, quadrature_degree=degree)
+                integral = integral.reconstruct(metadata=metadata)
+            integrals.append(integral)
+        return ufl.Form(integrals)
+
     def build_lhs(self):
-        self.lhs = dolfin.lhs(self.weak)
+        self.lhs = self.apply_quadrature_degree(dolfin.lhs(self.weak))
         return self.lhs
 
     def build_rhs(self):
@@ -75,8 +285,20 @@ class Formulation(ABC):
             else:
                 dummy_form = dolfin.DOLFIN_EPS * self.trial * self.dx
             self.rhs = dummy_form.real + dummy_form.imag
+        self.rhs = self.apply_quadrature_degree(self.rhs)
         return self.rhs
 
+    def form_size(self):
+        """Size of the expression trees of the weak formulation.
+
+        Returns
+        -------
+        int
+            The number of UFL nodes (see :func:`gyptis.complex.form_size`).
+
+        """
+        return form_size(self.weak)
+
     def _set_rhs(self, custom_rhs):
         self.rhs = custom_rhs
         return self.rhs
@@ -120,17 +120,14 @@ class Maxwell2D(Formulation):
 
     @property
     def weak(self):
-        u1 = 0 if self.modal else self.source.expression
+        u1 = 0 if self.modal else self.annex
         u = self.trial
         v = self.test
         return self._weak(u, v, u1)
 
     def build_pec_boundary_conditions(self, applied_function):
         if self.polarization == "TM" and self.pec_boundaries != []:
-            # FIXME: project is slow, avoid it.
-            applied_function = project_iterative(
-                applied_function, self.real_function_space
-            )
+            applied_function = self.pec_boundary_values(applied_function)
             return build_pec_boundary_conditions(
                 self.pec_boundaries,
                 self.geometry,
@@ -141,7 +138,7 @@ class Maxwell2D(Formulation):
             return []
 
     def build_boundary_conditions(self):
-        applied_function = Constant(0) if self.modal else -self.source.expression
+        applied_function = Constant(0) if self.modal else -self.annex
         self._boundary_conditions = self.build_pec_boundary_conditions(applied_function)
         return self._boundary_conditions
 
@@ -42,9 +42,12 @@ class Maxwell2DPeriodic(Maxwell2D):
             )
         )
 
+    def _annex_expression(self):
+        return self.annex_field["as_subdomain"]["stack"]
+
     @property
     def weak(self):
-        u1 = 0 if self.modal else self.annex_field["as_subdomain"]["stack"]
+        u1 = 0 if self.modal else self.annex
         u = self.trial * self.phasor
         v = self.test * self.phasor.conj
         return super()._weak(u, v, u1)
@@ -53,7 +56,7 @@ class Maxwell2DPeriodic(Maxwell2D):
         applied_function = (
             Constant(0)
             if self.modal
-            else -self.annex_field["as_subdomain"]["stack"] * self.phasor.conj
+            else -self.annex * self.phasor.conj
         )
         self._boundary_conditions = self.build_pec_boundary_conditions(applied_function)
         return self._boundary_conditions
@@ -127,10 +127,7 @@ class MaxwellWaveguide(Formulation):
 
     def build_pec_boundary_conditions(self, applied_function):
         if self.pec_boundaries != []:
-            # FIXME: project is slow, avoid it.
-            applied_function = project_iterative(
-                applied_function, self.real_function_space
-            )
+            applied_function = self.pec_boundary_values(applied_function)
             return build_pec_boundary_conditions(
                 self.pec_boundaries,
                 self.geometry,
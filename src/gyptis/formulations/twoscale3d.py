@@ -67,7 +67,7 @@ class TwoScale3D(Formulation):
         return self._weak(u, v)
 
     def build_pec_boundary_conditions(self, applied_function):
-        applied_function = project_iterative(applied_function, self.real_function_space)
+        applied_function = self.pec_boundary_values(applied_function)
         return build_pec_boundary_conditions(
             self.pec_boundaries,
             self.geometry,
@@ -12,21 +12,25 @@ Geometry definition using Gmsh api.
 For more information see Gmsh's `documentation <https://gmsh.info/doc/texinfo/gmsh.html>`_
 """
 
+import copy
 import numbers
 import os
 import re
 import sys
 import tempfile
 from collections import OrderedDict
+from contextlib import contextmanager
 from functools import wraps
 
 import gmsh
 import numpy as np
+from mpi4py import MPI
 from packaging import version
 
 from .. import dolfin
 from ..measure import Measure
 from ..mesh import *
+from ..mesh.mesh import _can_distribute, _has_mesh_view, _write_msh
 from ..plot import *
 
 _newer_gmsh = version.parse(gmsh.__version__) >= version.parse("4.11.0")
@@ -60,12 +64,34 @@ setattr(gmsh_options, "set", _set_opt_gmsh)
 setattr(gmsh_options, "get", _get_opt_gmsh)
 
 
+# gmsh options affecting the mesh, part of the mesh cache key
+_MESH_OPTIONS = [
+    "Mesh.Algorithm",
+    "Mesh.Algorithm3D",
+    "Mesh.ElementOrder",
+    "Mesh.MeshSizeFactor",
+    "Mesh.MeshSizeMin",
+    "Mesh.MeshSizeMax",
+    "Mesh.MeshSizeFromCurvature",
+    "Mesh.MeshSizeFromPoints",
+    "Mesh.MeshSizeExtendFromBoundary",
+    "Mesh.Optimize",
+    "Mesh.OptimizeNetgen",
+    "Mesh.HighOrderOptimize",
+    "Mesh.Smoothing",
+    "Mesh.RandomFactor",
+    "Mesh.RecombineAll",
+    "Mesh.SecondOrderLinear",
+    "Geometry.OCCBooleanPreserveNumbering",
+]
+
+
 def _add_method(cls, func, name):
     @wraps(func)
     def wrapper(*args, sync=True, **kwargs):
+        cls._operations.append((name, args, kwargs))
         out = func(*args, **kwargs)
-        if sync:
-            occ.synchronize()
+        cls._synchronize(sync)
         return out
 
     setattr(cls, name, wrapper)
@@ -83,6 +109,72 @@ def _get_bnd(idf, dim):
     return [b[1] for b in out]
 
 
+def _as_points(points):
+    points = np.atleast_2d(points).astype(float)
+    if points.shape[1] == 2:
+        points = np.hstack([points, np.zeros((len(points), 1))])
+    return points
+
+
+def _material_value(value):
+    value = np.asarray(value, dtype=complex)
+    if value.ndim == 0:
+        return complex(value)
+    if value.ndim == 1:
+        return value[np.argmax(np.abs(value))]
+    # the eigenvalue of largest modulus for anisotropic materials
+    eigenvalues = np.linalg.eigvals(value)
+    return eigenvalues[np.argmax(np.abs(eigenvalues))]
+
+
+def local_mesh_size(
+    wavelength,
+    epsilon=1,
+    mu=1,
+    degree=1,
+    points_per_wavelength=10,
+    points_per_skin_depth=3,
+):
+    """Mesh size resolving the wavelength in a material.
+
+    The size is set from the wavelength in the material and, for lossy
+    materials such as metals, from the skin depth.
+
+    Parameters
+    ----------
+    wavelength : float
+        The wavelength in vacuum.
+    epsilon : complex or array
+        The permittivity (the default is 1).
+    mu : complex or array
+        The permeability (the default is 1).
+    degree : int
+        The degree of the finite elements (the default is 1).
+    points_per_wavelength : float
+        Number of degrees of freedom per wavelength in the material along an
+        edge (the default is 10).
+    points_per_skin_depth : float
+        Number of degrees of freedom per skin depth (the default is 3).
+
+    Returns
+    -------
+    float
+        The mesh size.
+
+    """
+    try:
+        index = np.sqrt(_material_value(epsilon) * _material_value(mu))
+    except (TypeError, ValueError):
+        raise ValueError(
+            "automatic mesh sizing needs numerical material values"
+        ) from None
+    size = degree * wavelength / (abs(index) * points_per_wavelength)
+    if abs(index.imag) > 0:
+        skin_depth = wavelength / (2 * np.pi * abs(index.imag))
+        size = min(size, degree * skin_depth / points_per_skin_depth)
+    return size
+
+
 def _convert_name(name):
     return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
 
@@ -101,9 +193,20 @@ class Geometry:
         verbose=0,
         binary_mesh=True,
         options=None,
+        mesh_cache=None,
+        mesh_order=1,
     ):
+        if mesh_order not in (1, 2):
+            raise ValueError("mesh_order must be 1 or 2")
         if options is None:
             options = {}
+        if mesh_cache is True:
+            mesh_cache = MeshCache()
+        self.mesh_cache = mesh_cache or None
+        self._mesh_cache_key = None
+        self._operations = []
+        self._batch_level = 0
+        self.mesh_version = 0
         self.model_name = model_name
         self.model = gmsh.model
         self.mesh_name = mesh_name
@@ -119,6 +222,7 @@ class Geometry:
         self.options = options
         self.verbose = verbose
         self.binary_mesh = binary_mesh
+        self.mesh_order = mesh_order
         self.comm = dolfin.MPI.comm_world
 
         self.pml_physical = []
@@ -155,6 +259,8 @@ class Geometry:
 
         gmsh_options.set("General.Verbosity", self.verbose)
         gmsh_options.set("Mesh.Binary", self.binary_mesh)
+        # second order elements are curved to fit the geometry
+        gmsh_options.set("Mesh.ElementOrder", self.mesh_order)
 
         OCCBooleanPreserveNumbering = False if _newer_gmsh else True
         gmsh_options.set(
@@ -167,6 +273,147 @@ class Geometry:
     def _check_dim(self, dim):
         return self.dim if dim is None else dim
 
+    def _synchronize(self, sync=True):
+        if sync and not self._batch_level:
+            occ.synchronize()
+
+    @contextmanager
+    def batch(self):
+        """Defer the synchronization of the model.
+
+        Within this context, the ``occ`` operations do not synchronize the
+        ``gmsh`` model, which is synchronized once when the outermost batch
+        closes. This avoids a cost growing quadratically with the number of
+        entities when building geometries with many objects. The model should
+        not be queried (e.g. with :meth:`get_boundaries`) inside a batch.
+
+        Yields
+        ------
+        Geometry
+            The geometry.
+
+        """
+        self._batch_level += 1
+        try:
+            yield self
+        finally:
+            self._batch_level -= 1
+            self._synchronize()
+
+    def fragment_inclusions(self, tags, host, dim=None):
+        """Embed inclusions in a host with a single fragment.
+
+        Parameters
+        ----------
+        tags : list of int
+            The tags of the inclusions.
+        host : int or list of int
+            The tag(s) of the host.
+        dim : int
+            Dimension (the default is None, i.e. the geometry dimension).
+
+        Returns
+        -------
+        tuple
+            The tags of the inclusions and of the host after fragmentation.
+
+        """
+        dim = self._check_dim(dim)
+        n = len(tags)
+        host = host if isinstance(host, list) else [host]
+        _, mapping = occ.fragment(self.dimtag(tags, dim), self.dimtag(host, dim))
+        self._synchronize()
+        inclusions = list(dict.fromkeys(t for m in mapping[:n] for _, t in m))
+        host = [
+            t
+            for t in dict.fromkeys(t for m in mapping[n:] for _, t in m)
+            if t not in inclusions
+        ]
+        return inclusions, host
+
+    def _add_objects(self, add, args, host, dim):
+        with self.batch():
+            tags = [add(*a) for a in args]
+        if host is None:
+            return tags
+        return self.fragment_inclusions(tags, host, dim)
+
+    def add_disks(self, centers, radii, host=None):
+        """Add several disks.
+
+        Parameters
+        ----------
+        centers : array of shape (N, 2) or (N, 3)
+            Coordinates of the centers.
+        radii : float or array of shape (N,)
+            Radii of the disks.
+        host : int or list of int
+            Surface(s) in which the disks are embedded with a single fragment
+            (the default is None).
+
+        Returns
+        -------
+        list of int or tuple
+            The tags of the disks, or if ``host`` is given, the tags of the disks
+            and of the host after fragmentation.
+
+        """
+        centers = _as_points(centers)
+        radii = np.broadcast_to(radii, len(centers))
+        args = [(*c, r, r) for c, r in zip(centers, radii)]
+        return self._add_objects(self.add_disk, args, host, 2)
+
+    def add_spheres(self, centers, radii, host=None):
+        """Add several spheres.
+
+        Parameters
+        ----------
+        centers : array of shape (N, 3)
+            Coordinates of the centers.
+        radii : float or array of shape (N,)
+            Radii of the spheres.
+        host : int or list of int
+            Volume(s) in which the spheres are embedded with a single fragment
+            (the default is None).
+
+        Returns
+        -------
+        list of int or tuple
+            The tags of the spheres, or if ``host`` is given, the tags of the
+            spheres and of the host after fragmentation.
+
+        """
+        centers = _as_points(centers)
+        radii = np.broadcast_to(radii, len(centers))
+        args = [(*c, r) for c, r in zip(centers, radii)]
+        return self._add_objects(self.add_sphere, args, host, 3)
+
+    def add_polygons(self, polygons, host=None, **kwargs):
+        """Add several polygons.
+
+        Parameters
+        ----------
+        polygons : list of arrays of shape (Npoints, 3)
+            Coordinates of the vertices of each polygon.
+        host : int or list of int
+            Surface(s) in which the polygons are embedded with a single fragment
+            (the default is None).
+        **kwargs : dict
+            Additional arguments passed to :meth:`add_polygon`.
+
+        Returns
+        -------
+        list of int or tuple
+            The tags of the polygons, or if ``host`` is given, the tags of the
+            polygons and of the host after fragmentation.
+
+        """
+        with self.batch():
+            tags = [self.add_polygon(_as_points(p), **kwargs) for p in polygons]
+        if host is None:
+            return tags
+        return self.fragment_inclusions(tags, host, 2)
+
     def rotate(self, tag, point, axis, angle, dim=None):
         dt = self.dimtag(tag, dim=dim)
         return occ.rotate(dt, *point, *axis, angle)
@@ -334,8 +581,7 @@ class Geometry:
         a1 = self.dimtag(id1, dim1)
         a2 = self.dimtag(id2, dim2)
         dimtags, mapping = occ.fragment(a1, a2, **kwargs)
-        if sync:
-            occ.synchronize()
+        self._synchronize(sync)
         tags = [_[1] for _ in dimtags]
         return (tags, mapping) if map else tags
 
@@ -345,8 +591,7 @@ class Geometry:
         a1 = self.dimtag(id1, dim1)
         a2 = self.dimtag(id2, dim2)
         dimtags, mapping = occ.intersect(a1, a2, **kwargs)
-        if sync:
-            occ.synchronize()
+        self._synchronize(sync)
         tags = [_[1] for _ in dimtags]
         return (tags, mapping) if map else tags
 
@@ -356,8 +601,7 @@ class Geometry:
         a1 = self.dimtag(id1, dim1)
         a2 = self.dimtag(id2, dim2)
         ov, ovv = occ.cut(a1, a2, **kwargs)
-        if sync:
-            occ.synchronize()
+        self._synchronize(sync)
         return [o[1] for o in ov]
 
     def fuse(self, id1, id2, dim1=None, dim2=None, sync=True):
@@ -366,8 +610,7 @@ class Geometry:
         a1 = self.dimtag(id1, dim1)
         a2 = self.dimtag(id2, dim2)
         ov, ovv = occ.fuse(a1, a2)
-        if sync:
-            occ.synchronize()
+        self._synchronize(sync)
         return [o[1] for o in ov]
 
     def get_boundaries(self, idf, dim=None, physical=True):
@@ -415,6 +658,7 @@ class Geometry:
         elif dim == 0:
             type_entity = "points"
 
+        self._operations.append(("set_mesh_size", (params,), dict(dim=dim)))
         # revert sort so that smaller sizes are set last
         params = dict(
             sorted(params.items(), key=lambda item: float(item[1]), reverse=True)
@@ -429,6 +673,75 @@ class Geometry:
             else:
                 self._set_size(idf, p, dim=dim)
 
+    def set_size_from_wavelength(
+        self,
+        wavelength,
+        epsilon,
+        mu=None,
+        degree=1,
+        points_per_wavelength=10,
+        points_per_skin_depth=3,
+        pmls=None,
+        min_size=None,
+        max_size=None,
+    ):
+        """Set the mesh sizes of the subdomains from the wavelength.
+
+        The size of each subdomain is computed with :func:`local_mesh_size`
+        from its materials, so that the local wavelength (or the skin depth in
+        metals) is resolved with the same accuracy everywhere.
+
+        Parameters
+        ----------
+        wavelength : float
+            The wavelength in vacuum.
+        epsilon : dict
+            Permittivities of the subdomains.
+        mu : dict
+            Permeabilities of the subdomains (the default is None, i.e. 1).
+        degree : int
+            The degree of the finite elements (the default is 1).
+        points_per_wavelength : float
+            Number of degrees of freedom per local wavelength (the default
+            is 10).
+        points_per_skin_depth : float
+            Number of degrees of freedom per skin depth (the default is 3).
+        pmls : list of PML
+            The PMLs. Their ``applied_domain`` is meshed like their
+            ``matched_domain`` (the default is None). Other subdomains without
+            materials are meshed as vacuum.
+        min_size : float
+            Minimum mesh size (the default is None).
+        max_size : float
+            Maximum mesh size (the default is None).
+
+        Returns
+        -------
+        dict
+            The mesh sizes of the subdomains.
+
+        """
+        mu = mu or {}
+        matched = {pml.applied_domain: pml.matched_domain for pml in pmls or []}
+        key = list(self.subdomains)[3 - self.dim]
+        sizes = {}
+        for name in self.subdomains[key]:
+            material = matched.get(name, name)
+            sizes[name] = local_mesh_size(
+                wavelength,
+                epsilon.get(material, 1),
+                mu.get(material, 1),
+                degree=degree,
+                points_per_wavelength=points_per_wavelength,
+                points_per_skin_depth=points_per_skin_depth,
+            )
+            if min_size is not None:
+                sizes[name] = max(sizes[name], min_size)
+            if max_size is not None:
+                sizes[name] = min(sizes[name], max_size)
+        self.set_mesh_size(sizes)
+        return sizes
+
     def set_size(self, idf, s, dim=None):
         if hasattr(idf, "__len__") and not isinstance(idf, str):
             for i, id_ in enumerate(idf):
@@ -522,6 +835,10 @@ class Geometry:
     def msh_file(self):
         return os.path.join(self.data_dir, self.mesh_name)
 
+    @property
+    def h5_file(self):
+        return os.path.splitext(self.msh_file)[0] + ".h5"
+
     def _build_serial(
         self,
         interactive=False,
@@ -582,7 +899,98 @@ class Geometry:
         type
             A dictionary containing the mesh and markers.
 
+        Notes
+        -----
+        If the geometry has a ``mesh_cache``, the mesh is looked up in the cache
+        with a key depending on the geometry, the mesh sizes and the meshing
+        options (see :meth:`mesh_cache_key`). On a hit, ``gmsh`` meshing is
+        skipped and the mesh, markers and subdomains are read from the cache.
+
+        """
+        kwargs = dict(
+            interactive=interactive,
+            generate_mesh=generate_mesh,
+            write_mesh=write_mesh,
+            read_info=read_info,
+            read_mesh=read_mesh,
+            finalize=finalize,
+            check_subdomains=check_subdomains,
+        )
+        # the cache files only store the vertices of curved meshes
+        cached = self.mesh_cache is not None and self.mesh_order == 1
+        if not cached or interactive or not generate_mesh or not read_mesh:
+            return self._build(**kwargs)
+        if check_subdomains:
+            self._check_subdomains()
+        kwargs["check_subdomains"] = False
+        key = self.comm.bcast(
+            self.mesh_cache_key() if self.comm.rank == 0 else None, root=0
+        )
+        if self.comm.bcast(key in self.mesh_cache, root=0):
+            # the gmsh mesh file is not written, see _restore_msh_file
+            self.data_dir = self.comm.bcast(self.data_dir, root=0)
+            self._mesh_cache_key = key
+            self.mesh_object, self.subdomains = self.mesh_cache.load(
+                key, comm=self.comm
+            )
+            if finalize:
+                gmsh.finalize()
+            if read_info:
+                self.read_mesh_info()
+            return self.mesh_object
+        self._build(**kwargs)
+        self.mesh_cache.store(key, self.mesh_object, self.subdomains)
+        return self.mesh_object
+
+    def mesh_cache_key(self):
+        """Key of the mesh in the cache.
+
+        It is a hash of the recorded geometry operations and mesh sizes, of the
+        resulting model entities and physical groups, and of the gmsh meshing
+        options.
+
+        Returns
+        -------
+        str
+            The key.
+
         """
+        model = self.model
+        options = {}
+        for name in _MESH_OPTIONS:
+            try:
+                options[name] = gmsh_options.get(name)
+            except Exception:
+                pass
+        data = dict(
+            geometry=type(self).__name__,
+            dim=self.dim,
+            gmsh=gmsh.__version__,
+            operations=self._operations,
+            entities=[
+                (dim, tag, model.getBoundingBox(dim, tag))
+                for dim, tag in model.getEntities()
+            ],
+            physicals=[
+                (dim, tag, model.getPhysicalName(dim, tag))
+                + tuple(model.getEntitiesForPhysicalGroup(dim, tag))
+                for dim, tag in model.getPhysicalGroups()
+            ],
+            options=options,
+            user_options=self.options,
+        )
+        return self.mesh_cache.key(data)
+
+    def _build(
+        self,
+        interactive=False,
+        generate_mesh=True,
+        write_mesh=True,
+        read_info=True,
+        read_mesh=True,
+        finalize=True,
+        check_subdomains=True,
+    ):
         if self.comm.size == 1:
             return self._build_serial(
                 interactive=interactive,
@@ -593,55 +1001,149 @@ class Geometry:
                 finalize=finalize,
                 check_subdomains=check_subdomains,
             )
+        if self.mesh_order > 1:
+            raise NotImplementedError(
+                "Second order meshes are only supported in serial"
+            )
+        hdf5 = read_mesh and dolfin.has_hdf5_parallel()
+        in_memory = read_mesh and not hdf5 and _can_distribute()
         if self.comm.rank == 0:
             self._build_serial(
                 interactive=interactive,
                 generate_mesh=generate_mesh,
-                write_mesh=write_mesh,
+                write_mesh=write_mesh or not (hdf5 or in_memory),
                 read_info=False,
                 read_mesh=False,
-                finalize=finalize,
+                finalize=finalize and not (hdf5 or in_memory),
                 check_subdomains=check_subdomains,
             )
+            if hdf5:
+                # the mesh is written once, then each process reads its own
+                # partition
+                mesh_object = read_gmsh_model(self.dim, comm=dolfin.MPI.comm_self)
+                write_mesh_hdf5(self.h5_file, mesh_object, self.subdomains)
+                del mesh_object
+                if finalize:
+                    gmsh.finalize()
             tmp = self.data_dir
         else:
             tmp = None
         tmp = self.comm.bcast(tmp, root=0)
         self.data_dir = tmp
-        self.mesh_object = self.read_mesh_file()
+        if hdf5:
+            self.mesh_object, self.subdomains = read_mesh_hdf5(
+                self.h5_file, comm=self.comm
+            )
+        elif in_memory:
+            # the mesh is built from the gmsh model of the first process and
+            # distributed, without reading files
+            self.mesh_object = self.read_mesh_model()
+            if finalize and self.comm.rank == 0:
+                gmsh.finalize()
+        else:
+            self.mesh_object = self.read_mesh_file()
         self.read_mesh_info()
 
         return self.mesh_object
 
-    def read_mesh_file(self, subdomains=None):
-        if subdomains is not None:
-            if isinstance(subdomains, str):
-                subdomains = [subdomains]
-            key = "volumes" if self.dim == 3 else "surfaces"
-            subdomains_num = [self.subdomains[key][s] for s in subdomains]
-        else:
-            subdomains_num = subdomains
+    def _subdomains_num(self, subdomains):
+        if subdomains is None:
+            return None
+        if isinstance(subdomains, str):
+            subdomains = [subdomains]
+        key = "volumes" if self.dim == 3 else "surfaces"
+        return [self.subdomains[key][s] for s in subdomains]
+
+    def _restore_msh_file(self):
+        # meshes loaded from the cache have no gmsh mesh file, which is written
+        # from the cached mesh when it is needed
+        if self._mesh_cache_key is None:
+            return
+        if self.comm.rank == 0 and not os.path.isfile(self.msh_file):
+            mesh_object, _ = self.mesh_cache.load(
+                self._mesh_cache_key, comm=dolfin.MPI.comm_self
+            )
+            _write_msh(self.msh_file, mesh_object)
+        self.comm.barrier()
 
+    def read_mesh_file(self, subdomains=None):
+        self._restore_msh_file()
         return read_mesh(
             self.msh_file,
             data_dir=self.data_dir,
             dim=self.dim,
-            subdomains=subdomains_num,
+            subdomains=self._subdomains_num(subdomains),
+        )
+
+    def read_mesh_model(self, subdomains=None):
+        """Transfer the mesh of the gmsh model to dolfin, in memory.
+
+        Parameters
+        ----------
+        subdomains : str or list of str
+            Names of the subdomains to keep (the default is None, i.e. all).
+
+        Returns
+        -------
+        dict
+            A dictionary containing the mesh and markers.
+
+        """
+        return read_gmsh_model(
+            dim=self.dim,
+            subdomains=self._subdomains_num(subdomains),
+            comm=self.comm,
         )
 
     # def extract_sub_mesh(self, subdomains):
     #     return self.read_mesh_file(subdomains=subdomains)["mesh"]
 
     def extract_sub_mesh(self, subdomains):
-        if self.comm.size == 1:
-            key = "volumes" if self.dim == 3 else "surfaces"
-            subdomains_num = self.subdomains[key][subdomains]
-            return dolfin.SubMesh(self.mesh, self.markers, subdomains_num)
-        outpath = (
-            run_submesh(self, subdomains, outpath=None) if self.comm.rank == 0 else None
+        if self.comm.size > 1 and not _has_mesh_view():
+            # the distributed submesh is read from the mesh file instead
+            return self.read_mesh_file(subdomains=subdomains)["mesh"]
+        key = "volumes" if self.dim == 3 else "surfaces"
+        subdomains_num = self.subdomains[key][subdomains]
+        return extract_submesh(self.mesh, self.markers, subdomains_num)
+
+    def distribute(self, comm):
+        """Copy of the geometry with its mesh distributed over a communicator.
+
+        The mesh and its markers are written to an HDF5 file and read back by
+        the processes of ``comm``, e.g. to run independent simulations on
+        groups of processes. The global indices of the cells are preserved.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+            The communicator, whose processes are a subset of those of the
+            geometry communicator.
+
+        Returns
+        -------
+        Geometry
+            The geometry, with the mesh distributed over ``comm``.
+
+        """
+        if self.comm.size > 1 and not dolfin.has_hdf5_parallel():
+            raise NotImplementedError(
+                "Distributing a mesh in parallel requires HDF5 with MPI support"
+            )
+        filename = self.comm.bcast(
+            os.path.join(self.data_dir, "distributed.h5")
+            if self.comm.rank == 0
+            else None,
+            root=0,
+        )
+        write_mesh_hdf5(filename, self.mesh_object, self.subdomains)
+        geometry = copy.copy(self)
+        geometry.comm = comm
+        geometry.measure = {}
+        geometry.mesh_object, geometry.subdomains = read_mesh_hdf5(
+            filename, comm=comm
         )
-        outpath = self.comm.bcast(outpath, root=0)
-        return read_xdmf_mesh(outpath)
+        geometry.read_mesh_info()
+        return geometry
 
     def generate_mesh(self, generate=True, write=True, read=True):
         if generate:
@@ -649,7 +1151,131 @@ class Geometry:
         if write:
             gmsh.write(self.msh_file)
         if read:
-            return self.read_mesh_file()
+            return self.read_mesh_model()
+
+    def refine(self, cell_markers=None):
+        """Refine the mesh.
+
+        The subdomain and boundary markers are transferred to the refined mesh.
+
+        Parameters
+        ----------
+        cell_markers : MeshFunction of bool
+            Cells to refine (the default is None, i.e. uniform refinement).
+
+        Returns
+        -------
+        dict
+            A dictionary containing the refined mesh and markers.
+
+        """
+        tdim = self.mesh.topology().dim()
+        algorithm = dolfin.parameters["refinement_algorithm"]
+        # parent facets are needed to transfer the boundary markers
+        dolfin.parameters["refinement_algorithm"] = "plaza_with_parent_facets"
+        try:
+            if cell_markers is None:
+                mesh = dolfin.refine(self.mesh)
+            else:
+                mesh = dolfin.refine(self.mesh, cell_markers)
+            markers = {
+                cell_type: dolfin.adapt(marker, mesh)
+                for cell_type, marker in self.mesh_object["markers"].items()
+                if marker.dim() in (tdim, tdim - 1)
+            }
+        finally:
+            dolfin.parameters["refinement_algorithm"] = algorithm
+        self.mesh_object = dict(mesh=mesh, markers=markers)
+        self.read_mesh_info()
+        return self.mesh_object
+
+    def smooth_displacement(self, boundary_values):
+        """Extend a displacement of some boundaries to the whole mesh.
+
+        The displacement is the solution of a vector Laplace problem, equal to
+        the given values on the given boundaries (or interfaces) and vanishing
+        on the other exterior boundaries.
+
+        Parameters
+        ----------
+        boundary_values : dict
+            The displacement (a Constant, an Expression or a tuple) on the
+            boundaries, with the names of the boundaries as keys.
+
+        Returns
+        -------
+        Function
+            The displacement, a continuous piecewise linear vector function.
+
+        """
+        mesh = self.mesh
+        gdim = mesh.geometric_dimension()
+        V = dolfin.VectorFunctionSpace(mesh, "CG", 1)
+        u = dolfin.TrialFunction(V)
+        v = dolfin.TestFunction(V)
+        zero = dolfin.Constant((0,) * gdim)
+        a = dolfin.inner(dolfin.grad(u), dolfin.grad(v)) * dolfin.dx
+        L = dolfin.inner(zero, v) * dolfin.dx
+        # later conditions take precedence on the vertices shared with the
+        # exterior boundary
+        bcs = [dolfin.DirichletBC(V, zero, "on_boundary")]
+        for name, value in boundary_values.items():
+            if not hasattr(value, "cpp_object"):
+                value = dolfin.Constant(value)
+            bcs.append(
+                dolfin.DirichletBC(
+                    V, value, self.boundary_markers, self.boundaries[name]
+                )
+            )
+        displacement = dolfin.Function(V)
+        dolfin.solve(
+            a == L, displacement, bcs, solver_parameters={"linear_solver": "mumps"}
+        )
+        return displacement
+
+    def morph(self, displacement, min_quality=0.1):
+        """Deform the mesh.
+
+        The vertices are moved by the displacement while the mesh topology is
+        kept, so that markers, measures, function spaces, sparsity patterns and
+        compiled forms remain valid: geometric parameter sweeps with small
+        shape changes do not require remeshing. The gmsh model is not modified.
+
+        Parameters
+        ----------
+        displacement : Function, Expression or Constant
+            The displacement of the vertices, e.g. from
+            :meth:`smooth_displacement`. It is interpolated on a continuous
+            piecewise linear vector space if not a Function.
+        min_quality : float
+            Minimum allowed radius ratio of the cells (the default is 0.1).
+
+        Returns
+        -------
+        bool
+            True if the mesh was deformed. False if the deformation would
+            invert some cells or degrade the quality below ``min_quality``, in
+            which case the mesh is left unchanged and the geometry should be
+            rebuilt instead.
+
+        """
+        mesh = self.mesh
+        if not isinstance(displacement, dolfin.Function):
+            V = dolfin.VectorFunctionSpace(mesh, "CG", 1)
+            displacement = dolfin.interpolate(displacement, V)
+        coordinates = mesh.coordinates().copy()
+        orientation = np.sign(_signed_volumes(mesh))
+        dolfin.ALE.move(mesh, displacement)
+        inverted = np.any(np.sign(_signed_volumes(mesh)) != orientation)
+        inverted = mesh.mpi_comm().allreduce(inverted, op=MPI.LOR)
+        quality = dolfin.MeshQuality.radius_ratio_min_max(mesh)[0]
+        if inverted or quality < min_quality:
+            mesh.coordinates()[:] = coordinates
+            mesh.bounding_box_tree().build(mesh)
+            return False
+        # invalidates the data computed from the coordinates
+        self.mesh_version += 1
+        return True
 
     def plot_mesh(self, ax=None, **kwargs):
         if ax is None:
@@ -668,6 +1294,17 @@ class Geometry:
             self.set_mesh_size({pml: s})
 
 
+def _signed_volumes(mesh):
+    """Signed volumes (up to a constant factor) of the simplices of a mesh."""
+    x = mesh.coordinates()
+    cells = mesh.cells()
+    edges = x[cells[:, 1:]] - x[cells[:, :1]]
+    if edges.shape[1] != edges.shape[2]:
+        # manifold meshes have no orientation
+        return np.ones(len(cells))
+    return np.linalg.det(edges)
+
+
 def is_on_plane(P, A, B, C, eps=dolfin.DOLFIN_EPS):
     Ax, Ay, Az = A
     Bx, By, Bz = B
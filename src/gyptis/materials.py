@@ -236,6 +236,76 @@ class Subdomain:
         return ClassReturn(markers, subdomains, mapping, cpp=cpp, **kwargs)
 
 
+def subdomain_indicator(markers, subdomains, domains):
+    """Indicator function of a set of subdomains.
+
+    Parameters
+    ----------
+    markers : MeshFunction
+        The cell markers.
+    subdomains : dict
+        Mapping from subdomain names to marker values.
+    domains : list of str
+        The names of the subdomains.
+
+    Returns
+    -------
+    Function
+        A DG0 function equal to 1 on the subdomains and 0 elsewhere.
+
+    """
+    V = dolfin.FunctionSpace(markers.mesh(), "DG", 0)
+    ids = [subdomains[d] for d in domains]
+    cells = np.where(np.isin(markers.array(), ids))[0]
+    dofmap = V.dofmap()
+    dofs = [dofmap.cell_dofs(int(c))[0] for c in cells]
+    indicator = dolfin.Function(V)
+    # values on ghost cells are set locally, so no ghost update is needed
+    vec = dolfin.as_backend_type(indicator.vector()).vec()
+    with vec.localForm() as local:
+        local.array[dofs] = 1
+    return indicator
+
+
+def _is_zero_value(v):
+    if iscomplex(v):
+        return _is_zero_value(v.real) and _is_zero_value(v.imag)
+    return np.isscalar(v) and v == 0
+
+
+def piecewise(markers, subdomains, mapping):
+    """Piecewise defined UFL expression.
+
+    Contrary to :class:`Subdomain`, the values can be any UFL expressions
+    (e.g. of the spatial coordinates), which are evaluated at quadrature
+    points instead of being interpolated.
+
+    Parameters
+    ----------
+    markers : MeshFunction
+        The cell markers.
+    subdomains : dict
+        Mapping from subdomain names to marker values.
+    mapping : dict
+        Mapping from subdomain names to values. Subdomains sharing the same
+        value object are grouped.
+
+    Returns
+    -------
+    Complex or UFL expression
+        The piecewise expression.
+
+    """
+    groups = {}
+    for dom, value in mapping.items():
+        if not _is_zero_value(value):
+            groups.setdefault(id(value), (value, []))[1].append(dom)
+    out = Complex(0, 0)
+    for value, domains in groups.values():
+        out = out + subdomain_indicator(markers, subdomains, domains) * value
+    return out
+
+
 def tensor_const(T, dim=3, real=False, const=True):
     if dim not in (2, 3):
         raise NotImplementedError("only supports dim = 2 or 3")
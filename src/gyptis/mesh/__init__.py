@@ -7,4 +7,5 @@
 # See the documentation at gyptis.gitlab.io
 
 
+from .cache import *
 from .mesh import *
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Benjamin Vial
+# This file is part of gyptis
+# Version: 1.1.2
+# License: MIT
+# See the documentation at gyptis.gitlab.io
+
+"""
+Content-addressed cache of meshes.
+"""
+
+__all__ = ["MeshCache"]
+
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from .. import dolfin
+from .mesh import read_mesh_hdf5, write_mesh_hdf5
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return repr(obj)
+
+
+class MeshCache:
+    """Cache of meshes, markers and subdomains stored in HDF5 files.
+
+    Entries are addressed by a hash of the data describing the mesh (geometry,
+    mesh sizes, meshing options...), so that identical geometries are only
+    meshed once, even across separate runs.
+
+    Parameters
+    ----------
+    directory : str
+        The cache directory (the default is None, i.e. the ``GYPTIS_CACHE_DIR``
+        environment variable if set, else ``~/.cache/gyptis/meshes``).
+    max_size : float
+        Maximum total size of the cache in bytes (the default is None, i.e.
+        unlimited). The least recently used entries are evicted first.
+    max_age : float
+        Maximum age of the entries in seconds since their last use (the
+        default is None, i.e. unlimited).
+
+    """
+
+    def __init__(self, directory=None, max_size=None, max_age=None):
+        if directory is None:
+            directory = os.environ.get(
+                "GYPTIS_CACHE_DIR",
+                os.path.join(os.path.expanduser("~"), ".cache", "gyptis", "meshes"),
+            )
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(data):
+        """Hash of some data.
+
+        Parameters
+        ----------
+        data : dict
+            The data describing the mesh. It should be serializable to JSON;
+            numpy arrays are converted to lists and other objects to their
+            ``repr``.
+
+        Returns
+        -------
+        str
+            The key.
+
+        """
+        dump = json.dumps(data, sort_keys=True, default=_json_default)
+        return hashlib.sha256(dump.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.h5")
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def entries(self):
+        """Cache entries.
+
+        Returns
+        -------
+        list of tuple
+            The path, size in bytes and last access time of the entries, from
+            the least to the most recently used.
+
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".h5"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Remove the entries that are too old or exceed the cache size."""
+        entries = self.entries()
+        if self.max_age is not None:
+            now = time.time()
+            for entry in [e for e in entries if now - e[2] > self.max_age]:
+                _remove(entry[0])
+                entries.remove(entry)
+        if self.max_size is not None:
+            size = sum(entry[1] for entry in entries)
+            for path, entry_size, _ in entries:
+                if size <= self.max_size:
+                    break
+                _remove(path)
+                size -= entry_size
+
+    def clear(self):
+        """Remove all entries."""
+        for path, _, _ in self.entries():
+            _remove(path)
+
+    def store(self, key, mesh_object, subdomains):
+        """Store a mesh.
+
+        Parameters
+        ----------
+        key : str
+            The key.
+        mesh_object : dict
+            The ``mesh`` and its ``markers``.
+        subdomains : dict
+            The subdomains dictionary of the geometry.
+
+        """
+        mesh = mesh_object["mesh"]
+        comm = mesh.mpi_comm()
+        path = self.path(key)
+        # write to a temporary file so that concurrent runs never read
+        # incomplete entries
+        tmp = comm.bcast(f"{path}.{os.getpid()}.tmp" if comm.rank == 0 else None)
+        write_mesh_hdf5(tmp, mesh_object, subdomains)
+        if comm.rank == 0:
+            os.replace(tmp, path)
+            self.evict()
+        comm.barrier()
+
+    def load(self, key, comm=None):
+        """Load a mesh.
+
+        Parameters
+        ----------
+        key : str
+            The key.
+        comm : MPI communicator
+            The communicator (the default is None, i.e. ``MPI.comm_world``).
+
+        Returns
+        -------
+        tuple
+            The mesh object (a dictionary with the ``mesh`` and its
+            ``markers``) and the subdomains dictionary.
+
+        """
+        comm = comm or dolfin.MPI.comm_world
+        path = self.path(key)
+        mesh_object, subdomains = read_mesh_hdf5(path, comm=comm)
+        if comm.rank == 0:
+            # the modification time is used as the last access time
+            os.utime(path)
+        return mesh_object, subdomains
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -6,57 +6,452 @@
 # License: MIT
 # See the documentation at gyptis.gitlab.io
 
+import json
 import os
 import tempfile
+from functools import lru_cache
 
+import gmsh
 import meshio
 import numpy as np
 from dolfin.cpp.mesh import MeshFunctionSizet
+from scipy.spatial import cKDTree
 
 from .. import ADJOINT, dolfin
 
+_BASE_CELL_TYPES = {1: "line", 2: "triangle", 3: "tetra"}
+_DOLFIN_CELL_TYPES = dict(line="interval", triangle="triangle", tetra="tetrahedron")
+_DIM_MAP = dict(vertex=0, line=1, triangle=2, tetra=3)
+# first and second order gmsh element types
+_GMSH_CELL_TYPES = {
+    15: "vertex",
+    1: "line",
+    2: "triangle",
+    4: "tetra",
+    8: "line3",
+    9: "triangle6",
+    11: "tetra10",
+}
+_SECOND_ORDER_CELL_TYPES = dict(line3="line", triangle6="triangle", tetra10="tetra")
+# value of unmarked entities, as for markers read from XDMF files
+_UNMARKED = np.iinfo(np.uintp).max
 
-def read_mesh(mesh_file, data_dir=None, data_dir_xdmf=None, dim=3, subdomains=None):
-    data_dir_xdmf = data_dir_xdmf or tempfile.mkdtemp()
+
+def _base_cell_type(dim):
+    return _BASE_CELL_TYPES.get(dim, "line")
+
+
+def _has_mesh_view():
+    # MeshView is only available in the mixed-dimensional branch of dolfin
+    return hasattr(dolfin, "MeshView")
+
+
+def _can_distribute():
+    partitioning = getattr(dolfin.cpp.mesh, "MeshPartitioning", None)
+    return hasattr(partitioning, "build_distributed_mesh")
+
+
+def _second_order_cell_type(dim):
+    base_cell_type = _base_cell_type(dim)
+    for cell_type, base in _SECOND_ORDER_CELL_TYPES.items():
+        if base == base_cell_type:
+            return cell_type
+
+
+def _linearize(cells, physicals):
+    # second order elements are marked through their vertices, which come
+    # first in their nodes; all the nodes of the cells are kept to build the
+    # curved geometry
+    linear_cells, linear_physicals = {}, {}
+    for cell_type, data in cells.items():
+        base = _SECOND_ORDER_CELL_TYPES.get(cell_type, cell_type)
+        linear_cells[base] = data[:, : _DIM_MAP[base] + 1]
+        linear_physicals[base] = physicals[cell_type]
+        if base != cell_type:
+            linear_cells[cell_type] = data
+    return linear_cells, linear_physicals
+
+
+def _select_subdomains(cells, physicals, dim, subdomains):
+    base_cell_type = _base_cell_type(dim)
+    if subdomains is None:
+        return cells, physicals
+    doms = subdomains if hasattr(subdomains, "__len__") else [subdomains]
+    mask = np.isin(physicals[base_cell_type], doms)
+    # only the markers of the cells are kept for submeshes
+    cell_types = [base_cell_type, _second_order_cell_type(dim)]
+    return (
+        {ct: cells[ct][mask] for ct in cell_types if ct in cells},
+        {base_cell_type: physicals[base_cell_type][mask]},
+    )
+
+
+def _compact(points, cells, dim):
+    # drop the nodes that are not nodes of the mesh cells
+    cell_type = _second_order_cell_type(dim)
+    used = np.unique(cells.get(cell_type, cells[_base_cell_type(dim)]))
+    index = np.full(len(points), -1, dtype=np.int64)
+    index[used] = np.arange(len(used))
+    return points[used], {ct: index[c] for ct, c in cells.items()}
+
+
+def gmsh_mesh_data(dim=3, subdomains=None):
+    """Mesh data of the current gmsh model.
+
+    Parameters
+    ----------
+    dim : int
+        Dimension of the mesh (the default is 3).
+    subdomains : int or list of int
+        Physical tags of the cells to keep (the default is None, i.e. all cells).
+
+    Returns
+    -------
+    dict
+        The nodes coordinates ``points``, and the vertices of the elements
+        ``cells`` and their physical tags ``physicals``, as dictionaries of
+        arrays indexed by cell type. For second order meshes, ``cells`` also
+        contains the nodes of the second order cells (e.g. ``triangle6``).
+
+    Notes
+    -----
+    The elements of each entity are taken once. An entity belonging to
+    several physical groups of the same dimension is marked with the
+    smallest of their tags, since markers hold one value per mesh entity.
+
+    """
+    node_tags, coords, _ = gmsh.model.mesh.getNodes()
+    points = coords.reshape(-1, 3)
+    index = np.zeros(int(node_tags.max()) + 1, dtype=np.int64)
+    index[node_tags.astype(np.int64)] = np.arange(len(node_tags))
+    cells, physicals = {}, {}
+    for edim, entity in gmsh.model.getEntities():
+        ptags = gmsh.model.getPhysicalGroupsForEntity(edim, entity)
+        if len(ptags) == 0:
+            continue
+        ptag = min(ptags)
+        types, tags, nodes = gmsh.model.mesh.getElements(edim, entity)
+        for gmsh_type, element_tags, element_nodes in zip(types, tags, nodes):
+            if gmsh_type not in _GMSH_CELL_TYPES:
+                continue
+            cell_type = _GMSH_CELL_TYPES[gmsh_type]
+            data = index[element_nodes.astype(np.int64)]
+            data = data.reshape(len(element_tags), -1)
+            cells.setdefault(cell_type, []).append(data)
+            physicals.setdefault(cell_type, []).append(np.full(len(data), ptag))
+    cells = {ct: np.vstack(c) for ct, c in cells.items()}
+    physicals = {ct: np.hstack(p) for ct, p in physicals.items()}
+    cells, physicals = _linearize(cells, physicals)
+    cells, physicals = _select_subdomains(cells, physicals, dim, subdomains)
+    points, cells = _compact(points, cells, dim)
+    return dict(points=points, cells=cells, physicals=physicals)
+
+
+def _meshio_mesh_data(mesh_file, dim=3, subdomains=None):
     meshio_mesh = meshio.read(mesh_file, file_format="gmsh")
-    if dim == 3:
-        base_cell_type = "tetra"
-    elif dim == 2:
-        base_cell_type = "triangle"
+    physicals = {
+        ct: data
+        for ct, data in meshio_mesh.cell_data_dict["gmsh:physical"].items()
+        if ct in _DIM_MAP or ct in _SECOND_ORDER_CELL_TYPES
+    }
+    cells = {
+        ct: np.vstack([c.data for c in meshio_mesh.cells if c.type == ct])
+        for ct in physicals
+    }
+    cells, physicals = _linearize(cells, physicals)
+    cells, physicals = _select_subdomains(cells, physicals, dim, subdomains)
+    points, cells = _compact(meshio_mesh.points, cells, dim)
+    return dict(points=points, cells=cells, physicals=physicals)
+
+
+@lru_cache(maxsize=None)
+def _mesh_editor():
+    here = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(here, "mesh_editor.cpp")) as f:
+        code = f.read()
+    return dolfin.compile_cpp_code(code)
+
+
+def _fill_mesh(mesh, points, cells, dim):
+    # the vertices and cells are added in a compiled loop
+    _mesh_editor().fill_mesh(
+        mesh,
+        np.ascontiguousarray(points, dtype=float),
+        np.ascontiguousarray(cells, dtype=np.uintp),
+        _DOLFIN_CELL_TYPES[_base_cell_type(dim)],
+    )
+
+
+def _row_keys(rows):
+    # one sortable key per row, independent of the order of the row entries
+    rows = np.ascontiguousarray(np.sort(rows, axis=1), dtype=np.int64)
+    return rows.view(np.dtype((np.void, rows.itemsize * rows.shape[1]))).ravel()
+
+
+def _mesh_function(mesh, global_vertices, dim, cells, physicals, ordered=True):
+    mesh_function = dolfin.MeshFunction("size_t", mesh, dim, _UNMARKED)
+    values = mesh_function.array()
+    if ordered and dim == mesh.topology().dim():
+        if mesh.mpi_comm().size > 1:
+            values[:] = physicals[np.asarray(mesh.topology().global_indices(dim))]
+        else:
+            values[:] = physicals
+        return mesh_function
+    if len(physicals) == 0 or mesh.num_entities(dim) == 0:
+        return mesh_function
+    if dim == 0:
+        entities = global_vertices[:, None]
+    else:
+        mesh.init(dim, 0)
+        connectivity = mesh.topology()(dim, 0)()
+        entities = global_vertices[connectivity.reshape(-1, dim + 1)]
+    keys = _row_keys(cells)
+    order = np.argsort(keys)
+    keys = keys[order]
+    query = _row_keys(entities)
+    position = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    found = keys[position] == query
+    values[found] = physicals[order[position[found]]]
+    return mesh_function
+
+
+def build_mesh(mesh_data, dim=3, comm=None):
+    """Build a dolfin mesh and its markers from arrays.
+
+    The mesh is built on the first process and distributed to the others.
+
+    Parameters
+    ----------
+    mesh_data : dict
+        The mesh data, as returned by :func:`gmsh_mesh_data`. It is only used
+        on the first process.
+    dim : int
+        Dimension of the mesh (the default is 3).
+    comm : MPI communicator
+        The communicator (the default is None, i.e. ``MPI.comm_world``).
+
+    Returns
+    -------
+    dict
+        The ``mesh`` and its ``markers`` (MeshFunctions indexed by cell type).
+
+    Notes
+    -----
+    If the mesh data contains second order cells, the mesh has a curved
+    quadratic geometry. This is only supported in serial.
+
+    """
+    comm = comm or dolfin.MPI.comm_world
+    if comm.bcast(
+        comm.rank == 0 and _second_order_cell_type(dim) in mesh_data["cells"],
+        root=0,
+    ):
+        return _build_curved_mesh(mesh_data, dim, comm)
+    base_cell_type = _base_cell_type(dim)
+    dolfin_mesh = dolfin.Mesh(comm)
+    if comm.rank == 0:
+        points = mesh_data["points"]
+        points = points if dim == 3 else points[:, :2]
+        _fill_mesh(dolfin_mesh, points, mesh_data["cells"][base_cell_type], dim)
+    if comm.size > 1:
+        dolfin.cpp.mesh.MeshPartitioning.build_distributed_mesh(dolfin_mesh)
+        if comm.rank == 0:
+            mesh_data = dict(cells=mesh_data["cells"], physicals=mesh_data["physicals"])
+            mesh_data["cells"] = {
+                ct: c for ct, c in mesh_data["cells"].items() if ct != base_cell_type
+            }
+        mesh_data = comm.bcast(mesh_data, root=0)
+        global_vertices = np.array(dolfin_mesh.topology().global_indices(0))
     else:
-        base_cell_type = "line"
+        global_vertices = np.arange(dolfin_mesh.num_vertices())
+
+    markers = {}
+    for cell_type, physicals in mesh_data["physicals"].items():
+        markers[cell_type] = _mesh_function(
+            dolfin_mesh,
+            global_vertices,
+            _DIM_MAP[cell_type],
+            mesh_data["cells"].get(cell_type),
+            physicals,
+        )
+    return dict(mesh=dolfin_mesh, markers=markers)
+
 
-    points = meshio_mesh.points if dim == 3 else meshio_mesh.points[:, :2]
-    physicals = meshio_mesh.cell_data_dict["gmsh:physical"]
+def _build_curved_mesh(mesh_data, dim, comm):
+    if comm.size > 1:
+        raise NotImplementedError("Second order meshes are only supported in serial")
+    points = mesh_data["points"]
+    points = points if dim == 3 else points[:, :2]
+    cell_type = _second_order_cell_type(dim)
+    # dolfin builds the quadratic geometry when reading second order XDMF cells
+    filename = os.path.join(tempfile.mkdtemp(), f"{cell_type}.xdmf")
+    meshio.xdmf.write(
+        filename,
+        meshio.Mesh(points=points, cells={cell_type: mesh_data["cells"][cell_type]}),
+    )
+    dolfin_mesh = dolfin.Mesh(comm)
+    with dolfin.XDMFFile(comm, filename) as infile:
+        infile.read(dolfin_mesh)
+    # the vertices are renumbered, and come first in the geometry points
+    vertices = dolfin_mesh.coordinates()[: dolfin_mesh.num_vertices()]
+    _, global_vertices = cKDTree(points).query(vertices)
+    markers = {}
+    for cell_type, physicals in mesh_data["physicals"].items():
+        markers[cell_type] = _mesh_function(
+            dolfin_mesh,
+            global_vertices,
+            _DIM_MAP[cell_type],
+            mesh_data["cells"][cell_type],
+            physicals,
+            ordered=False,
+        )
+    return dict(mesh=dolfin_mesh, markers=markers)
+
+
+def read_gmsh_model(dim=3, subdomains=None, comm=None):
+    """Transfer the mesh of the current gmsh model to dolfin.
+
+    The nodes, elements and physical tags are taken from the gmsh API and the
+    dolfin mesh is built in memory, without writing files.
+
+    Parameters
+    ----------
+    dim : int
+        Dimension of the mesh (the default is 3).
+    subdomains : int or list of int
+        Physical tags of the cells to keep (the default is None, i.e. all cells).
+    comm : MPI communicator
+        The communicator (the default is None, i.e. ``MPI.comm_world``). The gmsh
+        model is only needed on the first process.
+
+    Returns
+    -------
+    dict
+        The ``mesh`` and its ``markers``.
+
+    """
+    comm = comm or dolfin.MPI.comm_world
+    mesh_data = gmsh_mesh_data(dim, subdomains) if comm.rank == 0 else None
+    return build_mesh(mesh_data, dim=dim, comm=comm)
+
+
+def write_mesh_hdf5(filename, mesh_object, subdomains=None):
+    """Write a mesh and its markers to an HDF5 file.
+
+    The file can be read in parallel, each process reading only its own
+    partition (see :func:`read_mesh_hdf5`).
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+    mesh_object : dict
+        The ``mesh`` and its ``markers``.
+    subdomains : dict
+        The subdomains dictionary of the geometry (the default is None).
+
+    """
+    mesh = mesh_object["mesh"]
+    markers = mesh_object["markers"]
+    with dolfin.HDF5File(mesh.mpi_comm(), filename, "w") as f:
+        f.write(mesh, "/mesh")
+        for cell_type, marker in markers.items():
+            f.write(marker, f"/markers/{cell_type}")
+        attributes = f.attributes("/mesh")
+        attributes["subdomains"] = json.dumps(subdomains or {})
+        attributes["markers"] = json.dumps(list(markers))
+
+
+def _write_msh(filename, mesh_object):
+    # write a serial mesh and its markers to a gmsh file, the marked entities
+    # being the elements
+    mesh = mesh_object["mesh"]
+    points = mesh.coordinates()
+    points = np.hstack([points, np.zeros((len(points), 3 - points.shape[1]))])
+    cells, physicals = [], []
+    for cell_type, marker in mesh_object["markers"].items():
+        dim = _DIM_MAP[cell_type]
+        if dim == 0:
+            entities = np.arange(mesh.num_vertices())[:, None]
+        else:
+            mesh.init(dim, 0)
+            entities = mesh.topology()(dim, 0)().reshape(-1, dim + 1)
+        values = marker.array()
+        marked = values != _UNMARKED
+        cells.append((cell_type, entities[marked]))
+        physicals.append(values[marked].astype(int))
+    meshio.write(
+        filename,
+        meshio.Mesh(
+            points,
+            cells,
+            cell_data={"gmsh:physical": physicals, "gmsh:geometrical": physicals},
+        ),
+        file_format="gmsh22",
+    )
+
+
+def read_mesh_hdf5(filename, comm=None):
+    """Read a mesh and its markers from an HDF5 file.
+
+    In parallel, each process reads its own part of the file and the mesh is
+    partitioned, so that it is never loaded entirely on a single process.
+
+    Parameters
+    ----------
+    filename : str
+        The file name, as written by :func:`write_mesh_hdf5`.
+    comm : MPI communicator
+        The communicator (the default is None, i.e. ``MPI.comm_world``).
+
+    Returns
+    -------
+    tuple
+        The mesh object (a dictionary with the ``mesh`` and its ``markers``) and
+        the subdomains dictionary.
 
-    cell_types, data_gmsh = zip(*physicals.items())
-    data_gmsh = list(data_gmsh)
-    cells = {ct: [] for ct in cell_types}
+    """
+    comm = comm or dolfin.MPI.comm_world
+    mesh = dolfin.Mesh(comm)
+    with dolfin.HDF5File(comm, filename, "r") as f:
+        f.read(mesh, "/mesh", False)
+        attributes = f.attributes("/mesh")
+        subdomains = json.loads(attributes["subdomains"])
+        markers = {}
+        for cell_type in json.loads(attributes["markers"]):
+            marker = dolfin.MeshFunction("size_t", mesh, _DIM_MAP[cell_type])
+            f.read(marker, f"/markers/{cell_type}")
+            markers[cell_type] = marker
+    return dict(mesh=mesh, markers=markers), subdomains
+
+
+def read_mesh(mesh_file, data_dir=None, data_dir_xdmf=None, dim=3, subdomains=None):
+    comm = dolfin.MPI.comm_world
+    if comm.size > 1 and not _can_distribute():
+        return _read_mesh_xdmf(mesh_file, data_dir_xdmf, dim, subdomains)
+    mesh_data = (
+        _meshio_mesh_data(mesh_file, dim=dim, subdomains=subdomains)
+        if comm.rank == 0
+        else None
+    )
+    return build_mesh(mesh_data, dim=dim, comm=comm)
+
+
+def _read_mesh_xdmf(mesh_file, data_dir_xdmf=None, dim=3, subdomains=None):
+    data_dir_xdmf = data_dir_xdmf or tempfile.mkdtemp()
+    base_cell_type = _base_cell_type(dim)
+    mesh_data = _meshio_mesh_data(mesh_file, dim=dim, subdomains=subdomains)
+    points = mesh_data["points"]
+    points = points if dim == 3 else points[:, :2]
+    cell_types = list(mesh_data["physicals"].keys())
 
     for cell_type in cell_types:
-        for cell in meshio_mesh.cells:
-            if cell.type == cell_type:
-                cells[cell_type].append(cell.data)
-        cells[cell_type] = np.vstack(cells[cell_type])
-
-    icell = np.where(np.array(cell_types) == base_cell_type)[0][0]
-    if subdomains is not None:
-        doms = subdomains if hasattr(subdomains, "__len__") else [subdomains]
-        mask = np.hstack([np.where(data_gmsh[icell] == i) for i in doms])[0]
-        data_gmsh_ = data_gmsh[icell][mask]
-        data_gmsh[icell] = data_gmsh_
-        cells[base_cell_type] = cells[base_cell_type][mask]
-
-    mesh_data = {}
-
-    for cell_type, data in zip(cell_types, data_gmsh):
         meshio_data = meshio.Mesh(
             points=points,
-            cells={cell_type: cells[cell_type]},
-            cell_data={cell_type: [data]},
+            cells={cell_type: mesh_data["cells"][cell_type]},
+            cell_data={cell_type: [mesh_data["physicals"][cell_type]]},
         )
         meshio.xdmf.write(f"{data_dir_xdmf}/{cell_type}.xdmf", meshio_data)
-        mesh_data[cell_type] = meshio_data
 
     dolfin_mesh = dolfin.Mesh()
     with dolfin.XDMFFile(
@@ -65,11 +460,8 @@ def read_mesh(mesh_file, data_dir=None, data_dir_xdmf=None, dim=3, subdomains=No
         infile.read(dolfin_mesh)
 
     markers = {}
-    dim_map = dict(vertex=0, line=1, triangle=2, tetra=3)
-    if subdomains is not None:
-        cell_types = [base_cell_type]
     for cell_type in cell_types:
-        mvc = dolfin.MeshValueCollection("size_t", dolfin_mesh, dim_map[cell_type])
+        mvc = dolfin.MeshValueCollection("size_t", dolfin_mesh, _DIM_MAP[cell_type])
         try:
             with dolfin.XDMFFile(
                 dolfin_mesh.mpi_comm(), f"{data_dir_xdmf}/{cell_type}.xdmf"
@@ -95,14 +487,85 @@ class MarkedMesh:
         self.dimension = self.mesh.geometric_dimension()
 
 
-def run_submesh(geom, subdomain, outpath=None):
-    outpath = outpath or os.path.join(tempfile.mkdtemp(), "submesh.xdmf")
-    fname = os.path.join(os.path.dirname(__file__), "_submesh.py")
-    meshname = os.path.join(geom.data_dir, geom.mesh_name)
-    domnum = geom.domains[subdomain]
-    dim = geom.dim
-    os.system(f"mpirun -n 1 python {fname} {meshname} {domnum} {dim} {outpath}")
-    return outpath
+def extract_submesh(mesh, markers, subdomain):
+    """Extract the mesh of a subdomain.
+
+    In parallel, each process extracts the marked cells it owns, so that the
+    submesh keeps the distribution of its parent mesh and is built without
+    gathering cells on a single process.
+
+    Parameters
+    ----------
+    mesh : Mesh
+        The parent mesh.
+    markers : MeshFunction
+        The cell markers.
+    subdomain : int
+        The marker value of the subdomain.
+
+    Returns
+    -------
+    Mesh
+        The submesh. The local indices of the parent cells are stored in its
+        mesh data array ``parent_cell_indices`` (serial) or in the mapping of
+        its topology to the parent mesh (parallel).
+
+    Raises
+    ------
+    NotImplementedError
+        In parallel, if dolfin has no ``MeshView``.
+
+    """
+    if mesh.mpi_comm().size == 1:
+        return dolfin.SubMesh(mesh, markers, subdomain)
+    return _extract_distributed_submesh(mesh, markers, subdomain)
+
+
+def _extract_distributed_submesh(mesh, markers, subdomain):
+    if not _has_mesh_view():
+        raise NotImplementedError(
+            "Extracting submeshes in parallel requires dolfin.MeshView"
+        )
+    tdim = mesh.topology().dim()
+    selected = dolfin.MeshFunction("size_t", mesh, tdim, 0)
+    values = selected.array()
+    values[:] = markers.array() == subdomain
+    # ghost cells are extracted by their owner only
+    values[mesh.topology().ghost_offset(tdim) :] = 0
+    return dolfin.MeshView.create(selected, 1)
+
+
+def parent_cell_indices(submesh, mesh):
+    """Local indices of the parent cells of a submesh.
+
+    Parameters
+    ----------
+    submesh : Mesh
+        The submesh, as returned by :func:`extract_submesh`.
+    mesh : Mesh
+        The parent mesh.
+
+    Returns
+    -------
+    numpy array or None
+        The index of the parent cell of each cell of the submesh, or None if
+        ``submesh`` is not a submesh of ``mesh``.
+
+    """
+    tdim = submesh.topology().dim()
+    if mesh.topology().dim() != tdim:
+        return None
+    mapping = getattr(submesh.topology(), "mapping", dict)()
+    if mesh.id() in mapping:
+        parent = np.asarray(mapping[mesh.id()].cell_map())
+    else:
+        try:
+            parent = np.asarray(submesh.data().array("parent_cell_indices", tdim))
+        except Exception:
+            return None
+    if len(parent) != submesh.num_cells():
+        return None
+    return parent
 
 
 def read_xdmf_mesh(outpath):
@@ -0,0 +1,43 @@
+#include <pybind11/pybind11.h>
+#include <pybind11/eigen.h>
+#include <vector>
+
+namespace py = pybind11;
+#include <dolfin/mesh/CellType.h>
+#include <dolfin/mesh/Mesh.h>
+#include <dolfin/mesh/MeshEditor.h>
+
+using Points = Eigen::Matrix<double, Eigen::Dynamic, Eigen::Dynamic, Eigen::RowMajor>;
+using Cells = Eigen::Matrix<std::size_t, Eigen::Dynamic, Eigen::Dynamic, Eigen::RowMajor>;
+
+// Fill a mesh with the vertices and cells given as arrays, without a call
+// back to Python for each entity
+void fill_mesh(dolfin::Mesh& mesh, Eigen::Ref<const Points> points,
+               Eigen::Ref<const Cells> cells, std::string cell_type)
+{
+        dolfin::MeshEditor editor;
+        editor.open(mesh, dolfin::CellType::string2type(cell_type),
+                    cells.cols() - 1, points.cols());
+        editor.init_vertices(points.rows());
+        editor.init_cells(cells.rows());
+        std::vector<double> x(points.cols());
+        for (int i = 0; i < points.rows(); ++i)
+        {
+                for (int j = 0; j < points.cols(); ++j)
+                        x[j] = points(i, j);
+                editor.add_vertex(i, x);
+        }
+        std::vector<std::size_t> v(cells.cols());
+        for (int i = 0; i < cells.rows(); ++i)
+        {
+                for (int j = 0; j < cells.cols(); ++j)
+                        v[j] = cells(i, j);
+                editor.add_cell(i, v);
+        }
+        editor.close();
+}
+
+PYBIND11_MODULE(SIGNATURE, m)
+{
+        m.def("fill_mesh", &fill_mesh);
+}
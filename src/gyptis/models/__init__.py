@@ -6,6 +6,7 @@
 # License: MIT
 # See the documentation at gyptis.gitlab.io
 
+from .adaptivity import *
 from .grating2d import *
 from .grating3d import *
 from .hc2d import *
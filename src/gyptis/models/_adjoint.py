@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Benjamin Vial
+# This file is part of gyptis
+# Version: 1.1.2
+# License: MIT
+# See the documentation at gyptis.gitlab.io
+
+"""
+Annotation of linear solves reusing the forward LU factorization
+for the adjoint solves.
+"""
+
+from functools import lru_cache
+
+from .. import dolfin
+
+
+def _state(mat):
+    """State counter of a PETSc object, increased when it is modified."""
+    # not available in old petsc4py versions
+    state = getattr(mat, "stateGet", None)
+    return state() if state is not None else None
+
+
+@lru_cache(maxsize=None)
+def _solve_block_type():
+    from fenics_adjoint.blocks.assembly import assemble_adjoint_value
+    from fenics_adjoint.solving import SolveLinearSystemBlock
+
+    class FactorizedSolveBlock(SolveLinearSystemBlock):
+        """Linear solve block using the forward factorization for the adjoint.
+
+        The adjoint system matrix is the transpose of the forward one, so the
+        adjoint equation is solved with a transpose solve on the existing
+        factorization instead of assembling and factorizing it again.
+        When the tape is replayed, the block factorizes the new operator with
+        its own LU solver, which is then used for the adjoint.
+        If the factorization has changed since the forward solve (e.g. the
+        solver was reused with another matrix), the default dolfin-adjoint
+        behaviour is used.
+        """
+
+        def __init__(self, A, x, b, ksp):
+            super().__init__(A, x, b)
+            self.replay_solver = None
+            self._set_factorization(ksp, dolfin.as_backend_type(A).mat())
+
+        def _set_factorization(self, ksp, operator):
+            self.ksp = ksp
+            # a reference to the operator is kept so that its handle cannot be
+            # reused by another matrix while the block exists
+            self.operator = operator
+            self.operator_state = _state(operator)
+
+        def _forward_solve(self, lhs, rhs, func, bcs, **kwargs):
+            assemble_kwargs = self.assemble_kwargs.copy()
+            assemble_kwargs["bcs"] = bcs
+            A = assemble_adjoint_value(lhs, **assemble_kwargs)
+            b = dolfin.assemble(rhs)
+            for bc in bcs:
+                bc.apply(b)
+            if self.ident_zeros_tol is not None:
+                A.ident_zeros(self.ident_zeros_tol)
+            if self.replay_solver is None:
+                self.replay_solver = dolfin.PETScLUSolver(A.mpi_comm(), "mumps")
+            self.replay_solver.set_operator(A)
+            self.replay_solver.solve(func.vector(), b)
+            self._set_factorization(
+                self.replay_solver.ksp(), dolfin.as_backend_type(A).mat()
+            )
+            return func
+
+        def _factorization_valid(self):
+            if self.ksp is None:
+                return False
+            operator = self.ksp.getOperators()[0]
+            return (
+                operator.handle == self.operator.handle
+                and _state(operator) == self.operator_state
+            )
+
+        def _assemble_and_solve_adj_eq(self, dFdu_adj_form, dJdu, compute_bdy):
+            if not self._factorization_valid():
+                return super()._assemble_and_solve_adj_eq(
+                    dFdu_adj_form, dJdu, compute_bdy
+                )
+            dJdu_copy = dJdu.copy()
+            bcs = self._homogenize_bcs()
+            for bc in bcs:
+                bc.apply(dJdu)
+            adj_sol = dolfin.Function(self.function_space)
+            adj_vec = dolfin.as_backend_type(adj_sol.vector())
+            # the forward matrix has its Dirichlet rows replaced by identity rows,
+            # so solving with its transpose and zeroing the Dirichlet dofs gives
+            # the same adjoint as the homogenized adjoint system
+            self.ksp.solveTranspose(dolfin.as_backend_type(dJdu).vec(), adj_vec.vec())
+            adj_vec.update_ghost_values()
+            for bc in bcs:
+                bc.apply(adj_sol.vector())
+            adj_sol_bdy = None
+            if compute_bdy:
+                adj_sol_bdy = dolfin.Function(self.function_space)
+                adj_sol_bdy.vector()[:] = dJdu_copy - dolfin.assemble(
+                    dolfin.action(dFdu_adj_form, adj_sol)
+                )
+            return adj_sol, adj_sol_bdy
+
+    return FactorizedSolveBlock
+
+
+def annotated_factorized_solve(solver, A, x, b):
+    """Solve a linear system with a PETSc LU solver and record it on the tape.
+
+    Parameters
+    ----------
+    solver : dolfin.PETScLUSolver
+        The LU solver, with its operator set to ``A``.
+    A : Matrix
+        The (annotated) assembled matrix.
+    x : Vector
+        The solution vector of a Function.
+    b : Vector
+        The (annotated) assembled right hand side.
+
+    """
+    from pyadjoint import annotate_tape, get_working_tape, stop_annotating
+
+    if not annotate_tape():
+        return solver.solve(x, b)
+    block = _solve_block_type()(A, x, b, solver.ksp())
+    get_working_tape().add_block(block)
+    with stop_annotating():
+        solver.solve(x, b)
+    block.add_output(x.function.create_block_variable())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Benjamin Vial
+# This file is part of gyptis
+# Version: 1.1.2
+# License: MIT
+# See the documentation at gyptis.gitlab.io
+
+"""
+Adaptive mesh refinement.
+"""
+
+__all__ = ["dorfler_marking", "adaptive_solve"]
+
+
+import numpy as np
+from mpi4py import MPI
+
+from .. import dolfin
+
+
+def dorfler_marking(mesh, indicators, fraction=0.5):
+    """Mark the cells with the largest error indicators.
+
+    The smallest set of cells whose squared indicators sum to at least
+    ``fraction`` of the total is marked (Dörfler marking). The threshold is
+    found by bisection, which only needs global sums in parallel.
+
+    Parameters
+    ----------
+    mesh : Mesh
+        The mesh.
+    indicators : numpy array
+        The error indicators of the local cells.
+    fraction : float
+        The bulk fraction (the default is 0.5).
+
+    Returns
+    -------
+    MeshFunction of bool
+        The marked cells.
+
+    """
+    comm = mesh.mpi_comm()
+    squared = np.asarray(indicators) ** 2
+    total = comm.allreduce(squared.sum(), op=MPI.SUM)
+    low = 0.0
+    high = comm.allreduce(squared.max(initial=0.0), op=MPI.MAX)
+    for _ in range(60):
+        threshold = 0.5 * (low + high)
+        marked = comm.allreduce(squared[squared >= threshold].sum(), op=MPI.SUM)
+        if marked >= fraction * total:
+            low = threshold
+        else:
+            high = threshold
+    markers = dolfin.MeshFunction("bool", mesh, mesh.topology().dim(), False)
+    markers.array()[:] = squared >= low
+    return markers
+
+
+def adaptive_solve(
+    make_simulation,
+    quantity,
+    tol=1e-3,
+    max_iterations=10,
+    fraction=0.5,
+    max_dofs=None,
+):
+    """Solve a problem with adaptive mesh refinement.
+
+    At each step, the simulation is solved, cells are marked from the
+    recovery based error indicators and the mesh of the geometry is refined
+    locally. The refinement stops when the relative change of the quantity of
+    interest between two steps is below ``tol``.
+
+    Parameters
+    ----------
+    make_simulation : callable
+        Function without arguments returning a simulation built on the current
+        mesh of its geometry. It is called after each refinement; sources
+        defined on the mesh should be created inside this function.
+    quantity : callable
+        Function of the solved simulation returning the quantity of interest,
+        e.g. ``lambda s: s.scattering_cross_section()``.
+    tol : float
+        Tolerance on the relative change of the quantity (the default is 1e-3).
+    max_iterations : int
+        Maximum number of refinements (the default is 10).
+    fraction : float
+        Bulk fraction for the marking (the default is 0.5).
+    max_dofs : int
+        Stop when the number of degrees of freedom exceeds this value (the
+        default is None).
+
+    Returns
+    -------
+    tuple
+        The last simulation and the history of the refinement (a list of
+        dictionaries with the number of degrees of freedom ``ndof``, the
+        quantity ``value`` and the global error ``estimate``).
+
+    """
+    history = []
+    for iteration in range(max_iterations + 1):
+        simulation = make_simulation()
+        simulation.solve()
+        value = quantity(simulation)
+        indicators = simulation.error_indicators()
+        comm = simulation.mesh.mpi_comm()
+        estimate = np.sqrt(comm.allreduce(np.sum(indicators**2), op=MPI.SUM))
+        history.append(dict(ndof=simulation.ndof, value=value, estimate=estimate))
+        if len(history) > 1:
+            previous = history[-2]["value"]
+            if abs(value - previous) <= tol * abs(value):
+                break
+        if iteration == max_iterations:
+            break
+        if max_dofs is not None and simulation.ndof >= max_dofs:
+            break
+        markers = dorfler_marking(simulation.mesh, indicators, fraction)
+        simulation.geometry.refine(markers)
+    return simulation, history
@@ -88,7 +88,7 @@ class Grating2D(_GratingBase, Simulation):
 
     def solve_system(self, again=False):
         uper = super().solve_system(again=again, vector_function=False)
-        u_annex = self.formulation.annex_field["as_subdomain"]["stack"]
+        u_annex = self.formulation.annex
         u = uper * self.formulation.phasor
         self.solution = {"periodic": uper, "diffracted": u, "total": u + u_annex}
         return u
@@ -215,7 +215,7 @@ class Grating2D(_GratingBase, Simulation):
             xi = self.formulation.xi.as_property()
             for d in doms_no_pml:
                 nrj_chi_dens = (
-                    dolfin.Constant(-0.5 * chi_0 * omega) * chi[d] * abs(u_tot) ** 2
+                    dolfin.Constant(-0.5 * chi_0 * omega) * chi[d] * u_tot.abs2()
                 ).imag
 
                 nrj_xi_dens = (
@@ -230,7 +230,7 @@ class Grating2D(_GratingBase, Simulation):
             chi = self.formulation.chi.as_subdomain()
             xi = self.formulation.xi.as_subdomain()
             nrj_chi_dens = (
-                dolfin.Constant(-0.5 * chi_0 * omega) * chi * abs(u_tot) ** 2
+                dolfin.Constant(-0.5 * chi_0 * omega) * chi * u_tot.abs2()
             ).imag
 
             nrj_xi_dens = (
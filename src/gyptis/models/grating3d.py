@@ -87,7 +87,7 @@ class Grating3D(_GratingBase, Simulation):
 
     def solve_system(self, again=False):
         uper = super().solve_system(again=again, vector_function=False)
-        u_annex = self.formulation.annex_field["as_subdomain"]["stack"]
+        u_annex = self.formulation.annex
         u = uper * self.formulation.phasor
         self.solution = {"periodic": uper, "diffracted": u, "total": u + u_annex}
         return u
@@ -78,7 +78,8 @@ class Scatt2D(_ScatteringBase, Simulation):
 
     def solve_system(self, again=False):
         u = super().solve_system(again=again, vector_function=False)
-        self.solution = {"diffracted": u, "total": u + self.source.expression}
+        total = self.formulation.add_annex(u, self.solution_function)
+        self.solution = {"diffracted": u, "total": total}
         return u
 
     @property
@@ -91,7 +92,7 @@ class Scatt2D(_ScatteringBase, Simulation):
         vscatt = self.formulation.get_dual(uscatt)
         utot = self.solution["total"]
         vtot = self.formulation.get_dual(utot)
-        ui = self.source.expression
+        ui = self.formulation.annex
         vi = self.formulation.get_dual(ui)
 
         parallel = dolfin.MPI.comm_world.size > 1
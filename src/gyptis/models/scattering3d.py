@@ -85,7 +85,8 @@ class Scatt3D(_ScatteringBase, Simulation):
 
     def solve_system(self, again=False):
         E = super().solve_system(again=again, vector_function=False)
-        self.solution = {"diffracted": E, "total": E + self.source.expression}
+        total = self.formulation.add_annex(E, self.solution_function)
+        self.solution = {"diffracted": E, "total": total}
         return E
 
     def _cross_section_helper(self, return_type="s", boundaries="calc_bnds"):
@@ -106,7 +107,7 @@ class Scatt3D(_ScatteringBase, Simulation):
         Hs = inv_mu_coeff / Complex(0, dolfin.Constant(omega * mu_0)) * curl(Es)
         Ss = dolfin.Constant(0.5) * cross(Es, Hs.conj).real
 
-        Ei = self.source.expression
+        Ei = self.formulation.annex
         mu_a = self.formulation.mu.build_annex(
             domains=self.formulation.source_domains,
             reference=self.formulation.reference,
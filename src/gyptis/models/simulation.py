@@ -22,6 +22,7 @@ from ..materials import _check_len
 from ..sources import *
 from ..utils import project_iterative
 from ..utils.helpers import array2function
+from ._adjoint import annotated_factorized_solve
 
 
 def _complexify_items(dictio):
@@ -43,8 +44,23 @@ def init_em_materials(geometry, epsilon=None, mu=None):
     return epsilon, mu
 
 
+# values of the MUMPS ICNTL(7) parameter
+_LU_ORDERINGS = dict(amd=0, amf=2, scotch=3, pord=4, metis=5, qamd=6, auto=7)
+
+
+def _num_owned_cells(mesh):
+    tdim = mesh.topology().dim()
+    if mesh.mpi_comm().size == 1:
+        return mesh.num_cells()
+    return mesh.topology().ghost_offset(tdim)
+
+
 class Simulation:
-    def __init__(self, geometry, formulation=None, direct=True, solver=None):
+    def __init__(
+        self, geometry, formulation=None, direct=True, solver=None, lu_ordering=None
+    ):
+        if lu_ordering is not None and lu_ordering not in _LU_ORDERINGS:
+            raise ValueError(f"Unknown LU ordering {lu_ordering}")
         self.geometry = geometry
         self.formulation = formulation
         self.coefficients = formulation.coefficients
@@ -60,6 +76,10 @@ class Simulation:
         self.direct = direct
         self.ndof = self.function_space.dim()
         self.solver = solver
+        # fill-reducing ordering of the direct solver, e.g. "metis" or
+        # "scotch" for nested dissection (the default lets MUMPS choose)
+        self.lu_ordering = lu_ordering
+        self._factorization_lu_ordering = None
 
     @property
     def source(self):
@@ -70,6 +90,20 @@ class Simulation:
         self.formulation.source = value
         self._source = value
 
+    @property
+    def factorization(self):
+        """The PETSc KSP holding the LU factorization of the system matrix.
+
+        It is None if the system is not solved with the default direct solver.
+        The factorization can be reused for solves with the transposed matrix,
+        which is what is done for adjoint solves when using automatic
+        differentiation.
+
+        """
+        if type(self.solver) is dolfin.cpp.la.PETScLUSolver:
+            return self.solver.ksp()
+        return None
+
     def assemble_lhs(self):
         """Assemble the left hand side of the weak formulation.
 
@@ -136,9 +170,16 @@ class Simulation:
         """
         if vector_function:
             element = self.function_space.split()[0].ufl_element()
-            V_vect = dolfin.VectorFunctionSpace(
-                self.mesh, element.family(), element.degree()
+            # the dofs must be numbered as those of the function space
+            reorder_dofs = getattr(
+                self.function_space,
+                "reorder_dofs",
+                dolfin.parameters["reorder_dofs_serial"],
             )
+            with dof_ordering(reorder_dofs):
+                V_vect = dolfin.VectorFunctionSpace(
+                    self.mesh, element.family(), element.degree()
+                )
             u = dolfin.Function(V_vect)
         else:
             u = dolfin.Function(self.function_space)
@@ -146,14 +187,32 @@ class Simulation:
         if not again:
             if self.solver is None:
                 if self.direct:
-                    self.solver = dolfin.LUSolver("mumps")
+                    self.solver = dolfin.PETScLUSolver("mumps")
                 else:
                     self.solver = dolfin.KrylovSolver(
                         method="default", preconditioner="default"
                     )
+        factorization = self.factorization
+        if factorization is not None:
+            if self.lu_ordering is not None:
+                dolfin.PETScOptions.set(
+                    "mat_mumps_icntl_7", _LU_ORDERINGS[self.lu_ordering]
+                )
+            if self.lu_ordering != self._factorization_lu_ordering:
+                # the ordering is only read by the symbolic factorization,
+                # which is skipped when the sparsity pattern is unchanged
+                factorization.getPC().reset()
+                self._factorization_lu_ordering = self.lu_ordering
         self.solver.set_operator(self.matrix)
-        self.solver.solve(u.vector(), self.vector)
+        if ADJOINT and self.factorization is not None:
+            annotated_factorized_solve(
+                self.solver, self.matrix, u.vector(), self.vector
+            )
+        else:
+            self.solver.solve(u.vector(), self.vector)
         dolfin.PETScOptions.clear()
+        # the split gives subfunctions, whose vector is not accessible
+        self.solution_function = u
         return Complex(*u.split())
 
     def solve(self):
@@ -170,10 +229,54 @@ class Simulation:
         self.apply_boundary_conditions()
         return self.solve_system()
 
+    def error_indicators(self, field=None):
+        """Recovery based error indicators.
+
+        The gradient (or the curl for vector fields) of the solution is
+        recovered by projection onto continuous elements, and the error
+        indicator of a cell is the L2 norm of the difference between the
+        recovered and the discrete gradient on this cell.
+
+        Parameters
+        ----------
+        field : Complex
+            The field (the default is None, i.e. the finite element solution).
+
+        Returns
+        -------
+        numpy array
+            The error indicators of the local cells (zero on ghost cells).
+
+        """
+        if field is None:
+            field = self.solution.get("periodic", self.solution.get("diffracted"))
+        mesh = self.mesh
+        tdim = mesh.topology().dim()
+        degree = self.formulation.degree
+        operator = dolfin.grad if field.real.ufl_shape == () else dolfin.curl
+        shape = operator(field.real).ufl_shape
+        if shape == ():
+            V = dolfin.FunctionSpace(mesh, "CG", degree)
+        else:
+            V = dolfin.VectorFunctionSpace(mesh, "CG", degree, dim=shape[0])
+        W = dolfin.FunctionSpace(mesh, "DG", 0)
+        w = dolfin.TestFunction(W)
+        form = 0
+        for part in (field.real, field.imag):
+            flux = operator(part)
+            error = flux - project_iterative(flux, V)
+            form += dolfin.inner(error, error) * w * dolfin.dx(mesh)
+        squared = dolfin.assemble(form).get_local()
+        dofs = np.array(W.dofmap().entity_dofs(mesh, tdim))
+        owned = (dofs < len(squared)) & (np.arange(len(dofs)) < _num_owned_cells(mesh))
+        indicators = np.zeros(mesh.num_cells())
+        indicators[owned] = np.sqrt(np.abs(squared[dofs[owned]]))
+        return indicators
+
     def eigensolve(
         self, n_eig=6, target=0.0, tol=1e-6, half=True, system=True, sqrt=True, **kwargs
     ):
-        wf = self.formulation.weak
+        wf = self.formulation.apply_quadrature_degree(self.formulation.weak)
         if self.formulation.dim == 1:
             dummy_vector = (
                 dolfin.Constant(0) * self.formulation.test * self.formulation.dx
@@ -234,7 +337,6 @@ class Simulation:
         for j in range(nconv):
             ev_re, ev_im, rx, cx = eigensolver.get_eigenpair(j)
             eig_vec_right = array2function(rx, self.formulation.function_space)
-            eig_vec_left = array2function(cx, self.formulation.function_space)
 
             if self.formulation.dim == 1:
                 eig_vec = Complex(*eig_vec_right)  # + 1j * Complex(*eig_vec_im)
@@ -8,14 +8,27 @@
 
 import nlopt
 import numpy as np
+from mpi4py import MPI
+from petsc4py import PETSc
 
+from . import ADJOINT
 from . import dolfin as df
 from .complex import *
 from .materials import tensor_const
-from .utils import array2function, function2array, mpi_print, project_iterative, tanh
+from .mesh import parent_cell_indices
+from .utils import (
+    array2function,
+    function2array,
+    mpi_print,
+    no_annotations,
+    project_iterative,
+    tanh,
+)
 
 df.parameters["allow_extrapolation"] = True
 
+_no_annotation = dict(annotate=False) if ADJOINT else {}
+
 
 def simp(a, s_min=1, s_max=2, p=1, complex=True):
     """Solid isotropic material with penalisation (SIMP)"""
@@ -45,6 +58,15 @@ def projection_gradient(a, beta=1, nu=0.5):
 
 
 class Filter:
+    """Helmholtz-type density filter.
+
+    The filter operator only depends on the mesh and the filter radius, so the
+    function space of the filtered density is built once (in the constructor
+    if the mesh is known), and the matrix is assembled and its solver set up
+    once, at the first call of :meth:`apply`. They are reused for subsequent
+    calls on the same function space.
+    """
+
     def __init__(
         self,
         rfilt=0,
@@ -53,32 +75,41 @@ class Filter:
         solver=None,
         mesh=None,
         output_function_space=None,
+        preconditioner="amg",
     ):
         self.rfilt = rfilt
-        self._rfilt_scaled = self.rfilt / (2 * 3**0.5)
         self.solver = solver
         self.degree = degree
         self._mesh = mesh
-        self._function_space = function_space
+        self._function_space = self.function_space = function_space
         self.output_function_space = output_function_space
+        self.preconditioner = preconditioner
+        self._input_space_id = None
+        self._transpose_operators = None
+        if mesh is not None or function_space is not None:
+            self._set_mesh(mesh if mesh is not None else function_space.mesh())
+
+    def _set_mesh(self, mesh):
+        self.mesh = mesh
+        self.dim = mesh.ufl_domain().geometric_dimension()
+        if self._function_space is None and (
+            self.function_space is None or self.function_space.mesh().id() != mesh.id()
+        ):
+            self.function_space = df.FunctionSpace(mesh, "CG", self.degree)
 
     def weak(self, a):
-        self.mesh = a.function_space().mesh() if self._mesh is None else self._mesh
-        self.dim = self.mesh.ufl_domain().geometric_dimension()
-        self.function_space = self._function_space or df.FunctionSpace(
-            self.mesh, "CG", self.degree
-        )
+        if self._mesh is None and self._function_space is None:
+            self._set_mesh(a.function_space().mesh())
         af = df.TrialFunction(self.function_space)
         vf = df.TestFunction(self.function_space)
+        rfilt_scaled = self.rfilt / (2 * 3**0.5)
         if hasattr(self.rfilt, "shape"):
             if np.shape(self.rfilt) in [(2, 2), (3, 3)]:
-                self._rfilt_scaled = tensor_const(
-                    self._rfilt_scaled, dim=self.dim, real=True
-                )
+                self._rfilt_scaled = tensor_const(rfilt_scaled, dim=self.dim, real=True)
             else:
                 raise ValueError("Wrong shape for rfilt")
         else:
-            self._rfilt_scaled = df.Constant(self._rfilt_scaled)
+            self._rfilt_scaled = df.Constant(rfilt_scaled)
 
         lhs = (
             df.inner(
@@ -91,15 +122,24 @@ class Filter:
         rhs = df.inner(a, vf) * df.dx
         return lhs, rhs
 
+    def _setup(self, a):
+        space_id = a.function_space().id()
+        lhs, rhs = self.weak(a)
+        if self._input_space_id not in (None, space_id):
+            self.solver = None
+            self._transpose_operators = None
+        if self.solver is None:
+            self.matrix = df.assemble(lhs, **_no_annotation)
+            self.solver = df.KrylovSolver(self.matrix, "cg", self.preconditioner)
+        self._input_space_id = space_id
+        return rhs
+
     def apply(self, a):
         if np.all(self.rfilt == 0):
             return a
-        lhs, rhs = self.weak(a)
+        rhs = self._setup(a)
         af = df.Function(self.function_space, name="Filtered density")
         self.vector = df.assemble(rhs)
-        if self.solver is None:
-            self.matrix = df.assemble(lhs)
-            self.solver = df.KrylovSolver(self.matrix, "cg", "jacobi")
         self.solver.solve(af.vector(), self.vector)
         self.solution = af
         return (
@@ -108,22 +148,183 @@ class Filter:
             else af
         )
 
+    def _build_transpose_operators(self, input_space):
+        u_in = df.TrialFunction(input_space)
+        vf = df.TestFunction(self.function_space)
+        ops = dict(rhs=df.assemble(df.inner(u_in, vf) * df.dx, **_no_annotation))
+        if self.output_function_space is not None:
+            u_out = df.TrialFunction(self.output_function_space)
+            v_out = df.TestFunction(self.output_function_space)
+            uf = df.TrialFunction(self.function_space)
+            ops["projection"] = df.assemble(
+                df.inner(uf, v_out) * df.dx, **_no_annotation
+            )
+            mass = df.assemble(df.inner(u_out, v_out) * df.dx, **_no_annotation)
+            ops["mass_solver"] = df.KrylovSolver(mass, "cg", "jacobi")
+        self._transpose_operators = ops
+        return ops
+
+    def apply_transpose(self, g, input_space):
+        """Apply the transpose of the filter to a sensitivity.
+
+        This is used to propagate derivatives with respect to the filtered
+        density back to the design variables (chain rule).
+
+        Parameters
+        ----------
+        g : Function
+            Derivative vector with respect to the degrees of freedom of the
+            filter output (on ``output_function_space`` if set, or on the filter
+            function space).
+        input_space : FunctionSpace
+            The function space of the unfiltered density.
+
+        Returns
+        -------
+        Function
+            Derivative vector with respect to the unfiltered density.
+
+        """
+        out = df.Function(input_space)
+        if np.all(self.rfilt == 0):
+            out.vector()[:] = g.vector()
+            return out
+        if self.solver is None or input_space.id() != self._input_space_id:
+            raise RuntimeError("the filter must be applied before its transpose")
+        ops = self._transpose_operators or self._build_transpose_operators(
+            input_space
+        )
+        h = df.Function(self.function_space).vector()
+        if self.output_function_space is not None:
+            z = df.Function(self.output_function_space).vector()
+            ops["mass_solver"].solve(z, g.vector(), **_no_annotation)
+            ops["projection"].mat().multTranspose(
+                df.as_backend_type(z).vec(), df.as_backend_type(h).vec()
+            )
+        else:
+            h[:] = g.vector()
+        y = df.Function(self.function_space).vector()
+        self.solver.solve(y, h, **_no_annotation)
+        ops["rhs"].mat().multTranspose(
+            df.as_backend_type(y).vec(), df.as_backend_type(out.vector()).vec()
+        )
+        return out
+
 
 def filtering(a, rfilt=0, function_space=None, degree=1, solver=None, mesh=None):
     return Filter(rfilt, function_space, degree, solver, mesh).apply(a)
 
 
-def transfer_function(fromFunc, Vto):
-    toFunc = df.Function(Vto)
-    fromFunc.set_allow_extrapolation(True)
-    A = df.PETScDMCollection.create_transfer_matrix(
-        fromFunc.ufl_function_space(), toFunc.ufl_function_space()
+def _is_dg0(V):
+    element = V.ufl_element()
+    return element.family() == "Discontinuous Lagrange" and element.degree() == 0
+
+
+def _injection_matrix(Vfrom, Vto, parent):
+    comm = Vto.mesh().mpi_comm()
+    dofmap_from, dofmap_to = Vfrom.dofmap(), Vto.dofmap()
+    size_from = dofmap_from.ownership_range()
+    size_to = dofmap_to.ownership_range()
+    local_size_from = size_from[1] - size_from[0]
+    local_size_to = size_to[1] - size_to[0]
+    A = PETSc.Mat().createAIJ(
+        ((local_size_to, Vto.dim()), (local_size_from, Vfrom.dim())),
+        nnz=1,
+        comm=comm,
     )
-    # toFunc.vector()[:] = A * fromFunc.vector()
+    A.setOption(PETSc.Mat.Option.NEW_NONZERO_ALLOCATION_ERR, False)
+    l2g_from = dofmap_from.tabulate_local_to_global_dofs()
+    l2g_to = dofmap_to.tabulate_local_to_global_dofs()
+    for cell, parent_cell in enumerate(parent):
+        col = l2g_from[dofmap_from.cell_dofs(cell)[0]]
+        if size_from[0] <= col < size_from[1]:
+            row = l2g_to[dofmap_to.cell_dofs(int(parent_cell))[0]]
+            A.setValue(row, col, 1.0)
+    A.assemble()
+    return A
+
+
+class TransferOperator:
+    """Transfer operator between two function spaces.
+
+    The transfer matrix is built once and applied as a (parallel) sparse
+    matrix-vector product. When transferring between piecewise constant
+    spaces on a submesh and its parent mesh, it is built directly from the
+    parent cell indices of the submesh. Otherwise it is built with
+    ``PETScDMCollection.create_transfer_matrix``.
+
+    Parameters
+    ----------
+    space_from : FunctionSpace
+        The origin function space.
+    space_to : FunctionSpace
+        The target function space.
+
+    """
+
+    def __init__(self, space_from, space_to):
+        self.space_from = space_from
+        self.space_to = space_to
+        parent = parent_cell_indices(space_from.mesh(), space_to.mesh())
+        if parent is not None and _is_dg0(space_from) and _is_dg0(space_to):
+            self.matrix = _injection_matrix(space_from, space_to, parent)
+        else:
+            self.matrix = df.PETScDMCollection.create_transfer_matrix(
+                space_from, space_to
+            ).mat()
+
+    def _mult(self, f, space, transpose=False):
+        out = df.Function(space)
+        x = df.as_backend_type(f.vector()).vec()
+        y = df.as_backend_type(out.vector()).vec()
+        if transpose:
+            self.matrix.multTranspose(x, y)
+        else:
+            self.matrix.mult(x, y)
+        df.as_backend_type(out.vector()).update_ghost_values()
+        return out
+
+    def __call__(self, f):
+        """Transfer a function from ``space_from`` to ``space_to``.
+
+        Parameters
+        ----------
+        f : Function
+            Function in ``space_from``.
+
+        Returns
+        -------
+        Function
+            Function in ``space_to``.
+
+        """
+        return self._mult(f, self.space_to)
+
+    def transpose(self, g):
+        """Apply the transpose of the transfer operator.
 
-    A.mat().mult(fromFunc.vector().vec(), toFunc.vector().vec())
+        This maps derivatives with respect to the degrees of freedom in
+        ``space_to`` to derivatives with respect to those in ``space_from``.
 
-    return toFunc
+        Parameters
+        ----------
+        g : Function
+            Derivative vector in ``space_to``.
+
+        Returns
+        -------
+        Function
+            Derivative vector in ``space_from``.
+
+        """
+        return self._mult(g, self.space_from, transpose=True)
+
+
+def transfer_function(fromFunc, Vto, operator=None):
+    fromFunc.set_allow_extrapolation(True)
+    if operator is None:
+        operator = TransferOperator(fromFunc.function_space(), Vto)
+    return operator(fromFunc)
 
 
 def derivative(f, x, ctrl_space=None, array=False):
@@ -133,28 +334,351 @@ def derivative(f, x, ctrl_space=None, array=False):
     return function2array(dfdx) if array else dfdx
 
 
-def transfer_sub_mesh(x, geometry, source_space, target_space, subdomain):
-    markers = geometry.markers
-    domains = geometry.domains
-    a0 = df.Function(source_space)
-    mdes = markers.where_equal(domains[subdomain])
-    b = function2array(project_iterative(x, target_space))
-    a = function2array(a0)
-    comm = df.MPI.comm_world
-    b = comm.gather(b, root=0)
-    a = comm.gather(a, root=0)
-    mdes = comm.gather(mdes, root=0)
-    if df.MPI.rank(comm) == 0:
-        mdes = np.hstack(mdes)
-        b = np.hstack(b)
-        a = np.hstack(a)
-        mdes1 = [int(i) for i in mdes]
-        a[mdes1] = b
-        # sys.stdout.flush()
+def _allgather(comm, local, counts):
+    out = np.empty(sum(counts), dtype=float)
+    comm.Allgatherv(np.ascontiguousarray(local, dtype=float), [out, counts])
+    return out
+
+
+def _owned_cells(V):
+    # global indices of the cells owned by this process and their local dofs,
+    # for piecewise constant spaces
+    mesh = V.mesh()
+    tdim = mesh.topology().dim()
+    if mesh.mpi_comm().size == 1:
+        owned = mesh.num_cells()
     else:
-        a = None
-    a = comm.bcast(a, root=0)
-    return array2function(a, source_space)
+        owned = mesh.topology().ghost_offset(tdim)
+    cells = np.asarray(mesh.topology().global_indices(tdim))[:owned]
+    dofs = np.asarray(V.dofmap().entity_dofs(mesh, tdim))[:owned]
+    return cells, dofs
+
+
+def _cell_array(f, size):
+    # values of a piecewise constant function on the owned cells, indexed by
+    # global cell index (zero elsewhere), to be summed over the processes
+    out = np.zeros(size)
+    cells, dofs = _owned_cells(f.function_space())
+    out[cells] = f.vector().get_local()[dofs]
+    return out
+
+
+def _cell_function(values, V):
+    f = df.Function(V)
+    cells, dofs = _owned_cells(V)
+    local = np.zeros(f.vector().local_size())
+    local[dofs] = values[cells]
+    f.vector().set_local(local)
+    f.vector().apply("insert")
+    return f
+
+
+class MMA:
+    """Distributed method of moving asymptotes for bound constrained problems.
+
+    Each rank only holds its own part of the design variables and of the
+    gradient. Without constraints, the MMA subproblem is separable and solved
+    in closed form, so only scalar global reductions are needed. As in the
+    globally convergent version of the method (GCMMA), a step is only accepted
+    if the approximation is conservative, i.e. does not underestimate the
+    objective at the new point. Otherwise the conservativeness parameter is
+    increased and the subproblem solved again (inner iterations, each one
+    costing an evaluation of the objective). The interface mimics the one
+    of ``nlopt.opt``.
+
+    Parameters
+    ----------
+    lb : array
+        Lower bounds of the local design variables.
+    ub : array
+        Upper bounds of the local design variables.
+    comm : MPI communicator
+        The communicator the design variables are distributed over.
+    move : float
+        Move limit, relative to ``ub - lb`` (the default is 0.5).
+    asyinit : float
+        Initial distance of the asymptotes (the default is 0.5).
+    asyincr : float
+        Asymptotes expansion factor (the default is 1.2).
+    asydecr : float
+        Asymptotes contraction factor (the default is 0.7).
+
+    """
+
+    def __init__(
+        self,
+        lb,
+        ub,
+        comm=df.MPI.comm_world,
+        move=0.5,
+        asyinit=0.5,
+        asyincr=1.2,
+        asydecr=0.7,
+    ):
+        self.lb = np.asarray(lb, dtype=float)
+        self.ub = np.asarray(ub, dtype=float)
+        self.comm = comm
+        self.move = move
+        self.asyinit = asyinit
+        self.asyincr = asyincr
+        self.asydecr = asydecr
+        self.ftol_rel = None
+        self.xtol_rel = None
+        self.stopval = None
+        self.maxeval = None
+        self.fun = None
+        self._fopt = None
+        self.rho_min = 1e-5
+        self.rho_max = 1e5
+
+    def set_ftol_rel(self, tol):
+        self.ftol_rel = tol
+
+    def set_xtol_rel(self, tol):
+        self.xtol_rel = tol
+
+    def set_stopval(self, stopval):
+        self.stopval = stopval
+
+    def set_maxeval(self, maxeval):
+        self.maxeval = maxeval
+
+    def set_min_objective(self, fun):
+        self.fun = fun
+
+    def last_optimum_value(self):
+        return self._fopt
+
+    def _norm(self, x):
+        return self.comm.allreduce(np.sum(x**2)) ** 0.5
+
+    def _asymptotes(self, x, x1, x2, low, upp):
+        dx = self.ub - self.lb
+        if x2 is None:
+            return x - self.asyinit * dx, x + self.asyinit * dx
+        sign = (x - x1) * (x1 - x2)
+        gamma = np.ones_like(x)
+        gamma[sign > 0] = self.asyincr
+        gamma[sign < 0] = self.asydecr
+        low = x - gamma * (x1 - low)
+        upp = x + gamma * (upp - x1)
+        low = np.clip(low, x - 10 * dx, x - 0.01 * dx)
+        upp = np.clip(upp, x + 0.01 * dx, x + 10 * dx)
+        return low, upp
+
+    def update(self, x, f, grad, rho, x1=None, x2=None, low=None, upp=None):
+        """Compute the next iterate.
+
+        Parameters
+        ----------
+        x : array
+            Current local design variables.
+        f : float
+            Objective at ``x``.
+        grad : array
+            Local gradient at ``x``.
+        rho : float
+            Conservativeness parameter of the approximation.
+        x1, x2 : array
+            Previous two iterates (the default is None).
+        low, upp : array
+            Previous asymptotes (the default is None).
+
+        Returns
+        -------
+        tuple
+            The new iterate, the value of the approximation at this point
+            and the asymptotes.
+
+        """
+        dx = self.ub - self.lb
+        low, upp = self._asymptotes(x, x1, x2, low, upp)
+        alpha = np.maximum.reduce([self.lb, low + 0.1 * (x - low), x - self.move * dx])
+        beta = np.minimum.reduce([self.ub, upp - 0.1 * (upp - x), x + self.move * dx])
+        gpos, gneg = np.maximum(grad, 0), np.maximum(-grad, 0)
+        p = (upp - x) ** 2 * (1.001 * gpos + 0.001 * gneg + rho / dx)
+        q = (x - low) ** 2 * (0.001 * gpos + 1.001 * gneg + rho / dx)
+        sp, sq = np.sqrt(p), np.sqrt(q)
+        xnew = np.clip((sp * low + sq * upp) / (sp + sq), alpha, beta)
+        dapprox = p / (upp - xnew) + q / (xnew - low) - p / (upp - x) - q / (x - low)
+        approx = f + self.comm.allreduce(np.sum(dapprox))
+        return xnew, approx, low, upp
+
+    def _increase_conservativeness(self, rho, f, approx, x, xnew, low, upp):
+        # smallest increase making the approximation conservative at xnew
+        dx = self.ub - self.lb
+        d = (upp - low) * (xnew - x) ** 2 / ((upp - xnew) * (xnew - low) * dx)
+        d = self.comm.allreduce(np.sum(d))
+        delta = (f - approx) / d if d > 0 else 0
+        return min(1.1 * (rho + delta), 10 * rho, self.rho_max)
+
+    def optimize(self, x0):
+        x = np.clip(np.array(x0, dtype=float), self.lb, self.ub)
+        grad = np.empty_like(x)
+        f = self.fun(x, grad)
+        neval = 1
+        self._fopt, xopt = f, x.copy()
+        x1 = x2 = low = upp = None
+        rho = self.rho_min
+        while True:
+            if self.stopval is not None and f <= self.stopval:
+                break
+            if self.maxeval is not None and neval >= self.maxeval:
+                break
+            rho = max(0.1 * rho, self.rho_min)
+            gradnew = np.empty_like(x)
+            # inner iterations: the step is only accepted if the approximation
+            # is conservative at the new point
+            while True:
+                xnew, approx, lownew, uppnew = self.update(
+                    x, f, grad, rho, x1, x2, low, upp
+                )
+                fnew = self.fun(xnew, gradnew)
+                neval += 1
+                if fnew < self._fopt:
+                    self._fopt, xopt = fnew, xnew.copy()
+                conservative = fnew <= approx + 1e-10 * max(1, abs(f))
+                if (
+                    conservative
+                    or rho >= self.rho_max
+                    or (self.maxeval is not None and neval >= self.maxeval)
+                ):
+                    break
+                rho = self._increase_conservativeness(
+                    rho, fnew, approx, x, xnew, lownew, uppnew
+                )
+            if not conservative:
+                break
+            converged = (
+                self.ftol_rel is not None
+                and abs(fnew - f) <= self.ftol_rel * abs(fnew)
+            ) or (
+                self.xtol_rel is not None
+                and self._norm(xnew - x) <= self.xtol_rel * self._norm(xnew)
+            )
+            x2, x1, x, f, grad = x1, x, xnew, fnew, gradnew
+            low, upp = lownew, uppnew
+            if converged:
+                break
+        return xopt
+
+
+class MultiObjective:
+    """Aggregation of objective functions over several scenarios.
+
+    Each scenario (e.g. a wavelength or an angle of incidence) is evaluated
+    on the same design, and its gradient is computed separately.
+    The scenario values and gradients are then combined, so that the filter
+    and transfer operations on the gradient are only applied once.
+
+    By default, the scenarios are evaluated one after another. If
+    ``concurrent`` is True, the processes are split into groups (see
+    :meth:`split`), each group evaluating its own scenarios on a copy of the
+    mesh distributed over the group (see :meth:`Geometry.distribute`), so that
+    the time per iteration does not grow with the number of scenarios as long
+    as there are enough processes. The objective functions are then called
+    with the geometry of their group as second argument, and must build their
+    simulations on it. The design and the gradients are exchanged between
+    the groups as arrays over the cells of the mesh.
+
+    Parameters
+    ----------
+    functions : list of callables
+        The objective functions, with the same signature as the objective
+        of :class:`TopologyOptimizer`.
+    aggregation : str
+        How to combine the objectives: ``"sum"``, ``"mean"`` or ``"max"``
+        (the default is "sum"). The maximum (worst case) is approximated by
+        a Kreisselmeier-Steinhauser function to keep it differentiable.
+    weights : array
+        Weights of the scenarios (the default is None, i.e. all ones).
+    ks_parameter : float
+        Aggregation parameter of the Kreisselmeier-Steinhauser function,
+        larger values are closer to the maximum (the default is 50).
+    concurrent : bool
+        Evaluate the scenarios concurrently on groups of processes
+        (the default is False).
+
+    """
+
+    aggregations = ("sum", "mean", "max")
+
+    def __init__(
+        self,
+        functions,
+        aggregation="sum",
+        weights=None,
+        ks_parameter=50,
+        concurrent=False,
+    ):
+        if aggregation not in self.aggregations:
+            raise ValueError(
+                f"Unknown aggregation {aggregation}, "
+                f"choose between {self.aggregations}"
+            )
+        self.functions = list(functions)
+        self.aggregation = aggregation
+        self.weights = (
+            np.ones(len(self.functions))
+            if weights is None
+            else np.asarray(weights, dtype=float)
+        )
+        if len(self.weights) != len(self.functions):
+            raise ValueError("weights and functions must have the same length")
+        self.ks_parameter = ks_parameter
+        self.concurrent = concurrent
+
+    def __len__(self):
+        return len(self.functions)
+
+    def split(self, comm):
+        """Distribute the scenarios over groups of processes.
+
+        The processes are split into ``min(len(self), comm.size)`` groups of
+        consecutive ranks, and the scenarios are assigned to the groups in a
+        round-robin fashion.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+            The communicator to split.
+
+        Returns
+        -------
+        tuple (MPI communicator, list of int)
+            The communicator of the group of this process and the indices of
+            the scenarios it evaluates.
+
+        """
+        ngroups = min(len(self), comm.size)
+        color = comm.rank * ngroups // comm.size
+        return comm.Split(color, comm.rank), list(range(color, len(self), ngroups))
+
+    def aggregate(self, values):
+        """Combine the values of the objectives.
+
+        Parameters
+        ----------
+        values : list of float
+            The objective values of the scenarios.
+
+        Returns
+        -------
+        tuple (float, array)
+            The aggregated objective and the coefficients to combine the
+            gradients of the scenarios with.
+
+        """
+        values = self.weights * np.array([float(v) for v in values])
+        if self.aggregation == "sum":
+            return values.sum(), self.weights
+        if self.aggregation == "mean":
+            return values.mean(), self.weights / len(values)
+        vmax = values.max()
+        exps = np.exp(self.ks_parameter * (values - vmax))
+        total = exps.sum()
+        objective = vmax + np.log(total) / self.ks_parameter
+        return objective, self.weights * exps / total
 
 
 class TopologyOptimizer:
@@ -175,7 +699,11 @@ class TopologyOptimizer:
         callback=None,
         args=None,
         verbose=True,
+        reuse_tape=False,
+        distributed=False,
     ):
+        if isinstance(fun, (list, tuple)):
+            fun = MultiObjective(fun)
         self.fun = fun
         self.design = design
         self.threshold = threshold
@@ -188,6 +716,15 @@ class TopologyOptimizer:
         self.callback = callback
         self.args = args or []
         self.verbose = verbose
+        # if True, the objective function is recorded once per projection level
+        # and the tape is replayed for new control values afterwards.
+        # The density and permittivity attributes are updated, but quantities
+        # computed in the objective function (e.g. simulation fields) are not.
+        self.reuse_tape = reuse_tape
+        self.reduced_functionals = {}
+        # if True, the design variables and gradients stay distributed and
+        # the optimization is performed with the parallel MMA implementation.
+        self.distributed = distributed
         self.callback_output = []
         self.eps_min, self.eps_max = eps_bounds
         self.p = p
@@ -201,7 +738,18 @@ class TopologyOptimizer:
         self.fs_ctrl = df.FunctionSpace(self.mesh, "DG", 0)
         self.fs_sub = df.FunctionSpace(self.submesh, "DG", 0)
         self.nvar = self.fs_sub.dim()
-        self.filter = Filter(self.rfilt, degree=1, output_function_space=self.fs_sub)
+        self.filter = Filter(
+            self.rfilt, degree=1, mesh=self.submesh, output_function_space=self.fs_sub
+        )
+        self.transfer = TransferOperator(self.fs_sub, self.fs_ctrl)
+        self.scenario_comm = None
+        comm = self.mesh.mpi_comm()
+        if isinstance(fun, MultiObjective) and fun.concurrent and comm.size > 1:
+            self.scenario_comm, self.scenarios = fun.split(comm)
+            self.scenario_geometry = self.geometry.distribute(self.scenario_comm)
+            self.scenario_space = df.FunctionSpace(
+                self.scenario_geometry.mesh, "DG", 0
+            )
 
     def design_fun(self, density_fp):
         return simp(
@@ -211,6 +759,66 @@ class TopologyOptimizer:
             df.Constant(self.p),
         )
 
+    def _set_design(self, ctrl, proj_level):
+        self.density_fp = (
+            projection(ctrl, beta=df.Constant(2**proj_level))
+            if proj_level is not None
+            else self.density_f
+        )
+        self.epsilon_design = self.design_fun(self.density_fp)
+
+    def _evaluate_scenario(self, i, fun, ctrl, proj_level, reset, grad, args):
+        reduced_functional = self.reduced_functionals.get(i)
+        if self.reuse_tape and reduced_functional is not None:
+            value = reduced_functional(ctrl)
+            # the replayed tape does not update the recorded expressions,
+            # they are rebuilt from the current control for the callbacks
+            with no_annotations():
+                self._set_design(ctrl, proj_level)
+        else:
+            if reset:
+                df.set_working_tape(df.Tape())
+            self._set_design(ctrl, proj_level)
+            value = fun(self.epsilon_design, *args)
+            if self.reuse_tape:
+                reduced_functional = df.ReducedFunctional(value, df.Control(ctrl))
+                self.reduced_functionals[i] = reduced_functional
+        if not grad:
+            return value, None
+        if self.reuse_tape:
+            return value, reduced_functional.derivative()
+        return value, derivative(value, ctrl)
+
+    def _evaluate_concurrent(self, objfun, ctrl, Actrl, proj_level, reset, grad, args):
+        comm = self.mesh.mpi_comm()
+        ncells = self.mesh.num_entities_global(self.mesh.topology().dim())
+        with no_annotations():
+            values = _cell_array(ctrl, ncells)
+            comm.Allreduce(MPI.IN_PLACE, values)
+            ctrl = _cell_function(values, self.scenario_space)
+        args = (self.scenario_geometry, *args)
+        scenarios = [
+            self._evaluate_scenario(
+                i, objfun.functions[i], ctrl, proj_level, reset, grad, args
+            )
+            for i in self.scenarios
+        ]
+        # the values are contributed once per group
+        values = np.zeros(len(objfun))
+        if self.scenario_comm.rank == 0:
+            values[self.scenarios] = [float(value) for value, _ in scenarios]
+        comm.Allreduce(MPI.IN_PLACE, values)
+        self.objectives = values
+        objective, coefs = objfun.aggregate(values)
+        if not grad:
+            return objective, None
+        with no_annotations():
+            gradient = np.zeros(ncells)
+            for i, (_, scenario_gradient) in zip(self.scenarios, scenarios):
+                gradient += coefs[i] * _cell_array(scenario_gradient, ncells)
+            comm.Allreduce(MPI.IN_PLACE, gradient)
+            return objective, _cell_function(gradient, Actrl)
+
     def _topopt_wrapper(
         self,
         objfun,
@@ -229,37 +837,52 @@ class TopologyOptimizer:
         def wrapper(x):
             proj = proj_level is not None
             filt = filter is not None
-            if reset:
-                df.set_working_tape(df.Tape())
-            density = array2function(x, Asub)
-            self.density = density
-            filter.solver = None
-            if filtering_type == "sensitivity":
-                self.density_f = density
+            with no_annotations():
+                density = array2function(x, Asub, local=self.distributed)
+                self.density = density
+                if filtering_type == "sensitivity":
+                    self.density_f = density
+                else:
+                    self.density_f = filter.apply(density) if filt else density
+
+                ctrl = self.transfer(self.density_f)
+
+            if self.scenario_comm is not None:
+                objective, dobjective_dx = self._evaluate_concurrent(
+                    objfun, ctrl, Actrl, proj_level, reset, grad, args
+                )
+            elif isinstance(objfun, MultiObjective):
+                scenarios = [
+                    self._evaluate_scenario(i, f, ctrl, proj_level, reset, grad, args)
+                    for i, f in enumerate(objfun.functions)
+                ]
+                values, gradients = zip(*scenarios)
+                self.objectives = values
+                objective, coefs = objfun.aggregate(values)
+                if grad:
+                    with no_annotations():
+                        dobjective_dx = df.Function(Actrl)
+                        for coef, gradient in zip(coefs, gradients):
+                            dobjective_dx.vector().axpy(coef, gradient.vector())
             else:
-                self.density_f = filter.apply(density) if filt else density
-
-            # density_f = transfer_sub_mesh(density_f, self.geometry, Actrl, Asub, self.design)
-
-            ctrl = transfer_function(self.density_f, Actrl)
-            self.density_fp = (
-                projection(ctrl, beta=df.Constant(2**proj_level))
-                if proj
-                else self.density_f
-            )
-            self.epsilon_design = self.design_fun(self.density_fp)
-            objective = objfun(self.epsilon_design, *args)
+                objective, dobjective_dx = self._evaluate_scenario(
+                    0, objfun, ctrl, proj_level, reset, grad, args
+                )
 
             self.objective = objective
 
             if grad:
-                dobjective_dx = derivative(objective, ctrl)
-                if filt and filtering_type == "sensitivity":
-                    f = project_iterative(density * dobjective_dx, Asub)
-                    dfdd = filter.apply(f)
-                    dobjective_dx = dfdd / (density + 1e-3)
-                dobjective_dx = project_iterative(dobjective_dx, Asub)
-                dobjective_dx = function2array(dobjective_dx)
+                with no_annotations():
+                    dobjective_dx = self.transfer.transpose(dobjective_dx)
+                    if filt and filtering_type == "sensitivity":
+                        f = project_iterative(density * dobjective_dx, Asub)
+                        dfdd = filter.apply(f)
+                        dobjective_dx = project_iterative(
+                            dfdd / (density + 1e-3), Asub
+                        )
+                    elif filt:
+                        dobjective_dx = filter.apply_transpose(dobjective_dx, Asub)
+                    dobjective_dx = function2array(dobjective_dx, copy=False)
                 self.dobjective_dx = dobjective_dx
                 return objective, dobjective_dx
             else:
@@ -275,8 +898,15 @@ class TopologyOptimizer:
             mpi_print("#################################################")
             mpi_print("")
 
+        comm = self.fs_sub.mesh().mpi_comm()
+        first, last = self.fs_sub.dofmap().ownership_range()
+        counts = comm.allgather(last - first)
+        if self.distributed and len(x0) == self.nvar:
+            x0 = x0[first:last]
+
         for iopt in range(*self.threshold):
             self.proj_level = iopt
+            self.reduced_functionals = {}
 
             self.wrapper = self._topopt_wrapper(
                 self.fun,
@@ -298,32 +928,27 @@ class TopologyOptimizer:
                 mpi_print(f"global iteration {iopt}")
                 mpi_print("---------------------------------------------")
 
-            def _get_gradient(dy):
-                comm = df.MPI.comm_world
-                rank = df.MPI.rank(comm)
-                dyall = comm.gather(dy, root=0)
-
-                dy = np.hstack(dyall) if rank == 0 else np.empty(self.nvar)
-                comm.Bcast(dy, root=0)
-
-                return dy
-
-            def fun_nlopt(x, gradn):
+            def fun_opt(x, gradn):
                 y, dy = self.wrapper(x)
                 if self.verbose:
                     mpi_print(f"objective = {y}")
-                gradn[:] = _get_gradient(dy)
+                gradn[:] = dy if self.distributed else _allgather(comm, dy, counts)
                 if self.callback is not None:
-                    out = self.callback(self)
+                    with no_annotations():
+                        out = self.callback(self)
                     self._cbout.append(out)
                 return y
 
-            lb = np.zeros(self.nvar, dtype=float)
-            ub = np.ones(self.nvar, dtype=float)
-
-            opt = nlopt.opt(nlopt.LD_MMA, self.nvar)
-            opt.set_lower_bounds(lb)
-            opt.set_upper_bounds(ub)
+            if self.distributed:
+                lb = np.zeros(last - first, dtype=float)
+                ub = np.ones(last - first, dtype=float)
+                opt = MMA(lb, ub, comm=comm)
+            else:
+                lb = np.zeros(self.nvar, dtype=float)
+                ub = np.ones(self.nvar, dtype=float)
+                opt = nlopt.opt(nlopt.LD_MMA, self.nvar)
+                opt.set_lower_bounds(lb)
+                opt.set_upper_bounds(ub)
             if self.ftol_rel is not None:
                 opt.set_ftol_rel(self.ftol_rel)
             if self.xtol_rel is not None:
@@ -333,13 +958,15 @@ class TopologyOptimizer:
             if self.maxiter is not None:
                 opt.set_maxeval(self.maxiter)
 
-            opt.set_min_objective(fun_nlopt)
+            opt.set_min_objective(fun_opt)
             xopt = opt.optimize(x0)
             fopt = opt.last_optimum_value()
             if self.callback is not None:
                 self.callback_output.append(self._cbout)
             x0 = xopt
 
+        if self.distributed:
+            xopt = _allgather(comm, xopt, counts)
         self.opt = opt
         self.xopt = xopt
         self.fopt = fopt
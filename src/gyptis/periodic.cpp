@@ -0,0 +1,82 @@
+#include <pybind11/pybind11.h>
+#include <pybind11/eigen.h>
+#include <cmath>
+
+namespace py = pybind11;
+#include <dolfin/mesh/SubDomain.h>
+
+// Periodic map of a lattice: the faces through the origin are the master
+// faces, and points on the opposite faces are translated by the lattice
+// vectors onto them
+class LatticePeriodicMap : public dolfin::SubDomain
+{
+public:
+
+LatticePeriodicMap(Eigen::MatrixXd vectors, Eigen::MatrixXd normals,
+                   Eigen::VectorXd heights, Eigen::VectorXd origin,
+                   double eps, double map_tol)
+        : dolfin::SubDomain(map_tol), vectors(vectors), normals(normals),
+        heights(heights), origin(origin), eps(eps) {
+}
+
+// Signed distance of a point to the master face orthogonal to a normal
+double distance(Eigen::Ref<const Eigen::VectorXd> x, int i) const
+{
+        double d = 0;
+        for (int j = 0; j < x.size(); ++j)
+                d += normals(i, j) * (x[j] - origin[j]);
+        return d;
+}
+
+bool inside(Eigen::Ref<const Eigen::VectorXd> x, bool on_boundary) const override
+{
+        if (!on_boundary)
+                return false;
+        bool on_master = false;
+        for (int i = 0; i < vectors.rows(); ++i)
+        {
+                const double d = distance(x, i);
+                // points also on a slave face are mapped
+                if (std::abs(d - heights[i]) < eps)
+                        return false;
+                if (std::abs(d) < eps)
+                        on_master = true;
+        }
+        return on_master;
+}
+
+void map(Eigen::Ref<const Eigen::VectorXd> x, Eigen::Ref<Eigen::VectorXd> y) const override
+{
+        bool on_slave = false;
+        for (int j = 0; j < x.size(); ++j)
+                y[j] = x[j];
+        for (int i = 0; i < vectors.rows(); ++i)
+        {
+                if (std::abs(distance(x, i) - heights[i]) < eps)
+                {
+                        on_slave = true;
+                        for (int j = 0; j < x.size(); ++j)
+                                y[j] -= vectors(i, j);
+                }
+        }
+        if (!on_slave)
+                for (int j = 0; j < x.size(); ++j)
+                        y[j] = -10000;
+}
+
+Eigen::MatrixXd vectors;
+Eigen::MatrixXd normals;
+Eigen::VectorXd heights;
+Eigen::VectorXd origin;
+double eps;
+
+};
+
+PYBIND11_MODULE(SIGNATURE, m)
+{
+        py::class_<LatticePeriodicMap, std::shared_ptr<LatticePeriodicMap>, dolfin::SubDomain>
+                (m, "LatticePeriodicMap")
+        .def(py::init<Eigen::MatrixXd, Eigen::MatrixXd, Eigen::VectorXd,
+                      Eigen::VectorXd, double, double>())
+        .def_readonly("eps", &LatticePeriodicMap::eps);
+}
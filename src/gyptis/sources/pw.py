@@ -7,6 +7,7 @@
 # See the documentation at gyptis.gitlab.io
 
 
+from ..complex import plane_wave_phasor
 from .source import *
 
 
@@ -27,16 +28,21 @@ def plane_wave_2d(wavelength, theta, phase=0, amplitude=1, degree=1, domain=None
     degree : int, optional
         The degree of the output Expression. Default is 1.
     domain : dolfin.cpp.mesh.Mesh, optional
-        The mesh for the domain of definition of the function.
+        The mesh for the domain of definition of the function. If given, the
+        plane wave is a UFL expression of the spatial coordinates and
+        ``degree`` is not used.
 
     Returns
     -------
-    expr : Expression
-        The 2D plane wave as a dolfin Expression.
+    expr : Complex
+        The 2D plane wave.
     """
 
     k0 = 2 * np.pi / wavelength
     K = k0 * np.array((-np.sin(theta), -np.cos(theta)))
+    if domain is not None:
+        prop = plane_wave_phasor(K, domain, phase=phase)
+        return prop if amplitude == 1 else amplitude * prop
     K_ = sympyvector(sp.symbols("kx, ky, 0", real=True))
     expr = amplitude * sp.exp(1j * (K_.dot(X) + phase))
     return expression2complex_2d(expr, kx=K[0], ky=K[1], degree=degree, domain=domain)
@@ -66,12 +72,14 @@ def plane_wave_3d(
     degree : int, optional
         The degree of the output Expression. Default is 1.
     domain : dolfin.cpp.mesh.Mesh, optional
-        The mesh for the domain of definition of the function.
+        The mesh for the domain of definition of the function. If given, the
+        plane wave is a UFL expression of the spatial coordinates and
+        ``degree`` is not used.
 
     Returns
     -------
-    expr : Expression
-        The 3D plane wave as a dolfin Expression.
+    expr : Complex
+        The 3D plane wave.
     """
     cx = np.cos(psi) * np.cos(theta) * np.cos(phi) - np.sin(psi) * np.sin(phi)
     cy = np.cos(psi) * np.cos(theta) * np.sin(phi) + np.sin(psi) * np.cos(phi)
@@ -90,6 +98,11 @@ def plane_wave_3d(
             -np.cos(theta),
         )
     )
+    if domain is not None:
+        prop = plane_wave_phasor(K, domain)
+        prop = prop if amplitude == 1 else amplitude * prop
+        return Complex(prop.real * C, prop.imag * C)
+
     K_ = sympyvector(sp.symbols("kx, ky, kz", real=True))
 
     Propp = amplitude * sp.exp(1j * (K_.dot(X)))
@@ -12,7 +12,8 @@ import numpy as np
 from numpy.linalg import inv
 from scipy.constants import c, epsilon_0, mu_0, pi
 
-from ..materials import Subdomain, complex_vector
+from ..complex import plane_wave_phasor, vector
+from ..materials import complex_vector, piecewise
 from .source import *
 
 
@@ -33,13 +34,21 @@ def field_stack_2D(phi, alpha, beta, yshift=0, degree=1, domain=None):
     degree : int, optional
         The degree of the output Expression. Default is 1.
     domain : Optional[Domain]
-        The domain of the output Expression. Default is None.
+        The domain of the output Expression. Default is None. If given, the
+        field is a UFL expression of the spatial coordinates and ``degree``
+        is not used.
 
     Returns
     -------
-    expr : Expression
+    expr : Complex
         The electric field associated with the stack of 2D layers.
     """
+    if domain is not None:
+        origin = (0, yshift)
+        pw_plus = plane_wave_phasor((alpha, beta), domain, origin)
+        pw_minus = plane_wave_phasor((alpha, -beta), domain, origin)
+        return Constant(phi[0]) * pw_plus + Constant(phi[1]) * pw_minus
+
     alpha0_re, alpha0_im, beta0_re, beta0_im = sp.symbols(
         "alpha0_re,alpha0_im,beta0_re,beta0_im", real=True
     )
@@ -94,7 +103,9 @@ def field_stack_3D(phi, alpha, beta, gamma, zshift=0, degree=1, domain=None):
     degree : int, optional
         The degree of the output Expression. Default is 1.
     domain : Optional[Domain]
-        The domain of the output Expression. Default is None.
+        The domain of the output Expression. Default is None. If given, the
+        field is a UFL expression of the spatial coordinates and ``degree``
+        is not used.
 
     Returns
     -------
@@ -102,6 +113,16 @@ def field_stack_3D(phi, alpha, beta, gamma, zshift=0, degree=1, domain=None):
         The electric field associated with the stack of 3D layers expressed
         as a complex tensor.
     """
+    if domain is not None:
+        origin = (0, 0, zshift)
+        pw_plus = plane_wave_phasor((alpha, beta, gamma), domain, origin)
+        pw_minus = plane_wave_phasor((alpha, beta, -gamma), domain, origin)
+        return vector(
+            [
+                Constant(phi[2 * i]) * pw_plus + Constant(phi[2 * i + 1]) * pw_minus
+                for i in range(3)
+            ]
+        )
 
     alpha0_re, alpha0_im, beta0_re, beta0_im, gamma0_re, gamma0_im = sp.symbols(
         "alpha0_re, alpha0_im, beta0_re, beta0_im, gamma0_re, gamma0_im", real=True
@@ -433,7 +454,8 @@ def make_stack(
     source_domains : list of str, optional
         The domains where the source is applied. Default is an empty list.
     degree : int, optional
-        The degree of the output Expression. Default is 1.
+        Not used, the fields are UFL expressions evaluated at quadrature points.
+        Default is 1.
     dim : int, optional
         The dimension of the problem. Default is 2.
 
@@ -505,16 +527,8 @@ def make_stack(
             e0[dom] = e0["superstrate"]
         e0["substrate"] = e0["pml_bottom"] = e0["pml_top"] = Complex(0, 0)
 
-        ustack_coeff = Subdomain(
-            geometry.markers,
-            geometry.domains,
-            estack,
-            degree=degree,
-            domain=geometry.mesh,
-        )
-        u0_coeff = Subdomain(
-            geometry.markers, geometry.domains, e0, degree=degree, domain=geometry.mesh
-        )
+        ustack_coeff = piecewise(geometry.markers, geometry.domains, estack)
+        u0_coeff = piecewise(geometry.markers, geometry.domains, e0)
 
         for dom in epsilon.dict.keys():
             inc_field[dom] = e0[dom]
@@ -556,25 +570,13 @@ def make_stack(
             # estack["pml_top"] = estack["superstrate"]
             estack["pml_bottom"] = estack["pml_top"] = Complex(0, 0)
 
-            e0 = {"superstrate": u_0}
+            e0 = {"superstrate": u_0[comp]}
             for dom in source_domains:
                 e0[dom] = e0["superstrate"]
             e0["substrate"] = e0["pml_bottom"] = e0["pml_top"] = Complex(0, 0)
 
-            _ustack_coeff = Subdomain(
-                geometry.markers,
-                geometry.domains,
-                estack,
-                degree=degree,
-                domain=geometry.mesh,
-            )
-            _u0_coeff = Subdomain(
-                geometry.markers,
-                geometry.domains,
-                e0,
-                degree=degree,
-                domain=geometry.mesh,
-            )
+            _ustack_coeff = piecewise(geometry.markers, geometry.domains, estack)
+            _u0_coeff = piecewise(geometry.markers, geometry.domains, e0)
             ustack_coeff.append(_ustack_coeff)
             u0_coeff.append(_u0_coeff)
             estack_list.append(estack)
@@ -13,6 +13,7 @@ from .helpers import *
 from .jupyter import VersionTable
 from .log import *
 from .parallel import *
+from .resample import *
 from .sample import *
 from .time import *
 
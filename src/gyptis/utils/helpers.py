@@ -10,28 +10,51 @@
 __all__ = [
     "array2function",
     "function2array",
+    "array2functions",
+    "functions2array",
     "project_iterative",
+    "no_annotations",
     "get_coordinates",
     "rot_matrix_2d",
     "tanh",
 ]
 
 
+from contextlib import nullcontext
+
 import numpy as np
+from petsc4py import PETSc
 
 from .. import ADJOINT, dolfin
 from ..complex import project
 
 
-def array2function(values, function_space):
+def _petsc_vec(x):
+    """Underlying PETSc Vec of a Function or a vector."""
+    if isinstance(x, PETSc.Vec):
+        return x
+    if isinstance(x, dolfin.Function):
+        x = x.vector()
+    return dolfin.as_backend_type(x).vec()
+
+
+def array2function(values, function_space, local=False, out=None):
     """Convert a numpy array to a fenics Function.
 
     Parameters
     ----------
-    values : numpy array
-        The array to convert.
+    values : array_like, scalar or vector
+        The array to convert. Vectors (dolfin or PETSc) must have the same
+        parallel layout as the function space.
     function_space : FunctionSpace
         The function space to interpolate on.
+    local : bool
+        If True, ``values`` only contains the degrees of freedom owned by
+        the current process (the default is False).
+    out : Function
+        If given, the values are copied in place into this Function instead
+        of a new one. This is not recorded on the dolfin-adjoint tape
+        (the default is None).
 
     Returns
     -------
@@ -39,28 +62,53 @@ def array2function(values, function_space):
         The converted array.
 
     """
-
-    # print(len(values))
-
+    u = dolfin.Function(function_space) if out is None else out
+    vec = _petsc_vec(u)
     if np.isscalar(values):
-        values = np.ones(function_space.dim()) * values
-
-    u = dolfin.Function(function_space)
-    dofmap = function_space.dofmap()
-    # order = dofmap.tabulate_local_to_global_dofs()
-
-    dofmap = function_space.dofmap()
-    my_first, my_last = dofmap.ownership_range()
-    sub_array = values[my_first:my_last]  # [order]
-    # print("order", len(order))
-    u.vector().set_local(sub_array)
-    dolfin.as_backend_type(u.vector()).update_ghost_values()
-    # dolfin.as_backend_type(u.vector()).vec().ghostUpdate()
-    # u.vector().apply("")
-    u.vector().apply("insert")
+        vec.set(values)
+    else:
+        if isinstance(values, (PETSc.Vec, dolfin.GenericVector, dolfin.Function)):
+            values = _petsc_vec(values).getArray(readonly=True)
+            local = True
+        else:
+            values = np.asarray(values)
+        if not local:
+            my_first, my_last = function_space.dofmap().ownership_range()
+            values = values[my_first:my_last]
+        vec.setArray(values)
+    vec.ghostUpdate()
     return u
 
 
+def array2functions(values, function_space, local=False, out=None):
+    """Convert a set of arrays to fenics Functions.
+
+    Parameters
+    ----------
+    values : iterable of numpy arrays or vectors
+        The arrays to convert, e.g. a set of eigenvectors.
+    function_space : FunctionSpace
+        The function space to interpolate on.
+    local : bool
+        If True, the arrays only contain the degrees of freedom owned by
+        the current process (the default is False).
+    out : list of Functions
+        If given, the values are copied in place into these Functions
+        (the default is None).
+
+    Returns
+    -------
+    list of Functions
+        The converted arrays.
+
+    """
+    if out is None:
+        return [array2function(v, function_space, local) for v in values]
+    for v, u in zip(values, out):
+        array2function(v, function_space, local, out=u)
+    return out
+
+
 #
 # def array2function(values, function_space):
 #     u = dolfin.Function(function_space)
@@ -98,13 +146,20 @@ def array2function(values, function_space):
 #     return u
 
 
-def function2array(f, space=None):
+def function2array(f, space=None, copy=True):
     """Convert a fenics Function to a numpy array.
 
     Parameters
     ----------
     f : Function
         The function to convert.
+    space : FunctionSpace
+        If given, the function is projected onto this space first
+        (the default is None).
+    copy : bool
+        If False, a read-only view on the values owned by the current process
+        is returned instead of a copy (the default is True). The view is
+        valid as long as the Function is alive.
 
     Returns
     -------
@@ -114,11 +169,34 @@ def function2array(f, space=None):
     """
     if space is not None:
         f = project_iterative(f, space)
-    values = f.vector().get_local()
-    function_space = f.function_space()
-    dofmap = function_space.dofmap()
-    my_first, my_last = dofmap.ownership_range()
-    return values
+    values = _petsc_vec(f).getArray(readonly=True)
+    return values.copy() if copy else values
+
+
+def functions2array(functions, out=None):
+    """Convert a set of fenics Functions to a 2D numpy array.
+
+    Parameters
+    ----------
+    functions : list of Functions
+        The functions to convert, defined on the same function space.
+    out : numpy array
+        Array of shape ``(len(functions), nlocal)``, with ``nlocal`` the
+        number of degrees of freedom owned by the current process, to store
+        the result in (the default is None).
+
+    Returns
+    -------
+    numpy array
+        The converted functions, one per row.
+
+    """
+    for i, f in enumerate(functions):
+        values = function2array(f, copy=False)
+        if out is None:
+            out = np.empty((len(functions), len(values)), dtype=values.dtype)
+        out[i] = values
+    return out
 
 
 def project_iterative(applied_function, function_space):
@@ -128,6 +206,26 @@ def project_iterative(applied_function, function_space):
     return project(applied_function, function_space, **kwargs)
 
 
+def no_annotations():
+    """Context manager disabling dolfin-adjoint annotations.
+
+    Operations performed in this context are not recorded on the tape, which
+    is useful for post-processing steps that are not differentiated.
+    If automatic differentiation is not used, this does nothing.
+
+    Returns
+    -------
+    context manager
+        The context.
+
+    """
+    if ADJOINT:
+        from pyadjoint import stop_annotating
+
+        return stop_annotating()
+    return nullcontext()
+
+
 def get_coordinates(A):
     n = A.dim()
     d = A.mesh().geometry().dim()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Benjamin Vial
+# This file is part of gyptis
+# Version: 1.1.2
+# License: MIT
+# See the documentation at gyptis.gitlab.io
+
+"""
+Resampling of finite element functions on structured grids.
+"""
+
+__all__ = ["GridResampler", "resample"]
+
+
+import numpy as np
+import scipy.sparse as sp
+from mpi4py import MPI
+
+from .. import dolfin
+from ..complex import iscomplex
+from .helpers import project_iterative
+
+_NOT_FOUND = np.iinfo(np.uint32).max
+
+
+def _local_array(f):
+    """Owned and ghost values of a Function's vector."""
+    vec = dolfin.as_backend_type(f.vector()).vec()
+    vec.ghostUpdate()
+    with vec.localForm() as lf:
+        return lf.array.copy()
+
+
+class GridResampler:
+    """Resample finite element functions on a regular grid.
+
+    The cells containing the grid points are located once, and the values of
+    the basis functions at those points are tabulated once per function space
+    and stored as sparse matrices. Resampling a function then reduces to a
+    sparse matrix-vector product, which makes it cheap to reuse for many
+    solutions (e.g. in parameter sweeps).
+
+    Parameters
+    ----------
+    function_space : FunctionSpace
+        The (real) function space on which expressions that are not
+        Functions are projected before resampling.
+    bounds : tuple of tuples
+        The bounds ``((xmin, xmax), (ymin, ymax)[, (zmin, zmax)])`` of the grid.
+    shape : tuple of int
+        The number of grid points along each direction.
+    fill_value : float
+        Value for grid points outside the mesh (the default is nan).
+
+    """
+
+    def __init__(self, function_space, bounds, shape, fill_value=np.nan):
+        self.function_space = function_space
+        self.mesh = function_space.mesh()
+        self.comm = self.mesh.mpi_comm()
+        self.dim = self.mesh.geometric_dimension()
+        if len(bounds) != self.dim or len(shape) != self.dim:
+            raise ValueError(f"bounds and shape must be of length {self.dim}")
+        self.bounds = bounds
+        self.shape = tuple(shape)
+        self.fill_value = fill_value
+        self.axes = [np.linspace(*b, n) for b, n in zip(bounds, shape)]
+        self.points = np.vstack([g.ravel() for g in self.grid]).T
+        self.npoints = len(self.points)
+        self.cells, self.found = self._locate()
+        self._tables = {}
+        self._matrices = {}
+
+    @property
+    def grid(self):
+        """Coordinates of the grid points, as returned by ``numpy.meshgrid``."""
+        return np.meshgrid(*self.axes, indexing="ij")
+
+    def _locate(self):
+        tree = self.mesh.bounding_box_tree()
+        cells = np.array(
+            [tree.compute_first_entity_collision(dolfin.Point(*p)) for p in self.points]
+        )
+        found = cells != _NOT_FOUND
+        if self.comm.size > 1:
+            # points on partition boundaries are only kept by the lowest rank
+            rank = np.where(found, self.comm.rank, self.comm.size).astype(np.int32)
+            owner = np.empty_like(rank)
+            self.comm.Allreduce(rank, owner, op=MPI.MIN)
+            found &= owner == self.comm.rank
+            self.inside = owner < self.comm.size
+        else:
+            self.inside = found
+        return cells, found
+
+    def _tabulate(self, function_space):
+        element = function_space.element()
+        dofmap = function_space.dofmap()
+        value_size = element.value_dimension(0) if element.value_rank() > 0 else 1
+        space_dim = element.space_dimension()
+        rows, cols, vals = [], [], []
+        for ipoint in np.where(self.found)[0]:
+            cell = dolfin.Cell(self.mesh, int(self.cells[ipoint]))
+            basis = element.evaluate_basis_all(
+                self.points[ipoint],
+                cell.get_coordinate_dofs(),
+                cell.orientation(),
+            )
+            rows.append(np.full(space_dim, ipoint))
+            cols.append(dofmap.cell_dofs(cell.index()))
+            vals.append(basis.reshape(space_dim, value_size))
+        if rows:
+            return np.hstack(rows), np.hstack(cols), np.vstack(vals)
+        empty = np.array([], dtype=int)
+        return empty, empty, np.empty((0, value_size))
+
+    def matrices(self, function_space, nlocal):
+        """Sparse interpolation matrices, one per value component.
+
+        Parameters
+        ----------
+        function_space : FunctionSpace
+            The function space (possibly a subspace) of the functions.
+        nlocal : int
+            Local size (owned and ghost entries) of the function vectors.
+
+        Returns
+        -------
+        list of scipy.sparse.csr_matrix
+            The matrices of shape ``(npoints, nlocal)``.
+
+        """
+        key = function_space.id(), nlocal
+        if key not in self._matrices:
+            if function_space.id() not in self._tables:
+                self._tables[function_space.id()] = self._tabulate(function_space)
+            rows, cols, vals = self._tables[function_space.id()]
+            self._matrices[key] = [
+                sp.csr_matrix((v, (rows, cols)), shape=(self.npoints, nlocal))
+                for v in vals.T
+            ]
+        return self._matrices[key]
+
+    def _apply_real(self, f):
+        if not isinstance(f, dolfin.Function):
+            f = project_iterative(f, self.function_space)
+        values = _local_array(f)
+        matrices = self.matrices(f.function_space(), len(values))
+        out = np.vstack([M @ values for M in matrices])
+        if self.comm.size > 1:
+            self.comm.Allreduce(MPI.IN_PLACE, out)
+        return out
+
+    def __call__(self, f, out=None):
+        """Resample a function on the grid.
+
+        Parameters
+        ----------
+        f : Function or Complex
+            The function to resample. Parts that are not Functions are
+            projected onto ``function_space`` first.
+        out : numpy array or memmap
+            Array of shape ``shape`` (or ``(value_size, *shape)`` for vector
+            functions) to store the result in (the default is None).
+
+        Returns
+        -------
+        numpy array
+            The values on the grid.
+
+        """
+        if iscomplex(f):
+            values = self._apply_real(f.real) + 1j * self._apply_real(f.imag)
+        else:
+            values = self._apply_real(f)
+        values[:, ~self.inside] = self.fill_value
+        shape = self.shape if len(values) == 1 else (len(values), *self.shape)
+        values = values.reshape(shape)
+        if out is None:
+            return values
+        out[:] = values
+        return out
+
+
+def resample(f, function_space, bounds, shape, filename=None, **kwargs):
+    """Resample a function on a regular grid.
+
+    Parameters
+    ----------
+    f : Function or Complex
+        The function to resample.
+    function_space : FunctionSpace
+        The (real) function space to represent the function in.
+    bounds : tuple of tuples
+        The bounds of the grid.
+    shape : tuple of int
+        The number of grid points along each direction.
+    filename : str
+        If given, the result is stored in a memory-mapped ``.npy`` file,
+        written by the first rank and mapped read-only by the others (the
+        default is None).
+    **kwargs : dict
+        Additional arguments passed to :class:`GridResampler`.
+
+    Returns
+    -------
+    numpy array or memmap
+        The values on the grid.
+
+    """
+    resampler = GridResampler(function_space, bounds, shape, **kwargs)
+    values = resampler(f)
+    if filename is None:
+        return values
+    # the values are gathered on all ranks, the file is written by the first
+    # one and the others map it once it is complete
+    comm = resampler.comm
+    if comm.rank == 0:
+        out = np.lib.format.open_memmap(
+            filename, mode="w+", dtype=values.dtype, shape=values.shape
+        )
+        out[:] = values
+        out.flush()
+    comm.barrier()
+    if comm.rank != 0:
+        out = np.lib.format.open_memmap(filename, mode="r")
+    return out
@@ -7,12 +7,14 @@
 # See the documentation at gyptis.gitlab.io
 
 import numpy as np
+import pytest
 from test_geometry import geom2D
 
 from gyptis import dolfin
 from gyptis.bc import *
 from gyptis.bc import _DirichletBC
 from gyptis.complex import *
+from gyptis.geometry import Lattice2D
 
 
 def test_dirichlet():
@@ -57,3 +59,22 @@ def test_dirichlet():
     U = [u(r / 2, t) for t in T]
     exact = r / 2 * T
     assert np.all(np.abs(np.array(U) - exact) ** 2 < 1e-6)
+
+
+@pytest.mark.parametrize("vectors", [((1, 0), (0, 1)), ((1, 0), (0.5, 0.8))])
+def test_lattice_periodic_map(vectors):
+    lattice = Lattice2D(vectors)
+    lattice.add_physical(lattice.cell, "cell")
+    lattice.set_size("cell", 0.1)
+    lattice.build()
+    mesh = lattice.mesh
+    pbc = BiPeriodic2D(lattice)
+    assert isinstance(pbc, dolfin.SubDomain)
+    V = dolfin.FunctionSpace(mesh, "CG", 1, constrained_domain=pbc)
+    # the vertices on the faces opposite to the origin are slaves
+    fractional = mesh.coordinates() @ np.linalg.inv(np.array(vectors, dtype=float))
+    slaves = np.any(np.abs(fractional - 1) < 1e-10, axis=1)
+    assert V.dim() == mesh.num_vertices() - np.sum(slaves)
+    expr = dolfin.Expression("cos(2*pi*x[0])", degree=4)
+    u = dolfin.interpolate(expr, V)
+    assert abs(u(*vectors[0]) - u(0, 0)) < 1e-12
@@ -142,3 +142,100 @@ def test_complex(tol=1e-15):
 
     u.phase
     u.module
+
+
+def test_assemble_fused():
+    from gyptis import dolfin
+    from gyptis.complex import Complex, _assemble_parts, assemble
+
+    mesh = dolfin.UnitSquareMesh(10, 10)
+    x = dolfin.SpatialCoordinate(mesh)
+    f = Complex(x[0] ** 2, dolfin.sin(x[1]))
+    for measure in [dolfin.dx, dolfin.ds]:
+        form = f * measure(domain=mesh)
+        fused = assemble(form).tocomplex()
+        assert np.allclose(fused, _assemble_parts(form).tocomplex())
+    form = f("+") * dolfin.dS(domain=mesh) + f * dolfin.dx(domain=mesh)
+    fused = assemble(form).tocomplex()
+    assert np.allclose(fused, _assemble_parts(form).tocomplex())
+
+
+def test_power():
+    from gyptis import dolfin
+    from gyptis.complex import Complex, assemble, form_size
+
+    z = Complex(0.3, -1.2)
+    for n in [0, 1, 2, 3, 5, -1, -4, 2.0]:
+        assert np.allclose((z**n).tocomplex(), (0.3 - 1.2j) ** n)
+    assert np.allclose((z**0.5).tocomplex(), (0.3 - 1.2j) ** 0.5)
+    assert np.allclose((3 - z).tocomplex(), 3 - (0.3 - 1.2j))
+
+    mesh = dolfin.UnitSquareMesh(2, 2)
+    x = dolfin.SpatialCoordinate(mesh)
+    u = Complex(x[0], x[1])
+    dx = dolfin.dx(domain=mesh)
+    polar = u.polar2cart(abs(u) ** 2, 2 * u.phase)
+    assert form_size(u**2 * dx) < form_size(polar * dx)
+    assert np.allclose(
+        assemble(u**2 * dx).tocomplex(), assemble(polar * dx).tocomplex()
+    )
+
+
+def test_dof_ordering():
+    from gyptis import dolfin
+    from gyptis.complex import ComplexFunctionSpace, dof_ordering
+
+    mesh = dolfin.UnitSquareMesh(8, 8)
+    expr = dolfin.Expression("x[0]*x[0] + x[1]", degree=2)
+    norms = []
+    for ordering in [False, True, "rcm", "gps"]:
+        W = ComplexFunctionSpace(mesh, "CG", 2, reorder_dofs=ordering)
+        assert W.reorder_dofs == ordering
+        assert W.dim() == 2 * 17**2
+        u = dolfin.interpolate(expr, W.sub(0).collapse())
+        norms.append(dolfin.assemble(u**2 * dolfin.dx))
+    assert np.allclose(norms, norms[0])
+    reorder = dolfin.parameters["reorder_dofs_serial"]
+    with dof_ordering(not reorder):
+        assert dolfin.parameters["reorder_dofs_serial"] is not reorder
+    assert dolfin.parameters["reorder_dofs_serial"] is reorder
+    with pytest.raises(ValueError):
+        with dof_ordering("natural"):
+            pass
+
+
+def test_dof_ordering_periodic():
+    from gyptis import dolfin
+    from gyptis.bc import BiPeriodic2D
+    from gyptis.complex import ComplexFunctionSpace
+    from gyptis.geometry import Lattice2D
+
+    lattice = Lattice2D(((1, 0), (0, 1)))
+    lattice.add_physical(lattice.cell, "cell")
+    lattice.set_size("cell", 0.1)
+    lattice.build()
+    mesh = lattice.mesh
+    pbc = BiPeriodic2D(lattice)
+    f = dolfin.Expression("(1 + 4*pi*pi)*cos(2*pi*x[0])", degree=4)
+    dims, solutions = [], []
+    for ordering in [False, True, "rcm", "gps"]:
+        W = ComplexFunctionSpace(
+            mesh, "CG", 1, constrained_domain=pbc, reorder_dofs=ordering
+        )
+        u, v = dolfin.TrialFunction(W), dolfin.TestFunction(W)
+        a = dolfin.inner(dolfin.grad(u), dolfin.grad(v)) * dolfin.dx
+        a += dolfin.inner(u, v) * dolfin.dx
+        L = (f * v[0] + 2 * f * v[1]) * dolfin.dx
+        uh = dolfin.Function(W)
+        dolfin.solve(a == L, uh)
+        dims.append(W.dim())
+        solutions.append(uh.compute_vertex_values(mesh))
+    # the periodic constraints are kept by all orderings
+    assert dims[0] < 2 * mesh.num_vertices()
+    assert all(dim == dims[0] for dim in dims)
+    for solution in solutions[1:]:
+        assert np.allclose(solution, solutions[0], atol=1e-10)
+    exact = np.cos(2 * np.pi * mesh.coordinates()[:, 0])
+    nv = mesh.num_vertices()
+    assert np.max(np.abs(solutions[0][:nv] - exact)) < 0.1
+    assert np.allclose(solutions[0][nv:], 2 * solutions[0][:nv])
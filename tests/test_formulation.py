@@ -6,9 +6,15 @@
 # License: MIT
 # See the documentation at gyptis.gitlab.io
 
+import warnings
 
+import numpy as np
+import pytest
+
+from gyptis import dolfin
 from gyptis.api import BoxPML
-from gyptis.complex import ComplexFunctionSpace
+from gyptis.bc import BoundaryInterpolator
+from gyptis.complex import Complex, ComplexFunctionSpace
 from gyptis.formulations import *
 from gyptis.geometry import *
 from gyptis.materials import *
@@ -109,6 +115,67 @@ def test_maxwell2d():
     )
     maxwell.build_boundary_conditions()
 
+    # boundary values of a field that is exact in the finite element space:
+    # the facet projection and the direct interpolation must agree
+    V = maxwell.real_function_space
+    interp = BoundaryInterpolator(V, geom, ["cyl_bnds"])
+    x = dolfin.SpatialCoordinate(mesh)
+    expr_re = dolfin.Expression("2*x[0]-x[1]", degree=1)
+    expr_im = dolfin.Expression("x[1]", degree=1)
+    projected = interp(Complex(2 * x[0] - x[1], -3 * x[1]))
+    interpolated = interp(Complex(expr_re, -3 * expr_im))
+    bc = dolfin.DirichletBC(V, 0, geom.boundary_markers, geom.boundaries["cyl_bnds"])
+    dofs = list(bc.get_boundary_values().keys())
+    assert len(dofs) > 0
+    for p, i in zip(
+        (projected.real, projected.imag), (interpolated.real, interpolated.imag)
+    ):
+        assert np.allclose(p.vector()[dofs], i.vector()[dofs])
+    # real vector valued functions have a vanishing imaginary part
+    W = dolfin.VectorFunctionSpace(mesh, "CG", 1)
+    values = BoundaryInterpolator(W, geom, ["cyl_bnds"])(dolfin.Constant((1, 2)))
+    assert np.allclose(values.imag.vector().get_local(), 0)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        lhs = maxwell.build_lhs()
+    assert not any("exceeds the budget" in str(w.message) for w in caught)
+    for integral in lhs.integrals():
+        assert integral.metadata()["quadrature_degree"] <= 3 * degree
+    # the capped degrees exceed a lower budget
+    maxwell.max_quadrature_degree = degree
+    with pytest.warns(UserWarning, match=f"exceeds the budget of {degree}"):
+        maxwell.build_lhs()
+    maxwell.max_quadrature_degree = None
+    maxwell.quadrature_degree = 3 * degree + 3
+    with pytest.warns(UserWarning):
+        lhs = maxwell.build_lhs()
+    for integral in lhs.integrals():
+        assert integral.metadata()["quadrature_degree"] == 3 * degree + 3
+
+    maxwell.cache_annex = True
+    annex = maxwell.annex
+    assert maxwell.annex is annex
+    pw.wavelength = 2 * wavelength
+    assert maxwell.annex is not annex
+
+
+def test_parameter_key():
+    from gyptis.formulations.formulation import _parameter_key
+
+    a = np.zeros(2000)
+    b = a.copy()
+    b[1000] = 1
+    # the representations of large arrays are truncated
+    assert repr(a) == repr(b)
+    assert _parameter_key(a) != _parameter_key(b)
+    assert _parameter_key((1, 2.0, "TM")) == (1, 2.0, "TM")
+    c = dolfin.Constant((1, 2))
+    key = _parameter_key(Complex(c, 0))
+    assert _parameter_key(Complex(c, 0)) == key
+    c.assign(dolfin.Constant((1, 3)))
+    assert _parameter_key(Complex(c, 0)) != key
+
 
 def test_maxwell2d_periodic():
     lambda0, period = 1, 1
@@ -8,10 +8,12 @@
 
 from math import pi
 
+import numpy as np
 import pytest
 
 from gyptis import BoxPML, dolfin
 from gyptis.geometry import *
+from gyptis.materials import PML
 
 
 def geom2D(square_size=1, cyl_size=0.3, mesh_size=0.1):
@@ -107,3 +109,75 @@ def test_spline():
     g.add_physical(spl, "kk")
 
     g.build()
+
+
+def test_batch():
+    model = Geometry("Supercell", dim=2)
+    box = model.add_rectangle(-2, -2, 0, 4, 4)
+    x = np.linspace(-1.5, 1.5, 6)
+    centers = np.array([(xi, yi) for xi in x for yi in x])
+    with model.batch():
+        assert model._batch_level == 1
+        disks = model.add_disks(centers, 0.1)
+    assert model._batch_level == 0
+    assert len(disks) == len(centers)
+    triangle = [(-1.95, -1.95, 0), (-1.85, -1.95, 0), (-1.85, -1.85, 0)]
+    disks, box = model.fragment_inclusions(disks, box)
+    triangles, box = model.add_polygons([triangle], host=box)
+    model.add_physical(disks, "disks")
+    model.add_physical(triangles, "triangles")
+    model.add_physical(box, "box")
+    model.set_size("disks", 0.05)
+    model.set_size("triangles", 0.05)
+    model.set_size("box", 0.2)
+    model.build()
+    dx = model.measure["dx"]
+    area = dolfin.assemble(1 * dx("disks"))
+    assert abs(area - len(centers) * pi * 0.1**2) < 1e-2
+    area = dolfin.assemble(1 * dx("triangles"))
+    assert abs(area - 0.005) < 1e-6
+
+
+def test_size_from_wavelength():
+    assert abs(local_mesh_size(1) - 0.1) < 1e-12
+    assert abs(local_mesh_size(1, epsilon=4) - 0.05) < 1e-12
+    assert abs(local_mesh_size(1, epsilon=4, degree=2) - 0.1) < 1e-12
+    assert abs(local_mesh_size(1, epsilon=np.diag([1, 4, 1])) - 0.05) < 1e-12
+    eps_metal = -20 + 1j
+    index = np.sqrt(eps_metal)
+    skin_depth = 1 / (2 * pi * index.imag)
+    assert abs(local_mesh_size(1, eps_metal) - skin_depth / 3) < 1e-12
+    model = BoxPML(dim=2, box_size=(4, 4), pml_width=(1, 1))
+    cyl = model.add_disk(0, 0, 0, 0.5, 0.5)
+    cyl, model.box = model.fragment(cyl, model.box)
+    model.add_physical(cyl, "cyl")
+    model.add_physical(model.box, "box")
+    pmls = [
+        PML("x", matched_domain="box", applied_domain=p) for p in model.pml_physical
+    ]
+    sizes = model.set_size_from_wavelength(1, dict(box=1, cyl=4), pmls=pmls)
+    assert sizes["cyl"] == sizes["box"] / 2
+    assert all(sizes[p] == sizes["box"] for p in model.pml_physical)
+    model.build()
+
+
+def test_morph():
+    model = geom2D(mesh_size=0.05)
+    dx = model.measure["dx"]
+    mesh = model.mesh
+    V = dolfin.FunctionSpace(mesh, "CG", 1)
+    scaling = dolfin.Expression(("s * x[0]", "s * x[1]"), s=0.1, degree=1)
+    displacement = model.smooth_displacement(dict(cyl_bnds=scaling))
+    assert model.morph(displacement)
+    assert model.mesh is mesh and model.mesh_version == 1
+    area = dolfin.assemble(1 * dx("cyl"))
+    assert abs(area - (1.1 * model.cyl_size) ** 2) < 1e-10
+    area = dolfin.assemble(1 * dx)
+    assert abs(area - model.square_size**2) < 1e-10
+    assert V.dim() == dolfin.FunctionSpace(mesh, "CG", 1).dim()
+    coordinates = mesh.coordinates().copy()
+    scaling.s = 2
+    displacement = model.smooth_displacement(dict(cyl_bnds=scaling))
+    assert not model.morph(displacement)
+    assert model.mesh_version == 1
+    assert np.all(mesh.coordinates() == coordinates)
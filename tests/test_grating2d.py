@@ -171,3 +171,42 @@ def test_grating2dpec(polarization, degree):
     pprint(effs)
     if degree == 2:
         assert abs(effs["B"] - 1) < tol_balance, "Unsatified energy balance"
+
+
+@pytest.mark.parametrize("polarization", ["TM", "TE"])
+def test_grating2d_cache_annex(polarization):
+    from gyptis import assemble
+    from gyptis.models.grating2d import Grating2D, Layered2D, OrderedDict
+    from gyptis.sources import PlaneWave
+
+    wavelength, period = 1, 0.8
+    thicknesses = OrderedDict(
+        {
+            "pml_bottom": wavelength,
+            "substrate": wavelength,
+            "groove": wavelength / 2,
+            "superstrate": wavelength,
+            "pml_top": wavelength,
+        }
+    )
+    geom = Layered2D(period, thicknesses)
+    for dom in thicknesses:
+        geom.set_size(dom, wavelength / pmesh)
+    geom.build()
+    epsilon = dict(substrate=3, groove=2 - 0.1j, superstrate=1)
+    mu = dict(substrate=1, groove=1, superstrate=1)
+    pw = PlaneWave(wavelength=wavelength, angle=np.pi / 6, dim=2, domain=geom.mesh)
+    s = Grating2D(geom, epsilon, mu, source=pw, polarization=polarization)
+    u = s.solve()
+    effs = s.diffraction_efficiencies()
+    s.formulation.cache_annex = True
+    u_cached = s.solve()
+    # the piecewise field of the stack is not projected onto the continuous
+    # function space
+    assert s.formulation.annex is s.formulation.annex_field["as_subdomain"]["stack"]
+    dx = s.formulation.dx
+    err = assemble((u_cached - u).abs2() * dx).real
+    assert err < 1e-12 * assemble(u.abs2() * dx).real
+    effs_cached = s.diffraction_efficiencies()
+    for key in ["R", "T", "B"]:
+        assert abs(effs_cached[key] - effs[key]) < 1e-10
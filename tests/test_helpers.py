@@ -13,3 +13,40 @@ from gyptis.utils.helpers import *
 
 def test_all():
     assert tanh(1.2) == np.tanh(1.2)
+
+
+def test_no_annotations():
+    from gyptis import dolfin
+
+    with no_annotations():
+        mesh = dolfin.UnitSquareMesh(2, 2)
+        V = dolfin.FunctionSpace(mesh, "CG", 1)
+        u = project_iterative(dolfin.Constant(1), V)
+    assert np.allclose(function2array(u), 1)
+
+
+def test_array2function():
+    from gyptis import dolfin
+
+    mesh = dolfin.UnitSquareMesh(4, 4)
+    V = dolfin.FunctionSpace(mesh, "CG", 1)
+    values = np.random.rand(V.dim())
+    u = array2function(values, V)
+    first, last = V.dofmap().ownership_range()
+    assert np.allclose(function2array(u), values[first:last])
+    view = function2array(u, copy=False)
+    assert not view.flags.writeable
+    v = array2function(2 * values[first:last], V, local=True, out=u)
+    assert v is u
+    assert np.allclose(view, 2 * values[first:last])
+    assert np.allclose(array2function(3, V).vector().get_local(), 3)
+    x = array2function(list(values), V)
+    assert np.allclose(function2array(x), values[first:last])
+    w = array2function(u.vector(), V)
+    assert np.allclose(function2array(w), function2array(u))
+    functions = array2functions([values, 2 * values], V)
+    arrays = functions2array(functions)
+    assert arrays.shape == (2, last - first)
+    assert np.allclose(arrays[1], 2 * values[first:last])
+    out = np.empty_like(arrays)
+    assert functions2array(functions, out=out) is out
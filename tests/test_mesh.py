@@ -6,12 +6,216 @@
 # License: MIT
 # See the documentation at gyptis.gitlab.io
 
+import os
+import time
+
+import gmsh
+import numpy as np
 import pytest
 
+from gyptis import dolfin
+from gyptis.geometry import Geometry
 from gyptis.mesh import *
+import gyptis.geometry.geometry
+import gyptis.mesh.mesh
+from gyptis.mesh.mesh import _extract_distributed_submesh, _read_mesh_xdmf
 
 
 def test_marked_mesh(shared_datadir):
     mshfile = shared_datadir / "mesh.msh"
     mmsh = MarkedMesh(mshfile, 2)
     print(mmsh)
+
+
+def test_read_gmsh_model():
+    model = Geometry("Square", dim=2)
+    box = model.add_rectangle(-0.5, -0.5, 0, 1, 1)
+    cyl = model.add_disk(0, 0, 0, 0.2, 0.2)
+    cyl, box = model.fragment(cyl, box)
+    model.add_physical(box, "box")
+    model.add_physical(cyl, "cyl")
+    model.add_physical(model.get_boundaries("cyl"), "cyl_bnds", dim=1)
+    model.set_size("box", 0.1)
+    model.set_size("cyl", 0.05)
+    model.build(finalize=False)
+    in_memory = model.read_mesh_model()
+    gmsh.finalize()
+    from_file = _read_mesh_xdmf(model.msh_file, dim=2)
+    assert in_memory["mesh"].num_cells() == from_file["mesh"].num_cells()
+    assert in_memory["mesh"].num_vertices() == from_file["mesh"].num_vertices()
+    for cell_type in ["triangle", "line"]:
+        values = in_memory["markers"][cell_type].array()
+        values_file = from_file["markers"][cell_type].array()
+        assert np.array_equal(np.unique(values), np.unique(values_file))
+        for tag in np.unique(values):
+            assert np.sum(values == tag) == np.sum(values_file == tag)
+    dx = dolfin.Measure(
+        "dx", domain=in_memory["mesh"], subdomain_data=in_memory["markers"]["triangle"]
+    )
+    area = dolfin.assemble(1 * dx(model.subdomains["surfaces"]["box"]))
+    assert abs(area - (1 - np.pi * 0.2**2)) < 1e-2
+
+
+def test_read_gmsh_model_overlapping_physicals():
+    model = Geometry("Square", dim=2)
+    box = model.add_rectangle(-0.5, -0.5, 0, 1, 1)
+    cyl = model.add_disk(0, 0, 0, 0.2, 0.2)
+    cyl, box = model.fragment(cyl, box)
+    model.add_physical(box, "box")
+    model.add_physical(cyl, "cyl")
+    # every surface belongs to two physical groups
+    model.add_physical([cyl, box], "all")
+    model.set_size("box", 0.1)
+    model.set_size("cyl", 0.05)
+    model.build(finalize=False)
+    in_memory = model.read_mesh_model()
+    _, element_tags, _ = gmsh.model.mesh.getElements(2)
+    gmsh.finalize()
+    assert in_memory["mesh"].num_cells() == sum(len(t) for t in element_tags)
+    values = in_memory["markers"]["triangle"].array()
+    surfaces = model.subdomains["surfaces"]
+    assert set(np.unique(values)) == {surfaces["box"], surfaces["cyl"]}
+    area = dolfin.assemble(1 * dolfin.dx(domain=in_memory["mesh"]))
+    assert abs(area - 1) < 1e-10
+
+
+def test_read_gmsh_model_timing():
+    model = Geometry("Square", dim=2)
+    box = model.add_rectangle(-0.5, -0.5, 0, 1, 1)
+    model.add_physical(box, "box")
+    model.add_physical(model.get_boundaries("box"), "box_bnds", dim=1)
+    model.set_size("box", 0.004)
+    model.build(finalize=False)
+    t0 = time.perf_counter()
+    in_memory = model.read_mesh_model()
+    t_memory = time.perf_counter() - t0
+    gmsh.finalize()
+    t0 = time.perf_counter()
+    from_file = _read_mesh_xdmf(model.msh_file, dim=2)
+    t_file = time.perf_counter() - t0
+    assert in_memory["mesh"].num_cells() == from_file["mesh"].num_cells()
+    assert in_memory["mesh"].num_cells() > 100000
+    # the in memory transfer must not be slower than the XDMF round trip
+    assert t_memory < t_file
+
+
+def _cached_geometry(cache, mesh_size):
+    model = Geometry("Square", dim=2, mesh_cache=cache)
+    box = model.add_rectangle(-0.5, -0.5, 0, 1, 1)
+    cyl = model.add_disk(0, 0, 0, 0.2, 0.2)
+    cyl, box = model.fragment(cyl, box)
+    model.add_physical(box, "box")
+    model.add_physical(cyl, "cyl")
+    model.set_size("box", mesh_size)
+    model.set_size("cyl", mesh_size / 2)
+    model.build()
+    return model
+
+
+def test_mesh_cache(tmp_path):
+    cache = MeshCache(tmp_path)
+    model = _cached_geometry(cache, 0.1)
+    assert len(cache.entries()) == 1
+    cached = _cached_geometry(cache, 0.1)
+    assert len(cache.entries()) == 1
+    assert cached.mesh.num_cells() == model.mesh.num_cells()
+    assert cached.subdomains == model.subdomains
+    assert np.array_equal(cached.markers.array(), model.markers.array())
+    _cached_geometry(cache, 0.05)
+    assert len(cache.entries()) == 2
+    cache.max_size = 0
+    cache.evict()
+    assert len(cache.entries()) == 0
+
+
+def test_mesh_hdf5(tmp_path):
+    model = _cached_geometry(None, 0.1)
+    filename = str(tmp_path / "mesh.h5")
+    write_mesh_hdf5(filename, model.mesh_object, model.subdomains)
+    mesh_object, subdomains = read_mesh_hdf5(filename)
+    assert subdomains == model.subdomains
+    assert mesh_object["mesh"].num_cells() == model.mesh.num_cells()
+    for cell_type, marker in model.mesh_object["markers"].items():
+        values = mesh_object["markers"][cell_type].array()
+        assert np.array_equal(values, marker.array())
+
+
+def test_extract_submesh():
+    model = _cached_geometry(None, 0.1)
+    submesh = model.extract_sub_mesh("cyl")
+    parent = parent_cell_indices(submesh, model.mesh)
+    assert len(parent) == submesh.num_cells()
+    assert np.all(model.markers.array()[parent] == model.subdomains["surfaces"]["cyl"])
+    assert parent_cell_indices(model.mesh, submesh) is None
+
+
+@pytest.mark.skipif(not hasattr(dolfin, "MeshView"), reason="requires MeshView")
+def test_extract_submesh_mesh_view():
+    model = _cached_geometry(None, 0.1)
+    tag = model.subdomains["surfaces"]["cyl"]
+    submesh = _extract_distributed_submesh(model.mesh, model.markers, tag)
+    parent = parent_cell_indices(submesh, model.mesh)
+    assert len(parent) == np.sum(model.markers.array() == tag)
+    assert np.all(model.markers.array()[parent] == tag)
+
+
+class _Comm:
+    size = 2
+    rank = 0
+
+    def barrier(self):
+        pass
+
+
+def test_extract_submesh_fallback(monkeypatch):
+    model = _cached_geometry(None, 0.1)
+    tag = model.subdomains["surfaces"]["cyl"]
+    monkeypatch.setattr(gyptis.mesh.mesh, "_has_mesh_view", lambda: False)
+    monkeypatch.setattr(gyptis.geometry.geometry, "_has_mesh_view", lambda: False)
+    with pytest.raises(NotImplementedError):
+        _extract_distributed_submesh(model.mesh, model.markers, tag)
+    # the parallel branch of the geometry reads the submesh from the mesh file
+    model.comm = _Comm()
+    submesh = model.extract_sub_mesh("cyl")
+    assert submesh.num_cells() == np.sum(model.markers.array() == tag)
+    area = dolfin.assemble(1 * dolfin.dx(submesh))
+    assert abs(area - dolfin.assemble(1 * model.measure["dx"]("cyl"))) < 1e-12
+
+
+@pytest.mark.parametrize("mesh_order", [1, 2])
+def test_curved_mesh(mesh_order):
+    model = Geometry("Circle", dim=2, mesh_order=mesh_order)
+    box = model.add_rectangle(-0.5, -0.5, 0, 1, 1)
+    cyl = model.add_disk(0, 0, 0, 0.2, 0.2)
+    cyl, box = model.fragment(cyl, box)
+    model.add_physical(box, "box")
+    model.add_physical(cyl, "cyl")
+    model.add_physical(model.get_boundaries("cyl"), "cyl_bnds", dim=1)
+    model.set_size("box", 0.1)
+    model.set_size("cyl", 0.1)
+    model.build()
+    mesh = model.mesh
+    assert mesh.ufl_coordinate_element().degree() == mesh_order
+    area = dolfin.assemble(1 * model.measure["dx"]("cyl"))
+    length = dolfin.assemble(1 * model.measure["dS"]("cyl_bnds"))
+    tol = 1e-2 if mesh_order == 1 else 1e-3
+    assert abs(area - np.pi * 0.2**2) < tol
+    assert abs(length - 2 * np.pi * 0.2) < tol
+    area = dolfin.assemble(1 * model.measure["dx"])
+    assert abs(area - 1) < 1e-10
+
+
+def test_extract_submesh_cache_hit(tmp_path, monkeypatch):
+    cache = MeshCache(tmp_path)
+    _cached_geometry(cache, 0.1)
+    model = _cached_geometry(cache, 0.1)
+    assert not os.path.isfile(model.msh_file)
+    tag = model.subdomains["surfaces"]["cyl"]
+    monkeypatch.setattr(gyptis.geometry.geometry, "_has_mesh_view", lambda: False)
+    # the fallback reads the mesh file, written from the cached mesh
+    model.comm = _Comm()
+    submesh = model.extract_sub_mesh("cyl")
+    assert os.path.isfile(model.msh_file)
+    assert submesh.num_cells() == np.sum(model.markers.array() == tag)
+    area = dolfin.assemble(1 * dolfin.dx(submesh))
+    assert abs(area - dolfin.assemble(1 * model.measure["dx"]("cyl"))) < 1e-12
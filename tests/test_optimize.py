@@ -10,6 +10,7 @@
 import pytest
 from test_geometry import geom2D
 
+import gyptis
 from gyptis import dolfin as df
 from gyptis.optimize import *
 from gyptis.plot import *
@@ -42,6 +43,13 @@ def test_filter():
 
     filter = Filter(rfilt)
     af = filter.apply(a)
+    # the function space and operator are built once
+    V, solver = filter.function_space, filter.solver
+    filter.apply(a)
+    assert filter.function_space is V and filter.solver is solver
+    filter_mesh = Filter(rfilt, mesh=submesh)
+    assert filter_mesh.function_space.mesh().id() == submesh.id()
+    assert np.allclose(filter_mesh.apply(a).vector()[:], af.vector()[:])
 
     filter1 = Filter(rfilt, solver=filter.solver)
     filter1.apply(a)
@@ -83,3 +91,182 @@ def test_simp(tol=1e-14):
 
 def test_projection():
     projection(a, beta=1, nu=0.5)
+
+
+def test_filter_transpose():
+    rfilt = r * 0.1
+    filter = Filter(rfilt, output_function_space=W)
+    af = filter.apply(a)
+    solver = filter.solver
+    filter.apply(a0)
+    assert filter.solver is solver
+    g = array2function(np.random.rand(W.dim()), W)
+    gt = filter.apply_transpose(g, W)
+    lhs = af.vector().inner(g.vector())
+    rhs = a.vector().inner(gt.vector())
+    assert abs(lhs - rhs) < 1e-6 * abs(lhs)
+
+
+def test_transfer_operator():
+    V = df.FunctionSpace(mesh, "DG", 0)
+    transfer = TransferOperator(W, V)
+    b = transfer(a)
+    assert abs(assemble(b * dx("cyl")) - assemble(a * df.dx)) < 1e-12
+    assert abs(assemble(b * dx("box"))) < 1e-12
+    g = array2function(np.random.rand(V.dim()), V)
+    gt = transfer.transpose(g)
+    lhs = b.vector().inner(g.vector())
+    rhs = a.vector().inner(gt.vector())
+    assert abs(lhs - rhs) < 1e-12 * abs(lhs)
+
+
+def test_mma():
+    xt = np.linspace(0.1, 0.9, 10)
+
+    def fun(x, grad):
+        grad[:] = 2 * (x - xt)
+        return np.sum((x - xt) ** 2)
+
+    opt = MMA(np.zeros(10), np.ones(10), comm=df.MPI.comm_self)
+    opt.set_maxeval(50)
+    opt.set_min_objective(fun)
+    xopt = opt.optimize(0.5 * np.ones(10))
+    assert np.allclose(xopt, xt, atol=1e-6)
+    assert opt.last_optimum_value() < 1e-10
+
+    values = []
+
+    def rosenbrock(x, grad):
+        grad[0] = -2 * (1 - x[0]) - 400 * x[0] * (x[1] - x[0] ** 2)
+        grad[1] = 200 * (x[1] - x[0] ** 2)
+        values.append((1 - x[0]) ** 2 + 100 * (x[1] - x[0] ** 2) ** 2)
+        return values[-1]
+
+    # nonconvex: the MMA approximation is not always conservative here
+    opt = MMA(np.zeros(2), 2 * np.ones(2), comm=df.MPI.comm_self)
+    opt.set_maxeval(100)
+    opt.set_min_objective(rosenbrock)
+    xopt = opt.optimize([0.2, 1.5])
+    assert opt.last_optimum_value() == min(values) < 1e-3 * values[0]
+    assert np.allclose(xopt, 1, atol=0.3)
+
+
+def test_multi_objective():
+    with pytest.raises(ValueError):
+        MultiObjective([None], aggregation="unknown")
+    values = [1.0, 3.0, 2.0]
+    multi = MultiObjective([None] * 3, weights=[1, 2, 1])
+    f, coefs = multi.aggregate(values)
+    assert np.allclose(f, 9)
+    assert np.allclose(coefs, [1, 2, 1])
+    multi = MultiObjective([None] * 3, aggregation="mean")
+    f, coefs = multi.aggregate(values)
+    assert np.allclose(f, 2)
+    assert np.allclose(coefs, 1 / 3)
+    multi = MultiObjective([None] * 3, aggregation="max", ks_parameter=100)
+    f, coefs = multi.aggregate(values)
+    assert 3 <= f < 3.01
+    assert np.allclose(coefs.sum(), 1)
+    assert np.argmax(coefs) == 1
+
+
+class _Comm:
+    def __init__(self, rank, size):
+        self.rank, self.size = rank, size
+
+    def Split(self, color, key):
+        return color
+
+
+def test_multi_objective_split():
+    multi = MultiObjective([None] * 3, concurrent=True)
+    groups = [multi.split(_Comm(rank, 4)) for rank in range(4)]
+    assert groups == [(0, [0]), (0, [0]), (1, [1]), (2, [2])]
+    groups = [multi.split(_Comm(rank, 2)) for rank in range(2)]
+    assert groups == [(0, [0, 2]), (1, [1])]
+
+
+def test_distribute():
+    from gyptis.optimize import _cell_array, _cell_function
+
+    distributed = geom.distribute(df.MPI.comm_self)
+    assert distributed.comm is df.MPI.comm_self
+    assert distributed.mesh.num_cells() == mesh.num_cells()
+    area = assemble(1 * distributed.measure["dx"]("cyl"))
+    assert abs(area - assemble(1 * dx("cyl"))) < 1e-12
+    V = df.FunctionSpace(mesh, "DG", 0)
+    Vd = df.FunctionSpace(distributed.mesh, "DG", 0)
+    f = project(df.Expression("x[0] + 2*x[1]", degree=1), V)
+    ncells = mesh.num_entities_global(2)
+    values = _cell_array(f, ncells)
+    fd = _cell_function(values, Vd)
+    assert np.allclose(_cell_array(fd, ncells), values)
+    assert abs(assemble(fd * distributed.measure["dx"]) - assemble(f * dx)) < 1e-12
+
+
+def _optimize(**kwargs):
+    from gyptis import BoxPML, PlaneWave, Scattering
+
+    lens = BoxPML(dim=2, box_size=(3, 3), pml_width=(1, 1))
+    design = lens.add_rectangle(-0.5, -0.5, 0, 1, 0.5)
+    design, box = lens.fragment(design, lens.box)
+    lens.add_physical(box, "box")
+    lens.add_physical(design, "design")
+    [lens.set_size(pml, 0.3) for pml in lens.pmls]
+    lens.set_size("box", 0.2)
+    lens.set_size("design", 0.1)
+    lens.build()
+    pw = PlaneWave(wavelength=1, angle=0, dim=2, domain=lens.mesh)
+
+    def fun(epsilon_design):
+        epsilon = dict(box=1, design=epsilon_design)
+        s = Scattering(lens, epsilon, dict(box=1, design=1), pw)
+        u = s.solve()
+        return -assemble((u * u.conj).real * s.dx("box"))
+
+    history = []
+
+    def callback(self):
+        density = assemble(self.density_fp * self.geometry.measure["dx"]("design"))
+        gradient = np.array(self.dobjective_dx)
+        history.append((float(self.objective), gradient, density))
+
+    optimizer = TopologyOptimizer(
+        fun,
+        lens,
+        rfilt=0.1,
+        maxiter=3,
+        threshold=(0, 1),
+        callback=callback,
+        verbose=False,
+        **kwargs,
+    )
+    np.random.seed(123456)
+    optimizer.minimize(np.random.rand(optimizer.nvar))
+    return history
+
+
+@pytest.mark.skipif(not gyptis.ADJOINT, reason="requires dolfin-adjoint")
+def test_reuse_tape():
+    history = _optimize(reuse_tape=False)
+    history_reuse = _optimize(reuse_tape=True)
+    assert len(history) == len(history_reuse) == 3
+    for (f, g, d), (f_reuse, g_reuse, d_reuse) in zip(history, history_reuse):
+        assert np.allclose(f_reuse, f, rtol=1e-8)
+        assert np.allclose(g_reuse, g, rtol=1e-6, atol=1e-12 * np.abs(g).max())
+        # the design attributes are refreshed after a replay
+        assert np.allclose(d_reuse, d, rtol=1e-10)
+
+
+@pytest.mark.skipif(not gyptis.ADJOINT, reason="requires dolfin-adjoint")
+def test_distributed():
+    history = _optimize(distributed=False)
+    history_distributed = _optimize(distributed=True)
+    assert len(history) == len(history_distributed) == 3
+    (f, g, d), (f_dist, g_dist, d_dist) = history[0], history_distributed[0]
+    assert np.allclose(f_dist, f, rtol=1e-10)
+    assert np.allclose(g_dist, g, rtol=1e-10)
+    assert np.allclose(d_dist, d, rtol=1e-10)
+    # both optimizers make progress from the same starting point
+    assert min(h[0] for h in history) < f
+    assert min(h[0] for h in history_distributed) < f_dist
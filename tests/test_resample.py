@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Author: Benjamin Vial
+# This file is part of gyptis
+# Version: 1.1.2
+# License: MIT
+# See the documentation at gyptis.gitlab.io
+
+import numpy as np
+import pytest
+
+from gyptis import dolfin
+from gyptis.complex import Complex
+from gyptis.utils.resample import GridResampler, resample
+
+
+def test_resample(tmp_path):
+    mesh = dolfin.UnitSquareMesh(20, 20)
+    V = dolfin.FunctionSpace(mesh, "CG", 1)
+    expr = dolfin.Expression("x[0] + 2*x[1]", degree=1)
+    u = dolfin.interpolate(expr, V)
+    bounds = (0, 1), (0, 1)
+    shape = 11, 6
+    resampler = GridResampler(V, bounds, shape)
+    x, y = resampler.grid
+    values = resampler(u)
+    assert values.shape == shape
+    assert np.allclose(values, x + 2 * y)
+
+    z = Complex(u, 3 * u)
+    values = resampler(z)
+    assert np.allclose(values, (1 + 3j) * (x + 2 * y))
+
+    values = resample(u, V, bounds, shape, filename=tmp_path / "u.npy")
+    assert np.allclose(np.load(tmp_path / "u.npy"), x + 2 * y)
+
+    resampler = GridResampler(V, ((-1, 0.5), (0, 1)), shape)
+    values = resampler(u)
+    assert np.all(np.isnan(values[resampler.grid[0] < 0]))
+
+    with pytest.raises(ValueError):
+        GridResampler(V, bounds, (2, 3, 4))
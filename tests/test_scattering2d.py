@@ -54,7 +54,15 @@ def test_scatt2d_pw(degree, polarization):
 
     s = Scattering(geom, epsilon, mu, pw, degree=degree, polarization=polarization)
     u = s.solve()
+    assert s.factorization is not None
     list_time()
+    s.formulation.cache_annex = True
+    u_cached = s.solve()
+    if not gyptis.ADJOINT:
+        assert isinstance(s.solution["total"].real, dolfin.Function)
+    dx = s.formulation.dx
+    err = gyptis.assemble((u_cached - u).abs2() * dx).real
+    assert err < 1e-3 * gyptis.assemble(u.abs2() * dx).real
     print(gyptis.assemble(u * s.formulation.dx))
     if gyptis.ADJOINT:
         from gyptis import project
@@ -80,6 +88,54 @@ def test_scatt2d_pw(degree, polarization):
         assert abs(conv_rate - 2) < 1e-2
 
 
+@pytest.mark.skipif(not gyptis.ADJOINT, reason="requires dolfin-adjoint")
+def test_scatt2d_factorized_adjoint(monkeypatch):
+    from gyptis import PlaneWave, Scattering, dolfin, project
+    from gyptis.models._adjoint import _solve_block_type
+
+    geom = build_geom()
+    mesh = geom.mesh
+    pw = PlaneWave(wavelength=wavelength, angle=0, dim=2, domain=mesh)
+    Actrl = dolfin.FunctionSpace(mesh, "DG", 0)
+
+    def objective(value):
+        dolfin.set_working_tape(dolfin.Tape())
+        ctrl = project(dolfin.Constant(value), Actrl)
+        epsilon = dict(box=1, cyl=(2 * ctrl + 1) * gyptis.Complex(1, 0))
+        s = Scattering(geom, epsilon, dict(box=1, cyl=1), pw)
+        field = s.solve()
+        J = -gyptis.assemble(gyptis.inner(field, field.conj) * s.dx("box")).real
+        return J, ctrl
+
+    def gradient(value):
+        J, ctrl = objective(value)
+        return dolfin.compute_gradient(J, dolfin.Control(ctrl)).vector().get_local()
+
+    block_type = _solve_block_type()
+    valid = block_type._factorization_valid
+    used = []
+
+    def spy(block):
+        used.append(valid(block))
+        return used[-1]
+
+    monkeypatch.setattr(block_type, "_factorization_valid", spy)
+    factorized = gradient(0.1)
+    assert len(used) > 0 and all(used)
+
+    # the replayed solve is factorized by the block and reused for the adjoint
+    J, ctrl = objective(0.1)
+    Jhat = dolfin.ReducedFunctional(J, dolfin.Control(ctrl))
+    Jhat(project(dolfin.Constant(0.3), Actrl))
+    used.clear()
+    replayed = Jhat.derivative().vector().get_local()
+    assert len(used) > 0 and all(used)
+
+    monkeypatch.setattr(block_type, "_factorization_valid", lambda block: False)
+    assert np.allclose(factorized, gradient(0.1))
+    assert np.allclose(replayed, gradient(0.3))
+
+
 @pytest.mark.parametrize(
     "degree,polarization", [(1, "TM"), (2, "TM"), (1, "TE"), (2, "TE")]
 )
@@ -202,3 +258,40 @@ def test_scatt2d_scs(polarization):
     print(cs["extinction"])
     print(cs["scattering"] + cs["absorption"])
     print(abs(cs["scattering"] + cs["absorption"] - cs["extinction"]))
+
+
+def test_scatt2d_adaptive():
+    from gyptis import PlaneWave, Scattering, dolfin
+    from gyptis.models import adaptive_solve
+
+    geom = build_geom()
+    area = dolfin.assemble(1 * geom.measure["dx"]("cyl"))
+
+    def make_simulation():
+        pw = PlaneWave(wavelength=wavelength, angle=0, dim=2, domain=geom.mesh)
+        return Scattering(geom, dict(box=1, cyl=3), dict(box=1, cyl=1), pw)
+
+    def quantity(s):
+        return dolfin.assemble(s.solution["total"].abs2() * s.dx("cyl"))
+
+    s, history = adaptive_solve(make_simulation, quantity, tol=1e-2, max_iterations=3)
+    assert len(history) > 1
+    ndofs = [h["ndof"] for h in history]
+    assert all(n1 > n0 for n0, n1 in zip(ndofs[:-1], ndofs[1:]))
+    assert abs(dolfin.assemble(1 * geom.measure["dx"]("cyl")) - area) < 1e-12
+
+
+def test_scatt2d_lu_ordering():
+    from gyptis import PlaneWave, Scattering, dolfin
+
+    geom = build_geom()
+    pw = PlaneWave(wavelength=wavelength, angle=0, dim=2, domain=geom.mesh)
+    s = Scattering(geom, dict(box=1, cyl=3), dict(box=1, cyl=1), pw)
+    u = s.solve()
+    norm = dolfin.assemble(u.abs2() * s.dx("cyl"))
+    for ordering, icntl in [("metis", 5), ("amd", 0)]:
+        s.lu_ordering = ordering
+        u = s.solve()
+        assert abs(dolfin.assemble(u.abs2() * s.dx("cyl")) - norm) < 1e-8 * norm
+        factor = s.factorization.getPC().getFactorMatrix()
+        assert factor.getMumpsIcntl(7) == icntl
@@ -20,7 +20,7 @@ def test_pw_2d():
     theta = np.pi / 6
     mesh = dolfin.UnitSquareMesh(50, 50)
     W = dolfin.FunctionSpace(mesh, "CG", 1)
-    pw = plane_wave_2d(lambda0, theta, domain=mesh)
+    pw = plane_wave_2d(lambda0, theta)
     uproj = project(pw, W)
     uarray = function2array(uproj.real) + 1j * function2array(uproj.imag)
     x, y = get_coordinates(W).T
@@ -31,6 +31,13 @@ def test_pw_2d():
     assert np.all(err < 1e-16)
     assert np.mean(err) < 1e-16
 
+    # UFL plane wave, evaluated at quadrature points
+    pw = plane_wave_2d(lambda0, theta, phase=0.3, amplitude=2, domain=mesh)
+    integral = assemble(pw * dolfin.dx(domain=mesh, degree=8)).tocomplex()
+    kx, ky = -k0 * np.sin(theta), -k0 * np.cos(theta)
+    exact = (np.exp(1j * kx) - 1) / (1j * kx) * (np.exp(1j * ky) - 1) / (1j * ky)
+    assert abs(integral - 2 * np.exp(0.3j) * exact) < 1e-8
+
 
 def test_pw_3d():
     theta, phi, psi = 1, 2, 3